@@ -0,0 +1,61 @@
+"""
+Benchmark dry run creation of line items, comparing the deep copied, SHA1 hashed records
+of earlier releases with the current shallow copies and per service id counters, and
+including the cost of the create log line when verbose logging is disabled.
+
+Run from the repository root:
+
+    $ python benchmarks/dry_run.py --count 100000
+"""
+import argparse
+import copy
+from pprint import pformat
+from timeit import default_timer
+
+from line_item_manager.config import config
+from line_item_manager.operations import LineItem
+from line_item_manager.utils import load_file, num_hash
+
+EXPECTED_FILE = 'tests/resources/video_expected_dry_run.yml'
+
+def line_item_recs(count: int) -> list:
+    proto = load_file(EXPECTED_FILE)[0]
+    del proto['id']
+    out = []
+    for i_ in range(count):
+        rec = copy.deepcopy(proto)
+        rec['name'] = f'Prebid @ {i_ / 100:.2f}'
+        rec['costPerUnit']['microAmount'] = i_ * 10000
+        out.append(rec)
+    return out
+
+def legacy_dry_run_recs(recs: list) -> list:
+    _ = pformat(recs)
+    out = copy.deepcopy(recs)
+    for rec in out:
+        rec['id'] = int(''.join(['9999', str(num_hash(['LineItem', str(rec)]))]))
+    return out
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000, help='Number of line items.')
+    parser.add_argument('--batch', type=int, default=450, help='Line items per create call.')
+    args = parser.parse_args()
+
+    config.cli = dict(dry_run=True)
+    recs = line_item_recs(args.count)
+    batches = [recs[i_:i_ + args.batch] for i_ in range(0, len(recs), args.batch)]
+    for label, create in (('legacy', legacy_dry_run_recs), ('current', LineItem().create)):
+        start = default_timer()
+        for batch in batches:
+            create(batch)
+        elapsed = default_timer() - start
+        print(f'{label:>8}: {elapsed:6.2f} s, {1e6 * elapsed / args.count:6.1f} us per line item')
+    stats = config.memo['dry_run_stats']
+    print(f"{stats[('LineItemService', 'records')]} records in "
+          f"{stats[('LineItemService', 'calls')]} calls, "
+          f"{stats[('LineItemService', 'bytes')] / 1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmark the cost of the verbose create and results log lines of a line item batch at
+the default INFO level, with arguments pretty formatted eagerly as in earlier releases,
+with lazy arguments, and without logging, followed by dry run creates of the batches.
+
+Run from the repository root:
+
+    $ python benchmarks/log_format.py --count 20000
+"""
+import argparse
+from pprint import pformat
+from timeit import timeit
+
+from dry_run import line_item_recs
+from line_item_manager.config import config, VERBOSE2
+from line_item_manager.gam_operations import logger
+from line_item_manager.operations import LineItem
+from line_item_manager.utils import pretty
+
+LOG_LINE = 'Service: "%s" Method: "%s" Results:\n"%s"'
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000, help='Number of line items.')
+    parser.add_argument('--batch', type=int, default=450, help='Line items per create call.')
+    args = parser.parse_args()
+
+    config.cli = dict(dry_run=True)
+    recs = line_item_recs(args.count)
+    batches = [recs[i_:i_ + args.batch] for i_ in range(0, len(recs), args.batch)]
+    for label, log in (
+            ('eager', lambda b_: logger.log(VERBOSE2, LOG_LINE, 'LineItemService', 'create',
+                                            pformat(b_))),
+            ('lazy', lambda b_: logger.log(VERBOSE2, LOG_LINE, 'LineItemService', 'create',
+                                           pretty(b_))),
+            ('none', lambda b_: None),
+            ('create', LineItem().create)):
+        seconds = timeit(lambda: [log(b_) for b_ in batches], number=1)
+        print(f'{label:>8}: {1e6 * seconds / args.count:7.1f} us/line item '
+              f'({seconds:.2f}s for {args.count})')
+
+if __name__ == '__main__':
+    main()
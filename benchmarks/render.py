@@ -0,0 +1,81 @@
+"""
+Benchmark line item template rendering cost per line item, with and without the
+compiled template cache, and using the prototype renderer, followed by the cost of
+rendering the line_item user config object per cpm with and without the memoized
+config template.
+
+Run from the repository root:
+
+    $ python benchmarks/render.py --count 2000
+"""
+import argparse
+from timeit import timeit
+from types import SimpleNamespace
+
+from jinja2 import Template as J2Template
+import yaml
+
+from line_item_manager.config import config
+from line_item_manager.prebid import PrebidBidder
+from line_item_manager.prototype import cpm_dependent_keys, LineItemRenderer
+from line_item_manager.template import JINJA_PATTERN, render_cfg, render_src
+
+CONFIG_FILE = 'tests/resources/cfg_video.yml'
+
+def uncached_render_src(src: str, **kwargs) -> dict:
+    clean_src = JINJA_PATTERN.sub(r'{{ \1 }}', src)
+    return yaml.safe_load(J2Template(clean_src).render(**kwargs))
+
+def line_item_params(count: int) -> list:
+    config.cli = dict(test_run=False)
+    config.set_user_configfile(CONFIG_FILE)
+    config.pre_create()
+    cpms = ['%.2f' % (i_ / 100) for i_ in range(1, count + 1)]
+    gam = SimpleNamespace(
+        ad_units=[dict(id=2001)],
+        placements=[dict(id=3001)],
+        network=dict(effectiveRootAdUnitId=1511),
+        targeting_custom=[dict(operator='IS', key=dict(id=7101), values=[dict(id=7301)])],
+    )
+    li_ = SimpleNamespace(
+        gam=gam,
+        media_type='video',
+        order=dict(id=6001),
+        targeting_key=dict(key=dict(id=7201), names={c_:dict(id=i_) for i_, c_ in enumerate(cpms)}),
+    )
+    return [dict(
+        micro_amount=config.micro_amount(cpm),
+        cpm=cpm,
+        li=li_,
+        li_cfg=dict(name=f'Prebid @ {cpm}', item_type='price_priority'),
+        user_cfg=config.user,
+    ) for cpm in cpms]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=2000, help='Number of line items.')
+    args = parser.parse_args()
+
+    params = line_item_params(args.count)
+    src = config.template_src()
+    renderer = LineItemRenderer(src, cpm_dependent_keys(config.user['line_item']))
+    for label, func in (('uncached', uncached_render_src), ('cached', render_src),
+                        ('prototype', lambda s_, **p_: renderer.render(**p_))):
+        seconds = timeit(lambda: [func(src, **p_) for p_ in params], number=1)
+        print(f'{label:>10}: {1e6 * seconds / args.count:9.1f} us/line item '
+              f'({seconds:.2f}s for {args.count})')
+
+    bidder = PrebidBidder('ix')
+    cfg_params = dict(time='', run_mode='', bidder_code=bidder.codestr, bidder_name=bidder.name,
+                      media_type='video')
+    for label, func in (('dump', lambda c_: render_src(yaml.safe_dump(config.user['line_item']),
+                                                       cpm=c_, **cfg_params)),
+                        ('memoized', lambda c_: render_cfg('line_item', bidder, cpm=c_,
+                                                           media_type='video'))):
+        seconds = timeit(lambda: [func(p_['cpm']) for p_ in params], number=1)
+        print(f'{label:>10}: {1e6 * seconds / args.count:9.1f} us/li_cfg '
+              f'({seconds:.2f}s for {args.count})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmark the create command end to end against the AutoIdMockAdClient of the tests, for
+each combination of price granularity and bidder count, creating banner and video line
+items. Each scenario runs in its own process and reports wall time, API calls by service,
+records created, peak memory and the exclusive time of each create phase. Results are
+written to a JSON file so that runs can be compared.
+
+Run from the repository root:
+
+    $ python benchmarks/scale.py --granularity low med --bidders 1 10 --output scale.json
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from timeit import default_timer
+from typing import Any, Callable, Dict, List
+
+import yaml
+
+GRANULARITIES = ['low', 'med', 'dense', 'high', 'custom']
+BIDDERS = [1, 10, 50]
+MEDIA_TYPES = ['banner', 'video']
+CONFIG_FILE = 'tests/resources/cfg_video.yml'
+KEY_FILE = 'tests/resources/gam_creds.json'
+CUSTOM_GRANULARITY = [dict(min=0.05, max=10.00, interval=0.05)]
+BANNER = dict(sizes=[dict(height=250, width=300), dict(height=600, width=300)],
+              snippet='<script src="https://example.com/prebid.js"></script>')
+
+class Phases:
+    """Exclusive wall time of nested functions, per thread."""
+
+    def __init__(self):
+        self.seconds: Counter = Counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = default_timer() - start
+                child = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.seconds[name] += elapsed - child
+        return timed
+
+def scenario_config(granularity: str) -> dict:
+    with open(CONFIG_FILE) as fp:
+        cfg = yaml.safe_load(fp)
+    cfg['creative']['banner'] = BANNER
+    cfg['rate']['granularity'] = dict(type=granularity)
+    if granularity == 'custom':
+        cfg['rate']['granularity']['custom'] = CUSTOM_GRANULARITY
+    return cfg
+
+def cpm_count(granularity: str) -> int:
+    # pylint: disable=import-outside-toplevel
+    from line_item_manager.config import config
+    config.cli = {}
+    buckets = CUSTOM_GRANULARITY if granularity == 'custom' else \
+      config.app['prebid']['price_granularity'][granularity]
+    return sum(round((b_['max'] - b_['min']) / b_['interval']) + 1 for b_ in buckets)
+
+def cache_bidders(count: int) -> List[str]:
+    """Write a bidders CSV of synthetic bidders to the user cache, as if downloaded."""
+    # pylint: disable=import-outside-toplevel
+    from line_item_manager.prebid import BIDDERS as BIDDERS_SETTINGS
+    from line_item_manager.utils import cache_dir
+    codes = [f'bidder{i_:03d}' for i_ in range(count)]
+    filename = os.path.join(cache_dir('prebid'), BIDDERS_SETTINGS['cache']['filename'])
+    with open(filename, 'w') as fp:
+        fp.write('bidder-code,bidder-name,media-types\n')
+        fp.writelines(f'{c_},{c_.title()},"banner, video"\n' for c_ in codes)
+    with open(f'{filename}.json', 'w') as fp:
+        json.dump(dict(fetched=time.time()), fp)
+    return codes
+
+def run_scenario(scenario: Dict[str, Any], jobs: int) -> Dict[str, Any]:
+    """Run the create command of a scenario in this process."""
+    # pylint: disable=import-outside-toplevel
+    from click.testing import CliRunner
+    from googleads import ad_manager
+    from line_item_manager import cli
+    from line_item_manager.gam_config import GAMConfig, GAMLineItems
+    from line_item_manager.prebid import prebid
+    from tests.client import AutoIdMockAdClient
+
+    prebid.offline = True
+    phases = Phases()
+    for cls, name, attr in ((GAMConfig, 'resources', 'check_resources'),
+                            (GAMConfig, 'cleanup', 'cleanup'),
+                            (GAMLineItems, 'licas', 'create')):
+        setattr(cls, attr, phases.wrap(name, getattr(cls, attr)))
+    for name, attr in (('orders', 'order'), ('line_items', 'line_items')):
+        prop = getattr(GAMLineItems, attr)
+        setattr(GAMLineItems, attr, property(phases.wrap(name, prop.fget)))
+
+    client = AutoIdMockAdClient()
+    ad_manager.AdManagerClient.LoadFromString = lambda x: client
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['XDG_CACHE_HOME'] = tmpdir
+        codes = cache_bidders(max(BIDDERS + [scenario['bidders']]))[:scenario['bidders']]
+        configfile = os.path.join(tmpdir, 'cfg.yml')
+        with open(configfile, 'w') as fp:
+            yaml.safe_dump(scenario_config(scenario['granularity']), fp)
+        args = ['--offline', 'create', configfile, '-k', KEY_FILE, '-q', '-j', str(jobs)]
+        for code in codes:
+            args += ['-b', code]
+        start = default_timer()
+        result = CliRunner(mix_stderr=False).invoke(cli.cli, args)
+        wall = default_timer() - start
+    if result.exit_code != 0 or client.records['LineItemService'] != scenario['line_items']:
+        raise RuntimeError(f'Scenario {scenario} failed, exit code {result.exit_code}:\n'
+                           f'{result.output}\n{result.stderr}')
+    phases.seconds['other'] = max(wall - sum(phases.seconds.values()), 0.0)
+    return dict(
+        scenario,
+        wall_seconds=round(wall, 3),
+        peak_memory_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        api_calls={f'{s_}.{m_}':n_ for (s_, m_), n_ in sorted(client.calls.items())},
+        api_calls_total=sum(client.calls.values()),
+        records=dict(sorted(client.records.items())),
+        phases={k_:round(v_, 3) for k_, v_ in phases.seconds.items()},
+    )
+
+def scenarios(granularities: List[str], bidders: List[int],
+              max_line_items: int) -> List[Dict[str, Any]]:
+    out = []
+    for granularity in granularities:
+        cpms = cpm_count(granularity)
+        for count in bidders:
+            line_items = cpms * count * len(MEDIA_TYPES)
+            if line_items <= max_line_items:
+                out.append(dict(granularity=granularity, bidders=count, cpms=cpms,
+                                line_items=line_items))
+    return out
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--granularity', nargs='+', choices=GRANULARITIES,
+                        default=GRANULARITIES, help='Price granularities.')
+    parser.add_argument('--bidders', nargs='+', type=int, default=BIDDERS,
+                        help='Bidder counts.')
+    parser.add_argument('--jobs', type=int, default=1, help='Value of the create --jobs option.')
+    parser.add_argument('--max-line-items', type=int, default=50000,
+                        help='Skip scenarios creating more line items.')
+    parser.add_argument('--output', default='scale.json', help='JSON results file.')
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario), args.jobs)))
+        return
+
+    results = []
+    for scenario in scenarios(args.granularity, args.bidders, args.max_line_items):
+        proc = subprocess.run([sys.executable, __file__, '--jobs', str(args.jobs),
+                               '--scenario', json.dumps(scenario)],
+                              stdout=subprocess.PIPE, text=True, check=True)
+        results.append(json.loads(proc.stdout.splitlines()[-1]))
+        r_ = results[-1]
+        print(f"{r_['granularity']:>7} {r_['bidders']:3d} bidders {r_['line_items']:7d} line items: "
+              f"{r_['wall_seconds']:8.2f} s, {r_['api_calls_total']:6d} calls, "
+              f"{r_['peak_memory_mb']:7.1f} MB; " +
+              ', '.join(f'{k_} {v_:.2f} s' for k_, v_ in r_['phases'].items()))
+    with open(args.output, 'w') as fp:
+        json.dump(dict(
+            created=datetime.now().isoformat(timespec='seconds'),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            jobs=args.jobs,
+            results=results,
+        ), fp, indent=2)
+    print(f'Results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark cold start of line_item_manager commands, reporting wall time and the import
+time measured by "python -X importtime", excluding interpreter startup (site, encodings),
+with the heaviest top level imports of each command. The offline command uses the bidders
+metadata cached by an earlier online run.
+
+Run from the repository root:
+
+    $ python benchmarks/startup.py --repeat 5 --top 3
+"""
+import argparse
+from statistics import median
+import subprocess
+import sys
+from timeit import default_timer
+from typing import Dict, List, Tuple
+
+COMMANDS = [
+    '--version',
+    '--help',
+    'show template',
+    '--offline show bidders',
+    'create --help',
+]
+STARTUP_MODULES = ('site', 'encodings', 'encodings.utf_8', 'encodings.latin_1', '_io', 'marshal',
+                   'posix', 'zipimport', '_codecs', 'codecs', 'io', 'abc', 'os', 'stat',
+                   'posixpath', 'genericpath', 'os.path', '_collections_abc', '_sitebuiltins')
+
+def import_times(stderr: str) -> Dict[str, int]:
+    """Get cumulative microseconds of top level imports from -X importtime output."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' ') and name.strip() not in STARTUP_MODULES:
+            out[name.strip()] = int(cumulative)
+    return out
+
+def run(command: str) -> Tuple[float, Dict[str, int]]:
+    args = [sys.executable, '-X', 'importtime', '-m', 'line_item_manager.cli'] + command.split()
+    start = default_timer()
+    proc = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                          check=True)
+    return default_timer() - start, import_times(proc.stderr)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per command.')
+    parser.add_argument('--top', type=int, default=3, help='Heaviest imports shown per command.')
+    args = parser.parse_args()
+
+    for command in COMMANDS:
+        runs: List[Tuple[float, Dict[str, int]]] = [run(command) for _ in range(args.repeat)]
+        wall = median(r_[0] for r_ in runs)
+        imports = runs[-1][1]
+        heaviest = sorted(imports.items(), key=lambda x_: -x_[1])[:args.top]
+        print(f'{command:>24}: {1e3 * wall:7.1f} ms wall, '
+              f'{1e-3 * sum(imports.values()):7.1f} ms imports; ' +
+              ', '.join(f'{n_} {1e-3 * t_:.1f} ms' for n_, t_ in heaviest))
+
+if __name__ == '__main__':
+    main()
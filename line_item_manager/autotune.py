@@ -0,0 +1,219 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+import json
+import math
+import os
+import threading
+from timeit import default_timer
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import config
+from .utils import cache_dir
+
+logger = config.getLogger(__name__)
+
+_local = threading.local()
+
+def fault() -> None:
+    """Count a fault of the batch being created by the thread, if any."""
+    tuner = getattr(_local, 'tuner', None)
+    if tuner is not None:
+        tuner.fault()
+
+class BatchTuner:
+    """Batch size and concurrent batches of a bulk create, adapted to batch latency and faults.
+
+    A batch faster than the target latency grows the batch size, and a wave of such batches
+    adds a concurrent batch. A slower batch shrinks the batch size in proportion, and a batch
+    with a fault halves the batch size and removes a concurrent batch. Values stay within the
+    configured bounds.
+    """
+
+    def __init__(self, name: str, size: int, workers: int, min_size: int, max_size: int,
+                 max_workers: int, target_seconds: float, growth: float):
+        """Initialize BatchTuner.
+
+        Args:
+          name: bulk create name, e.g. lica
+          size: initial records per batch
+          workers: initial concurrent batches
+          min_size: lowest records per batch
+          max_size: highest records per batch
+          max_workers: highest concurrent batches
+          target_seconds: batch latency above which batches shrink
+          growth: batch size factor of a batch faster than the target
+        """
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_workers = max_workers
+        self.target_seconds = target_seconds
+        self.growth = growth
+        self.size = min(max(size, min_size), max_size)
+        self.workers = min(max(workers, 1), max_workers)
+        self.batches = 0
+        self.faults = 0
+        self._streak = 0
+        self._faulted = threading.local()
+        self._lock = threading.Lock()
+
+    def fault(self) -> None:
+        self._faulted.value = True
+
+    def observe(self, records: int, seconds: float, faulted: bool=False) -> None:
+        """Adapt the batch size and concurrent batches to a completed or failed batch.
+
+        Args:
+          records: records of the batch
+          seconds: batch latency, including retries
+          faulted: True if the batch had a fault
+        """
+        with self._lock:
+            self.batches += 1
+            if faulted:
+                self.faults += 1
+                self._streak = 0
+                self.size = max(self.min_size, self.size // 2)
+                self.workers = max(1, self.workers - 1)
+            elif seconds > self.target_seconds:
+                self._streak = 0
+                self.size = max(self.min_size,
+                                min(self.size, int(records * self.target_seconds / seconds)))
+            else:
+                self.size = min(self.max_size, max(self.size, math.ceil(records * self.growth)))
+                self._streak += 1
+                if self._streak >= self.workers:
+                    self._streak = 0
+                    self.workers = min(self.max_workers, self.workers + 1)
+        logger.debug('Autotune %s: %d records in %.2f s%s, size %d, workers %d', self.name,
+                     records, seconds, ' with a fault' if faulted else '', self.size,
+                     self.workers)
+
+    def run(self, create: Callable[[List[dict]], List[dict]], recs: List[dict]) -> List[dict]:
+        """Create a batch of records, observing its latency and faults.
+
+        Args:
+          create: batch create function
+          recs: records of the batch
+
+        Returns:
+          Created records
+        """
+        _local.tuner = self
+        self._faulted.value = False
+        start = default_timer()
+        try:
+            results = create(recs)
+        except Exception:
+            self.observe(len(recs), default_timer() - start, faulted=True)
+            raise
+        finally:
+            _local.tuner = None
+        self.observe(len(recs), default_timer() - start, faulted=self._faulted.value)
+        return results
+
+    def create_batched(self, recs: List[dict], create: Callable[[List[dict]], List[dict]],
+                       progress: Optional[Callable[[int], Any]]=None) -> List[dict]:
+        """Create records in waves of concurrent batches of the tuned size.
+
+        Args:
+          recs: records to create
+          create: batch create function
+          progress: called with the record count of each created batch
+
+        Returns:
+          Created records, in the order of recs
+        """
+        out: List[dict] = []
+        offset = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix=f'autotune_{self.name}') as pool:
+            while offset < len(recs):
+                chunks = []
+                while offset < len(recs) and len(chunks) < self.workers:
+                    chunks.append(recs[offset:offset + self.size])
+                    offset += len(chunks[-1])
+                # a single batch is created by the calling thread, within its run phase
+                for results in [self.run(create, chunks[0])] if len(chunks) == 1 else \
+                  pool.map(partial(self.run, create), chunks):
+                    out += results
+                    if progress:
+                        progress(len(results))
+        return out
+
+    def state(self) -> Dict[str, Any]:
+        return dict(size=self.size, workers=self.workers, batches=self.batches,
+                    faults=self.faults, updated=datetime.now().isoformat(timespec='seconds'))
+
+class Autotuner:
+    """Batch tuners of the bulk creates of a network, starting from the values saved by the
+    previous run on the network."""
+
+    def __init__(self, filename: str, network_code: Any):
+        """Initialize Autotuner.
+
+        Args:
+          filename: JSON file of the tuned values by network
+          network_code: GAM network code
+        """
+        self.filename = filename
+        self.network = str(network_code)
+        self.tuners: Dict[str, BatchTuner] = {}
+        self._lock = threading.Lock()
+        self._saved = self.load().get(self.network, {})
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def tuner(self, name: str, settings: str) -> BatchTuner:
+        """Get a batch tuner, creating it if needed.
+
+        Args:
+          name: tuner name, e.g. lica_sizes
+          settings: name of its autotune settings, e.g. lica
+
+        Returns:
+          BatchTuner instance
+        """
+        with self._lock:
+            if name not in self.tuners:
+                cfg = config.app['mgr']['autotune']
+                kwargs = dict(cfg[settings])
+                kwargs.update({k_:v_ for k_, v_ in self._saved.get(name, {}).items() \
+                               if k_ in ('size', 'workers')})
+                self.tuners[name] = BatchTuner(name, target_seconds=cfg['target_seconds'],
+                                               growth=cfg['growth'], **kwargs)
+            return self.tuners[name]
+
+    def save(self) -> None:
+        """Save the values of the tuners that created batches, for the next run."""
+        tuned = {k_:t_.state() for k_, t_ in self.tuners.items() if t_.batches}
+        if not tuned:
+            return
+        out = self.load()
+        out.setdefault(self.network, {}).update(tuned)
+        with open(self.filename, 'w') as fp:
+            json.dump(out, fp, indent=2)
+        for name, state in tuned.items():
+            logger.info('Autotune %s: size %d, workers %d after %d batches, %d faults', name,
+                        state['size'], state['workers'], state['batches'], state['faults'])
+
+_autotuner_lock = threading.Lock()
+
+def autotuner() -> Autotuner:
+    """Get the autotuner of the run, creating it if needed.
+
+    Returns:
+      Autotuner of the network of the run
+    """
+    with _autotuner_lock:
+        if 'autotuner' not in config.memo:
+            config.memo['autotuner'] = Autotuner(
+                os.path.join(cache_dir(), config.app['mgr']['autotune']['filename']),
+                config.network_code)
+        return config.memo['autotuner']
@@ -1,20 +1,23 @@
-"""Console script for line_item_manager."""
+"""Console script for line_item_manager.
+
+Modules importing googleads, zeep, jinja2, jsonschema and the Prebid settings are imported
+by the commands using them, so that --version, --help and show start quickly.
+"""
 from functools import partial
 import json
-import pkg_resources
 import sys
+from typing import Callable, TYPE_CHECKING
 
 import click
-from googleads.errors import GoogleAdsError
 import yaml
 
 from . import version as VERSION
 from .config import config
 from .exceptions import ResourceNotActive, ResourceNotFound
-from .gam_config import GAMConfig
-from .gam_operations import client as gam_client
-from .prebid import prebid, PrebidBidder
-from .validate import Validator
+from .utils import read_package_file
+
+if TYPE_CHECKING:
+    from .gam_config import GAMConfig
 
 click.option = partial(click.option, show_default=True)
 
@@ -22,47 +25,28 @@ logger = config.getLogger(__name__)
 
 @click.group(invoke_without_command=True)
 @click.option('--version', is_flag=True, help='Print version information and exit.')
+@click.option('--offline', is_flag=True,
+              help='Use the cached or packaged Prebid bidders metadata, do not download it.')
 @click.pass_context
-def cli(ctx: click.core.Context, version: bool) -> None:
+def cli(ctx: click.core.Context, version: bool, offline: bool) -> None:
     if version:
         print(f'line-item-manager version {VERSION}')
         return
+    if offline:
+        from .prebid import prebid
+        prebid.offline = offline
     if not ctx.invoked_subcommand:
         click.echo(cli.get_help(ctx))
 
-@cli.command()
-@click.argument('configfile', type=click.Path(exists=True))
-@click.option('--network-code', type=int,
-              help='GAM network code, must reconcile with the network name.')
-@click.option('--network-name', help='GAM network name, must reconcile with the network code.')
-@click.option('--private-key-file', '-k', required=True, default='gam_creds.json',
-              type=click.Path(exists=True), help='Path to json GAM credentials file.')
-@click.option('--template',
-              type=click.Path(exists=True), help='Advanced users: path to custom line item template. ' \
-              'Use "line_item_manager show template" to see the package default')
-@click.option('--settings',
-              type=click.Path(exists=True), help='Advanced users: path to settings file. ' \
-              'Use "line_item_manager show settings" to see the package default')
-@click.option('--schema',
-              type=click.Path(exists=True), help='Advanced users: path to schema file. ' \
-              'Use "line_item_manager show schema" to see the package default')
-@click.option('--single-order', '-s', is_flag=True,
-              help='Create a single set of orders instead of orders per bidder.')
-@click.option('--bidder-code', '-b', multiple=True,
-              help='Bidder code, may be used multiple times.')
-@click.option('--test-run', '-t', is_flag=True,
-              help='Create a limited number of line_items for testing and review in GAM. ' \
-              'Order and line item names are prepended with \'Test: \'.')
-@click.option('--dry-run', '-n', is_flag=True,
-              help='Print commands that would be executed, but do not execute them.')
-@click.option('--quiet', '-q', is_flag=True, help='Logging is limited to warnings and errors.')
-@click.option('--verbose', '-v', multiple=True, is_flag=True,
-              help='Verbose logging, use multiple times to increase verbosity.')
-@click.option('--skip-auto-archive', is_flag=True,
-              help='Upon failure or interruption, do NOT auto-archive already created orders.')
-@click.pass_context
-def create(ctx: click.core.Context, configfile: str, **kwargs):
-    """Create line items"""
+def prepare(ctx: click.core.Context, configfile: str, kwargs: dict) -> 'GAMConfig':
+    """Validate options, config file and GAM access, and pre-create the config."""
+    # pylint: disable=import-outside-toplevel
+    from googleads.errors import GoogleAdsError
+    from .gam_config import GAMConfig
+    from .gam_operations import client as gam_client
+    from .prebid import prebid, PrebidBidder
+    from .validate import Validator
+
     config.cli = kwargs
 
     try:
@@ -81,6 +65,14 @@ def create(ctx: click.core.Context, configfile: str, **kwargs):
         raise click.UsageError(
             'Use of --single-order and --bidder-code is ambiguous and not allowed.', ctx=ctx)
 
+    if kwargs.get('pipeline') and kwargs.get('jobs', 1) > 1:
+        raise click.UsageError(
+            'Use of --pipeline and --jobs is ambiguous and not allowed.', ctx=ctx)
+
+    if kwargs.get('resume') and kwargs.get('dry_run'):
+        raise click.UsageError(
+            'Use of --resume and --dry-run is not allowed.', ctx=ctx)
+
     if not config.network_code:
         raise click.UsageError(
             'Network code must be provided as an option or set in the config file', ctx=ctx)
@@ -89,9 +81,15 @@ def create(ctx: click.core.Context, configfile: str, **kwargs):
         raise click.UsageError(
             'Network name must be provided as an option or set in the config file', ctx=ctx)
 
-    for bidder_code in kwargs['bidder_code']:
-        if not bidder_code in prebid.bidders:
-            raise click.UsageError(f'Bidder code \'{bidder_code}\' is not recognized', ctx=ctx)
+    if kwargs['bidder_code']:
+        try:
+            bidders = prebid.bidders
+        except ResourceNotFound as e:
+            raise click.UsageError(f'{e}', ctx=ctx)
+        for bidder_code in kwargs['bidder_code']:
+            if not bidder_code in bidders:
+                raise click.UsageError(f'Bidder code \'{bidder_code}\' is not recognized',
+                                       ctx=ctx)
 
     # validate GAM client
     config.set_client_factory(gam_client)
@@ -112,7 +110,7 @@ def create(ctx: click.core.Context, configfile: str, **kwargs):
             raise click.UsageError(f"Network name found \'{gam.network['displayName']}\' " \
                                    f"does not match provided \'{config.network_name}\'", ctx=ctx)
     except GoogleAdsError as _e:
-        logger.error(f'GoogleAdsError, {_e}')
+        logger.error('GoogleAdsError, %s', _e)
         raise click.UsageError(
             'Not able to successfully access your service account.  ' \
             'Check WARNING/ERROR messages above and consider \nupgrading to latest version.', ctx=ctx)
@@ -134,6 +132,94 @@ def create(ctx: click.core.Context, configfile: str, **kwargs):
     except ValueError as e:
         raise click.UsageError(f'{e}', ctx=ctx)
 
+    return gam
+
+def config_options(func: Callable) -> Callable:
+    """Options shared by commands using a user config file."""
+    options = [
+        click.argument('configfile', type=click.Path(exists=True)),
+        click.option('--network-code', type=int,
+                     help='GAM network code, must reconcile with the network name.'),
+        click.option('--network-name',
+                     help='GAM network name, must reconcile with the network code.'),
+        click.option('--private-key-file', '-k', required=True, default='gam_creds.json',
+                     type=click.Path(exists=True), help='Path to json GAM credentials file.'),
+        click.option('--template',
+                     type=click.Path(exists=True), help='Advanced users: path to custom line ' \
+                     'item template. Use "line_item_manager show template" to see the package ' \
+                     'default'),
+        click.option('--settings',
+                     type=click.Path(exists=True), help='Advanced users: path to settings ' \
+                     'file. Use "line_item_manager show settings" to see the package default'),
+        click.option('--schema',
+                     type=click.Path(exists=True), help='Advanced users: path to schema file. ' \
+                     'Use "line_item_manager show schema" to see the package default'),
+        click.option('--single-order', '-s', is_flag=True,
+                     help='Create a single set of orders instead of orders per bidder.'),
+        click.option('--bidder-code', '-b', multiple=True,
+                     help='Bidder code, may be used multiple times.'),
+        click.option('--test-run', '-t', is_flag=True,
+                     help='Create a limited number of line_items for testing and review in ' \
+                     'GAM. Order and line item names are prepended with \'Test: \'.'),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+def log_options(func: Callable) -> Callable:
+    """Logging options shared by commands."""
+    func = click.option('--verbose', '-v', multiple=True, is_flag=True,
+                        help='Verbose logging, use multiple times to increase verbosity.')(func)
+    return click.option('--quiet', '-q', is_flag=True,
+                        help='Logging is limited to warnings and errors.')(func)
+
+@cli.command()
+@config_options
+@click.option('--dry-run', '-n', is_flag=True,
+              help='Print commands that would be executed, but do not execute them.')
+@log_options
+@click.option('--skip-auto-archive', is_flag=True,
+              help='Upon failure or interruption, do NOT auto-archive already created orders.')
+@click.option('--activate-keys', is_flag=True,
+              help='Activate inactive bidder targeting keys instead of failing.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Number of orders, with their line items and creatives, to create concurrently.')
+@click.option('--pipeline', is_flag=True,
+              help='Overlap creation of orders, line items and creative associations ' \
+              'of consecutive orders.')
+@click.option('--resume', metavar='RUN_ID',
+              help='Resume a failed or interrupted run, skipping its completed orders, line items ' \
+              'and creative associations. The run must have used --skip-auto-archive.')
+@click.option('--profile', metavar='DIR', type=click.Path(file_okay=False),
+              help='Profile each phase of the run, writing <phase>.pstats files and a summary.txt ' \
+              'of the top functions of each phase to this directory.')
+@click.option('--metrics-out', metavar='FILE', type=click.Path(dir_okay=False),
+              help='Write call counts, latency percentiles, bytes and retries per service ' \
+              'method, and records created per second per phase, to this JSON file.')
+@click.pass_context
+def create(ctx: click.core.Context, configfile: str, **kwargs):
+    """Create line items"""
+    # pylint: disable=import-outside-toplevel
+    from googleads.errors import GoogleAdsError
+    from .metrics import metrics
+    from .profiling import profiler
+
+    if kwargs['profile']:
+        profiler.start(kwargs['profile'])
+        ctx.call_on_close(profiler.finish)
+    if kwargs['metrics_out']:
+        metrics.start()
+        ctx.call_on_close(partial(metrics.finish, kwargs['metrics_out']))
+    with profiler.phase('config'):
+        gam = prepare(ctx, configfile, kwargs)
+
+    # journal created entities, or resume a previous run
+    if not kwargs['dry_run']:
+        try:
+            gam.open_journal(configfile)
+        except (ResourceNotActive, ResourceNotFound) as e:
+            raise click.UsageError(f'{e}', ctx=ctx)
+
     # create line items
     try:
         gam.create_line_items()
@@ -154,10 +240,42 @@ def create(ctx: click.core.Context, configfile: str, **kwargs):
         except GoogleAdsError as _e:
             logger.error('Cleanup: Google Ads Error, %s', _e)
 
+@cli.command()
+@config_options
+@log_options
+@click.option('--resume', metavar='RUN_ID',
+              help='Plan the rest of a failed or interrupted run, using the start time of the ' \
+              'run in order and line item names.')
+@click.option('--show-existing', is_flag=True, help='Also list resources that already exist.')
+@click.pass_context
+def plan(ctx: click.core.Context, configfile: str, **kwargs):
+    """Show what create would do, using bulk reads only"""
+    # pylint: disable=import-outside-toplevel
+    from googleads.errors import GoogleAdsError
+    from .plan import Planner
+
+    gam = prepare(ctx, configfile, kwargs)
+    # nothing is written, any create is a dry run
+    kwargs['dry_run'] = True
+
+    if kwargs['resume']:
+        try:
+            gam.open_journal(read_only=True)
+        except (ResourceNotActive, ResourceNotFound) as e:
+            raise click.UsageError(f'{e}', ctx=ctx)
+
+    try:
+        print(Planner(gam).run().summary(show_existing=kwargs['show_existing']))
+    except ResourceNotFound as _e:
+        logger.error('Not able to find the following resource:\n  - %s', _e)
+    except GoogleAdsError as _e:
+        logger.error('Google Ads Error, %s', _e)
+    finally:
+        if gam.journal:
+            gam.journal.close()
+
 def show_resource(filename: str) -> None:
-    rsrc_name = pkg_resources.resource_filename('line_item_manager', filename) # type: ignore[misc]
-    with open(rsrc_name) as fp:
-        print(fp.read())
+    print(read_package_file(filename))
 
 @cli.command()
 @click.argument('resource', type=click.Choice(['config', 'bidders', 'template',
@@ -165,17 +283,22 @@ def show_resource(filename: str) -> None:
 def show(resource: str) -> None:
     """Show resources"""
     if resource == 'config':
-        show_resource('conf.d/line_item_manager.yml')
+        show_resource('line_item_manager.yml')
     if resource == 'template':
-        show_resource('conf.d/line_item_template.yml')
+        show_resource('line_item_template.yml')
     if resource == 'settings':
-        show_resource('conf.d/settings.yml')
+        show_resource('settings.yml')
     if resource == 'schema':
-        show_resource('conf.d/schema.yml')
+        show_resource('schema.yml')
     if resource == 'bidders':
+        from .prebid import prebid # pylint: disable=import-outside-toplevel
+        try:
+            bidders = prebid.bidders
+        except ResourceNotFound as e:
+            raise click.UsageError(f'{e}')
         print("%-25s%s" % ('Code', 'Name'))
         print("%-25s%s" % ('----', '----'))
-        for row in sorted(prebid.bidders.values(), key=lambda x: x['bidder-code']):
+        for row in sorted(bidders.values(), key=lambda x: x['bidder-code']):
             print("%-25s%s" % (row['bidder-code'], row['bidder-name']))
 
 def main():
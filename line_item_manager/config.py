@@ -1,12 +1,13 @@
 from datetime import datetime
+from decimal import Decimal
 import logging
-from typing import Callable, Dict, List, Iterable, Optional, Union
-import pytz
+from typing import Callable, Dict, List, Iterable, Optional, Union, TYPE_CHECKING
 
-from googleads import ad_manager
+from .utils import load_file, load_package_file, read_package_file
 
-from .yaml_date import date_from_string
-from .utils import values_from_bucket, ichunk, load_file, load_package_file, read_package_file
+if TYPE_CHECKING: # imported where used, keeping the cli startup fast
+    from googleads import ad_manager
+    from .prebid import PriceLadder
 
 logging.basicConfig()
 
@@ -18,6 +19,7 @@ class Config:
     def __init__(self):
         self._schema = None
         self._cpm_names = None
+        self._memo: dict = {}
         self._app = None
         self._start_time = datetime.now()
         self.set_logger()
@@ -57,11 +59,16 @@ class Config:
         self.set_log_level()
 
     @property
-    def client(self) -> Optional[ad_manager.AdManagerClient]:
+    def client(self) -> Optional['ad_manager.AdManagerClient']:
         if self._client is None:
             self._client = self._client_factory(self.network_code, self.cli['private_key_file'])
         return self._client
 
+    @property
+    def memo(self) -> dict:
+        """Run scoped memo of objects derived from the user config."""
+        return self._memo
+
     @property
     def user(self) -> dict:
         return self._user
@@ -74,11 +81,20 @@ class Config:
         self._user = load_file(filename)
         self._client = None
         self._cpm_names = None
+        self._memo = {}
 
     @property
     def start_time(self) -> datetime:
         return self._start_time
 
+    @start_time.setter
+    def start_time(self, val: datetime) -> None:
+        self._start_time = val
+
+    @property
+    def jobs(self) -> int:
+        return self.cli.get('jobs') or 1
+
     @property
     def network_code(self) -> int:
         return self.cli['network_code'] or self.user.get('publisher', {}).get('network_code')
@@ -122,21 +138,31 @@ class Config:
             return self.user['rate']['granularity']['custom']
         return self.app['prebid']['price_granularity'][_type]
 
-    def cpm_names(self) -> List[str]:
+    def price_ladder(self) -> 'PriceLadder':
         if self._cpm_names is None:
-            values = set()
-            for bucket in self.cpm_buckets():
-                values.update(values_from_bucket(bucket))
-            self._cpm_names = ['%.2f' % v_ for v_ in sorted(values)]
+            from .prebid import PriceLadder # pylint: disable=import-outside-toplevel
+            self._cpm_names = PriceLadder.from_buckets(
+                self.cpm_buckets(),
+                precision=self.user['rate']['granularity'].get(
+                    'precision', self.app['prebid']['price_precision']),
+                micro_factor=self.app['googleads']['line_items']['micro_cent_factor'])
         if self.cli['test_run']:
             return self._cpm_names[:self.app['mgr']['test_run']['line_item_limit']]
         return self._cpm_names
 
-    def cpm_names_batched(self) -> Iterable[List[str]]:
-        return ichunk(self.cpm_names(), self.app['googleads']['line_items']['max_per_order'])
+    def cpm_names(self) -> List[str]:
+        return self.price_ladder().names
+
+    def cpm_names_batched(self) -> Iterable['PriceLadder']:
+        ladder = self.price_ladder()
+        size = self.app['googleads']['line_items']['max_per_order']
+        return (ladder[i_:i_ + size] for i_ in range(0, len(ladder), size))
 
     def micro_amount(self, cpm: Union[str, float]) -> int:
-        return int(float(cpm) * self.app['googleads']['line_items']['micro_cent_factor'])
+        try:
+            return self.price_ladder().micro_amount(str(cpm))
+        except KeyError:
+            return round(Decimal(str(cpm)) * self.app['googleads']['line_items']['micro_cent_factor'])
 
     def template_src(self) -> str:
         if self.cli.get('template'):
@@ -146,10 +172,34 @@ class Config:
 
     def settings_obj(self) -> dict:
         if self.cli.get('settings'):
-            return load_file(self.cli['settings'])
+            return self.deprecated_settings(load_file(self.cli['settings']))
         return load_package_file('settings.yml')
 
+    def deprecated_settings(self, obj: dict) -> dict:
+        """Map the deprecated keys of a user settings file to the autotune settings.
+
+        Args:
+          obj: user settings object
+
+        Returns:
+          The settings object, with mgr.max_lica_records as the ceiling of LICA batches
+        """
+        mgr = obj.get('mgr') or {}
+        if 'max_lica_records' in mgr:
+            size = mgr.pop('max_lica_records')
+            self.getLogger(__name__).warning(
+                'Setting mgr.max_lica_records is deprecated, use mgr.autotune.lica.max_size')
+            lica = mgr.setdefault('autotune',
+                                  load_package_file('settings.yml')['mgr']['autotune'])['lica']
+            lica.update(max_size=size, size=min(lica['size'], size),
+                        min_size=min(lica['min_size'], size))
+        return obj
+
     def pre_create(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        import pytz
+        from .yaml_date import date_from_string
+
         li_ = self.user['line_item']
         is_standard = li_['item_type'].upper() == "STANDARD"
         is_sponsorship = li_['item_type'].upper() == "SPONSORSHIP"
@@ -198,5 +248,6 @@ class Config:
         self.user['rate'].update(dict(
             cost_type="VCPM" if vcpm else "CPM"
         ))
+        self._memo = {}
 
 config = Config()
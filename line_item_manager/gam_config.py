@@ -1,21 +1,31 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from pprint import pformat
-from typing import Any, List, Iterable, Optional
+from functools import partial
+import os
+from threading import Lock
+from typing import Any, Callable, Dict, List, Iterable, Optional, Tuple
 
 from googleads.errors import GoogleAdsServerFault
 from jinja2 import Template as J2Template
-from retrying import retry
+from retrying import Retrying
 from tqdm import tqdm
 from zeep.helpers import serialize_object
 import pytz
 
+from .autotune import autotuner, fault
 from .config import config, VERBOSE1, VERBOSE2
 from .exceptions import ResourceNotActive, ResourceNotFound
+from .gam_operations import service_cache
+from .journal import Journal
+from .metrics import metrics
+from .pipeline import Pipeline
+from .profiling import profiler
 from .operations import Advertiser, AdUnit, Placement, TargetingKey, TargetingValues, \
-     CreativeBanner, CreativeVideo, Order, CurrentNetwork, CurrentUser, LineItem, LICA
-from .prebid import PrebidBidder
-from .template import render_cfg, render_src
-from .utils import format_long_list, ichunk
+     Creative, CreativeBanner, CreativeVideo, Order, CurrentNetwork, CurrentUser, LineItem, LICA
+from .prebid import PrebidBidder, PriceLadder
+from .prototype import cpm_dependent_keys, LineItemRenderer
+from .template import render_cfg
+from .utils import cache_dir, format_long_list, KeyedLocks, Lazy, pretty
 
 logger = config.getLogger(__name__)
 
@@ -23,14 +33,34 @@ def is_create_retryable_error(exc: Exception) -> bool:
     is_error = isinstance(exc, GoogleAdsServerFault)
     if is_error:
         logger.info('Retrying...')
+        metrics.retry()
+        fault()
     return is_error
 
 def log(objname: str, obj: dict=None) -> None:
-    logger.log(VERBOSE1, '%s:\n%s', objname, pformat(obj if obj else config.user.get(objname, {})))
+    logger.log(VERBOSE1, '%s:\n%s', objname, pretty(obj if obj else config.user.get(objname, {})))
+
+def log_dry_run_stats() -> None:
+    stats = config.memo.get('dry_run_stats', {})
+    for service in dict.fromkeys(s_ for s_, _ in stats):
+        logger.info('Dry run %s: %d records in %d calls, %.1f kB', service,
+                    stats[(service, 'records')], stats[(service, 'calls')],
+                    stats[(service, 'bytes')] / 1e3)
+
+def fetch_names(op_: Any, label: str, names: List[str]) -> List[dict]:
+    found = op_.fetch_in('name', names, config.app['mgr']['max_names_per_query'])
+    missing = [n_ for n_ in names if n_ not in found]
+    if len(missing) == 1:
+        raise ResourceNotFound(f'{label} named \'{missing[0]}\' was not found')
+    if missing:
+        raise ResourceNotFound(f'{label}s named {", ".join(repr(n_) for n_ in missing)} ' \
+                               'were not found')
+    return [found[n_] for n_ in names]
 
 def target_fetch(key: str, names: Iterable[str], operator='IS', match_type: str='EXACT',
-                 reportableType: str='OFF') -> dict:
-    tgt_key = TargetingKey(name=key, reportableType=reportableType).fetchone(create=True)
+                 reportableType: str='OFF', tgt_key: Optional[dict]=None) -> dict:
+    if tgt_key is None:
+        tgt_key = TargetingKey(name=key, reportableType=reportableType).fetchone(create=True)
     recs = []
     for name in names:
         recs.append(dict(
@@ -39,7 +69,13 @@ def target_fetch(key: str, names: Iterable[str], operator='IS', match_type: str=
             displayName=name,
             matchType=match_type,
         ))
-    tgt_values = TargetingValues(key_id=tgt_key['id'], name=list(names)).fetch(create=True, recs=recs, validate=True)
+    op_ = TargetingValues(key_id=tgt_key['id'], name=list(names))
+    tgt_values = op_.fetch()
+    missing = op_.missing_recs(tgt_values, recs)
+    if missing:
+        tgt_values += autotuner().tuner('targeting_value', 'targeting_value').create_batched(
+            missing, partial(op_.create, verbose=False))
+    op_.validate(recs, tgt_values)
     return dict(
         key=tgt_key,
         operator=operator,
@@ -47,13 +83,72 @@ def target_fetch(key: str, names: Iterable[str], operator='IS', match_type: str=
         names={v['name']:v for v in tgt_values}
     )
 
+def lica_key(rec: dict) -> str:
+    return f"{rec['lineItemId']}/{rec['creativeId']}"
+
+def unit_key(media_type: str, bidder: PrebidBidder, cpms: PriceLadder) -> str:
+    return f'{bidder.code}/{media_type}/{cpms[0]}-{cpms[-1]}'
+
+def is_size_override(media_type: str) -> bool:
+    default = config.app['mgr']['creative'][media_type]['size_override']
+    return config.user['creative'][media_type].get('size_override', default)
+
+def creative_ops(bidder: PrebidBidder, media_type: str, advertiser_id: int) -> List[Creative]:
+    cfg = render_cfg('creative', bidder, media_type=media_type)
+    log(f'creative_{media_type}', obj={k:cfg[k] for k in ('name', media_type)})
+    size_override = is_size_override(media_type)
+    out: List[Creative] = []
+    for index, size in enumerate(cfg[media_type]['sizes']):
+        name = cfg['name']
+        if size_override:
+            tmpl = config.app['mgr']['creative']['size_override']['name_template']
+            name = J2Template(tmpl).render(name=cfg['name'], index=index + 1)
+        params = dict(
+            name=name,
+            advertiserId=advertiser_id,
+            size=config.app['prebid']['creative']['size_override'] if size_override else size,
+        )
+        if media_type == 'video':
+            out.append(CreativeVideo(vastXmlUrl=cfg['video']['vast_xml_url'],
+                                     duration=config.user['creative']['video']['duration'],
+                                     **params))
+        else:
+            out.append(CreativeBanner(snippet=cfg['banner']['snippet'],
+                                      isSafeFrameCompatible=cfg['banner'].get('safe_frame', True),
+                                      **params))
+    return out
+
+def fetch_creatives(ops: List[Creative], journal: Optional[Journal]=None) -> List[dict]:
+    """Fetch creatives with a name IN query per advertiser, creating the missing ones with a
+    create call per creative type. Creatives are matched by advertiser, name and size."""
+    size = config.app['mgr']['max_names_per_query']
+    names: Dict[int, List[str]] = {}
+    for op_ in ops:
+        names.setdefault(op_.params['advertiserId'], []).append(op_.params['name'])
+    found: Dict[Any, dict] = {}
+    for advertiser_id, names_ in names.items():
+        op_ = Creative(advertiserId=advertiser_id)
+        found.update(op_.fetch_in('name', names_, size, key=op_.check))
+    missing: Dict[type, Tuple[Creative, Dict[Any, dict]]] = {}
+    for op_ in ops:
+        if op_.check(op_.create_params) not in found:
+            missing.setdefault(type(op_), (op_, {}))[1][op_.check(op_.create_params)] = \
+              op_.create_params
+    for op_, recs in missing.values():
+        created = op_.create(list(recs.values()), validate=True)
+        if journal:
+            journal.record('creative', created, key=op_.check)
+        found.update({op_.check(r_):r_ for r_ in created})
+    return [found[op_.check(op_.create_params)] for op_ in ops]
+
 class GAMLineItems:
 
-    def __init__(self, gam: Any, media_type: str, bidder: PrebidBidder, cpms: List[str]):
+    def __init__(self, gam: Any, media_type: str, bidder: PrebidBidder, cpms: PriceLadder):
         self._advertiser: Optional[dict] = None
         self._creatives: Optional[List[dict]] = None
         self._line_items: Optional[List[dict]] = None
         self._order: Optional[dict] = None
+        self._order_exists = False
         self._targeting_key: Optional[dict] = None
 
         self.gam: GAMConfig = gam
@@ -68,11 +163,12 @@ class GAMLineItems:
 
     @property
     def is_size_override(self) -> bool:
-        default = config.app['mgr']['creative'][self.media_type]['size_override']
-        return config.user['creative'][self.media_type].get('size_override', default)
+        return is_size_override(self.media_type)
 
     @property
     def advertiser(self) -> dict:
+        if self._advertiser is None and self.bidder.code in self.gam.advertisers:
+            self._advertiser = self.gam.advertisers[self.bidder.code]
         if self._advertiser is None:
             cfg = render_cfg('advertiser', self.bidder)
             log('advertiser', obj=cfg)
@@ -81,111 +177,194 @@ class GAMLineItems:
                 if not 'id' in self._advertiser:
                     raise ResourceNotFound(f"Advertiser id: {cfg['id']} was not found")
             else:
-                self._advertiser = \
-                  Advertiser(name=cfg['name'],
-                             type=cfg.get('type', config.app['mgr']['advertiser']['type'])).fetchone(create=True)
+                with self.gam.locks(('advertiser', cfg['name'])):
+                    self._advertiser = \
+                      Advertiser(name=cfg['name'],
+                                 type=cfg.get('type', config.app['mgr']['advertiser']['type'])).fetchone(create=True)
         return self._advertiser
 
-    @retry(retry_on_exception=is_create_retryable_error, stop_max_attempt_number=5, wait_fixed=2000)
     def create_licas(self, recs: List[dict]) -> List[dict]:
-        return LICA().create(recs, validate=True)
+        return self.create_reconciled('lica', recs, lica_key, LICA().create, self.fetch_licas)
+
+    def fetch_licas(self, recs: List[dict]) -> Dict[str, dict]:
+        return LICA().fetch_in('lineItemId', [r_['lineItemId'] for r_ in recs],
+                               config.app['mgr']['max_names_per_query'], key=lica_key)
+
+    def create_line_item_recs(self, recs: List[dict]) -> List[dict]:
+        return self.create_reconciled('line_item', recs, lambda r_: r_['name'],
+                                      LineItem().create, self.fetch_line_item_recs)
+
+    def fetch_line_item_recs(self, recs: List[dict]) -> Dict[str, dict]:
+        return LineItem(orderId=self.order['id']).fetch_in(
+            'name', [r_['name'] for r_ in recs], config.app['mgr']['max_names_per_query'])
+
+    def create_reconciled(self, kind: str, recs: List[dict], key: Callable[[dict], str],
+                          create: Callable[..., List[dict]],
+                          fetch: Callable[[List[dict]], Dict[str, dict]]) -> List[dict]:
+        """Create a batch of records, retrying a failed create with the records GAM did not
+        commit before the fault, using exponential backoff with jitter."""
+        done: Dict[str, dict] = {}
+        failed = False
+
+        def attempt() -> List[dict]:
+            nonlocal failed
+            if failed:
+                found = fetch([r_ for r_ in recs if key(r_) not in done])
+                committed = {key(r_):found[key(r_)] for r_ in recs \
+                             if key(r_) in found and key(r_) not in done}
+                if committed:
+                    logger.info('%d of %d %s records were committed before the fault',
+                                len(committed), len(recs), kind)
+                    self.record(kind, committed.values(), key)
+                    done.update(committed)
+            missing = [r_ for r_ in recs if key(r_) not in done]
+            try:
+                created = create(missing, validate=True) if missing else []
+            except Exception:
+                failed = True
+                raise
+            self.record(kind, created, key)
+            done.update((key(r_), r_) for r_ in created)
+            return [done[key(r_)] for r_ in recs]
+
+        return Retrying(retry_on_exception=is_create_retryable_error,
+                        **config.app['mgr']['create_retry']).call(attempt)
+
+    def record(self, kind: str, recs: Iterable[dict], key: Callable[[dict], str]) -> None:
+        if self.gam.journal:
+            self.gam.journal.record(kind, recs, key=key)
+
+    def create_missing(self, kind: str, recs: List[dict], key: Callable[[dict], str],
+                       create: Callable[[List[dict]], List[dict]],
+                       existing: Optional[Dict[str, dict]]=None) -> List[dict]:
+        """Create records, skipping existing ones and those recorded in the journal by the
+        resumed run."""
+        keys = [key(r_) for r_ in recs]
+        done = {k_:existing[k_] for k_ in keys if k_ in existing} if existing else {}
+        if self.gam.journal:
+            done.update(self.gam.journal.get(kind, [k_ for k_ in keys if k_ not in done]))
+        if done:
+            logger.info('%d of %d %s records already exist', len(done), len(recs), kind)
+        missing = [r_ for k_, r_ in zip(keys, recs) if k_ not in done]
+        created = {key(r_):r_ for r_ in create(missing)} if missing else {}
+        return [done[k_] if k_ in done else created[k_] for k_ in keys]
+
+    def create_line_items_batched(self, recs: List[dict]) -> List[dict]:
+        tuner = autotuner().tuner('line_item', 'line_item')
+        if len(recs) > tuner.size:
+            logger.info('Line Items: Writing %d records in batches of %d...', len(recs),
+                        tuner.size)
+        return tuner.create_batched(recs, self.create_line_item_recs)
 
     def create_licas_batched(self, recs: List[dict]) -> List[dict]:
-        out = []
-        logger.info(f'Line Item Creative Associations: Writing {len(recs)} records...')
-        with tqdm(total=len(recs)) as pbar:
-            for subset in ichunk(recs, config.app['mgr']['max_lica_records']):
-                out += self.create_licas(subset)
-                pbar.update(len(subset))
-        return out
+        logger.info('Line Item Creative Associations: Writing %d records...', len(recs))
+        # records with size overrides are larger, so their batches are tuned apart
+        tuner = autotuner().tuner('lica_sizes' if self.is_size_override else 'lica', 'lica')
+        with tqdm(total=len(recs), disable=config.jobs > 1) as pbar:
+            return tuner.create_batched(recs, self.create_licas, progress=pbar.update)
 
     def create(self) -> List[dict]:
-        recs = []
-        for line_item in self.line_items:
-            for creative in self.creatives:
-                rec = dict(lineItemId=line_item['id'], creativeId=creative['id'])
-                if self.is_size_override:
-                    rec.update(dict(sizes=config.user['creative'][self.media_type]['sizes']))
-                recs.append(rec)
-        return self.create_licas_batched(recs)
+        line_items, creatives = self.line_items, self.creatives
+        with profiler.phase('lica_create'):
+            recs = []
+            for line_item in line_items:
+                for creative in creatives:
+                    rec = dict(lineItemId=line_item['id'], creativeId=creative['id'])
+                    if self.is_size_override:
+                        rec.update(dict(sizes=config.user['creative'][self.media_type]['sizes']))
+                    recs.append(rec)
+            existing = {}
+            if self.order_exists:
+                existing = LICA().fetch_in('lineItemId', [r_['id'] for r_ in line_items],
+                                           config.app['mgr']['max_names_per_query'],
+                                           key=lica_key)
+            return self.create_missing('lica', recs, lica_key, self.create_licas_batched,
+                                       existing)
 
     @property
     def creatives(self) -> List[dict]:
         if self._creatives is None:
-            cfg = render_cfg('creative', self.bidder, media_type=self.media_type)
-            _name = f'creative_{self.media_type}'
-            _method = getattr(self, _name)
-            log(_name, obj={k:cfg[k] for k in ('name', self.media_type)})
-            self._creatives = [_method(i_, cfg, size) \
-                               for i_, size in enumerate(cfg[self.media_type]['sizes'])]
+            key = (self.bidder.code, self.media_type)
+            if key in self.gam.creatives:
+                self._creatives = self.gam.creatives[key]
+            else:
+                ops = creative_ops(self.bidder, self.media_type, self.advertiser['id'])
+                with self.gam.locks(('creative', self.advertiser['id'])), \
+                  profiler.phase('creatives'):
+                    self._creatives = fetch_creatives(ops)
         return self._creatives
 
-    def creative_name(self, cfg: dict, index: int):
-        if self.is_size_override:
-            tmpl = config.app['mgr']['creative']['size_override']['name_template']
-            return J2Template(tmpl).render(name=cfg['name'], index=index + 1)
-        return cfg['name']
-
-    def creative_banner(self, index: int, cfg: dict, size: dict) -> dict:
-        params = dict(
-            name=self.creative_name(cfg, index),
-            advertiserId=self.advertiser['id'],
-            size=config.app['prebid']['creative']['size_override'] if self.is_size_override else size,
-            snippet=cfg['banner']['snippet'],
-            isSafeFrameCompatible=cfg['banner'].get('safe_frame', True),
-        )
-        return CreativeBanner(**params).fetchone(create=True)
-
-    def creative_video(self, index: int, cfg: dict, size: dict) -> dict:
-        params = dict(
-            name=self.creative_name(cfg, index),
-            advertiserId=self.advertiser['id'],
-            size=config.app['prebid']['creative']['size_override'] if self.is_size_override else size,
-            vastXmlUrl=cfg['video']['vast_xml_url'],
-            duration=config.user['creative']['video']['duration'],
-        )
-        return CreativeVideo(**params).fetchone(create=True)
-
     @property
     def line_items(self) -> List[dict]:
         if self._line_items is None:
             recs = []
-            src = config.template_src()
-            for i_, cpm in enumerate(self.cpms):
-                li_cfg = render_cfg('line_item', self.bidder, cpm=cpm, media_type=self.media_type)
-                if (i_ == 0) or (i_ == len(self.cpms) - 1) or config.isLoggingEnabled(VERBOSE2):
-                    log('line_item', obj=li_cfg)
-                params = dict(
-                    micro_amount=config.micro_amount(cpm),
-                    cpm=cpm,
-                    li=self,
-                    li_cfg=li_cfg,
-                    user_cfg=config.user,
-                )
-                recs.append(render_src(src, **params))
-            self._line_items = LineItem().create(recs, validate=True)
+            with profiler.phase('line_item_render'):
+                renderer = LineItemRenderer(config.template_src(),
+                                            cpm_dependent_keys(config.user['line_item']))
+                for i_, cpm in enumerate(self.cpms):
+                    li_cfg = render_cfg('line_item', self.bidder, cpm=cpm,
+                                        media_type=self.media_type)
+                    if (i_ == 0) or (i_ == len(self.cpms) - 1) or \
+                      config.isLoggingEnabled(VERBOSE2):
+                        log('line_item', obj=li_cfg)
+                    params = dict(
+                        micro_amount=self.cpms.micros[i_],
+                        cpm=cpm,
+                        li=self,
+                        li_cfg=li_cfg,
+                        user_cfg=config.user,
+                    )
+                    recs.append(renderer.render(**params))
+            with profiler.phase('line_item_create'):
+                existing = {r_['name']:r_ for r_ in \
+                            LineItem(orderId=self.order['id']).fetch()} \
+                  if self.order_exists else {}
+                self._line_items = self.create_missing('line_item', recs, lambda r_: r_['name'],
+                                                       self.create_line_items_batched, existing)
         return self._line_items
 
     @property
     def order(self) -> dict:
+        if self._order is None and self.gam.journal:
+            self._order = self.gam.journal.get('order', [self.unit_key]).get(self.unit_key)
+            self._order_exists = self._order is not None
         if self._order is None:
-            cfg = render_cfg('order', self.bidder, media_type=self.media_type,
-                             cpm_min=self.cpms[0], cpm_max=self.cpms[-1])
-            log('order', obj=cfg)
-            self._order = Order(
-                name=cfg['name'],
-                advertiserId=self.advertiser['id'],
-                traffickerId=self.gam.user['id'],
-                appliedTeamIds=config.user['order'].get('appliedTeamIds'),
-            ).fetchone(create=True)
+            with profiler.phase('orders'):
+                cfg = render_cfg('order', self.bidder, media_type=self.media_type,
+                                 cpm_min=self.cpms[0], cpm_max=self.cpms[-1])
+                log('order', obj=cfg)
+                op_ = Order(
+                    name=cfg['name'],
+                    advertiserId=self.advertiser['id'],
+                    traffickerId=self.gam.user['id'],
+                    appliedTeamIds=config.user['order'].get('appliedTeamIds'),
+                )
+                self._order = op_.fetchone()
+                self._order_exists = bool(self._order)
+                if not self._order_exists:
+                    self._order = op_.create([op_.create_params], validate=True)[0]
+                if self.gam.journal:
+                    self.gam.journal.record('order', [self._order], key=lambda _: self.unit_key)
         return self._order
 
+    @property
+    def order_exists(self) -> bool:
+        """True if the order was found in GAM or the journal, not created by this run."""
+        _ = self.order
+        return self._order_exists
+
+    @property
+    def unit_key(self) -> str:
+        return unit_key(self.media_type, self.bidder, self.cpms)
+
     @property
     def targeting_key(self) -> dict:
         if self._targeting_key is None:
             reportableType=config.targeting_bidder_key_config().get('reportableType', 'OFF')
-            self._targeting_key = target_fetch(
-                self.bidder.targeting_key, config.cpm_names(), reportableType=reportableType)
+            with self.gam.locks(('targeting_key', self.bidder.targeting_key)):
+                self._targeting_key = target_fetch(
+                    self.bidder.targeting_key, config.cpm_names(), reportableType=reportableType,
+                    tgt_key=self.gam.bidder_keys.get(self.bidder.targeting_key))
         return self._targeting_key
 
 class GAMConfig:
@@ -193,8 +372,12 @@ class GAMConfig:
     def __init__(self):
         _ = [log(i_) for i_ in ('targeting', 'rate')]
         self._ad_units: Optional[List[dict]] = None
+        self._advertisers: Optional[Dict[str, dict]] = None
+        self._bidder_keys: Optional[Dict[str, dict]] = None
         self._bidders: Optional[List[PrebidBidder]] = None
-        self._li_objs: List[GAMLineItems] = []
+        self._creatives: Optional[Dict[Tuple[str, str], List[dict]]] = None
+        self._li_objs: Dict[int, GAMLineItems] = {}
+        self._li_lock = Lock()
         self._lica_objs: List[List[dict]] = []
         self._network: Optional[dict] = None
         self._placements: Optional[List[dict]] = None
@@ -202,10 +385,13 @@ class GAMConfig:
         self._user: Optional[dict] = None
 
         self._success = False
+        self.journal: Optional[Journal] = None
+        self.locks = KeyedLocks()
 
     @property
     def li_objs(self) -> List[GAMLineItems]:
-        return self._li_objs
+        with self._li_lock:
+            return [self._li_objs[k] for k in sorted(self._li_objs)]
 
     @property
     def lica_objs(self) -> List[List[dict]]:
@@ -214,71 +400,272 @@ class GAMConfig:
     @property
     def ad_units(self) -> List[dict]:
         if self._ad_units is None:
-            self._ad_units = []
-            for name in config.user.get('targeting', {}).get('ad_unit_names', []):
-                ad_unit = AdUnit(name=name).fetchone()
-                if not ad_unit:
-                    raise ResourceNotFound(f'Ad Unit named \'{name}\' was not found')
-                self._ad_units.append(ad_unit)
+            self._ad_units = fetch_names(AdUnit(), 'Ad Unit',
+                                         config.user.get('targeting', {}).get('ad_unit_names', []))
         return self._ad_units
 
-    def add_li_obj(self, media_type: str, bidder: PrebidBidder, cpms: List[str]) -> GAMLineItems:
-        self._li_objs.append(GAMLineItems(self, media_type, bidder, cpms))
-        return self._li_objs[-1]
+    def add_li_obj(self, media_type: str, bidder: PrebidBidder, cpms: PriceLadder,
+                   index: Optional[int]=None) -> GAMLineItems:
+        li_ = GAMLineItems(self, media_type, bidder, cpms)
+        with self._li_lock:
+            self._li_objs[len(self._li_objs) if index is None else index] = li_
+        return li_
 
     def archive(self) -> None:
-        order_ids = [i_.order['id'] for i_ in self._li_objs]
+        order_ids = [i_.order['id'] for i_ in self.li_objs]
         if order_ids:
-            logger.info('Auto-archiving Orders:\n%s', pformat(order_ids))
+            logger.info('Auto-archiving Orders:\n%s', pretty(order_ids))
             response = Order(id=order_ids).archive()
             changes = response['numChanges'] if 'numChanges' in response else None
             if not changes == len(order_ids):
                 logger.error('Order archive, %s, of %d changes, reported %s changes',
                              order_ids, len(order_ids), changes)
 
+    @property
+    def advertisers(self) -> Dict[str, dict]:
+        """Advertisers keyed by bidder code, fetched and created in bulk once resolved."""
+        return self._advertisers or {}
+
+    @property
+    def bidder_keys(self) -> Dict[str, dict]:
+        """Bidder targeting keys keyed by name, fetched and created in bulk once resolved."""
+        return self._bidder_keys or {}
+
     @property
     def bidders(self) -> List[PrebidBidder]:
         if self._bidders is None:
-            self._bidders = []
-            for code in config.bidder_codes():
-                bidder = PrebidBidder(
-                    code,
-                    override_map=config.user.get('bidder_key_map', {}).get(code, {}),
-                    single_order=config.cli['single_order']
-                    )
-                tgt_key = serialize_object(TargetingKey(name=bidder.targeting_key).fetchone())
-                if tgt_key and not tgt_key.get('status', 'ACTIVE') == 'ACTIVE':
-                    raise ResourceNotActive(f"Bidder Targeting Key name \'{tgt_key['name']}\' "
-                                            "is not active.  You must activate before re-running.")
-                self._bidders.append(bidder)
+            self._bidders = [PrebidBidder(
+                code,
+                override_map=config.user.get('bidder_key_map', {}).get(code, {}),
+                single_order=config.cli['single_order']
+            ) for code in config.bidder_codes()]
         return self._bidders
 
+    def provision_bidders(self) -> None:
+        """Resolve the targeting keys and advertisers of all bidders with bulk queries,
+        creating the missing ones with a single create call per service."""
+        if self._bidder_keys is None:
+            self._bidder_keys = self.provision_bidder_keys()
+        if self._advertisers is None:
+            self._advertisers = self.provision_advertisers()
+
+    @property
+    def creatives(self) -> Dict[Tuple[str, str], List[dict]]:
+        """Creatives keyed by bidder code and media type, fetched and created in bulk once
+        resolved."""
+        return self._creatives or {}
+
+    def provision_creatives(self) -> None:
+        """Resolve the creatives of all bidders and media types with a query per advertiser,
+        creating the missing ones with a single create call per creative type."""
+        if self._creatives is None:
+            ops = {(b_.code, m_):creative_ops(b_, m_, self.advertisers[b_.code]['id']) \
+                   for b_ in self.bidders for m_ in config.media_types()}
+            recs = iter(fetch_creatives([op_ for v_ in ops.values() for op_ in v_], self.journal))
+            self._creatives = {k_:[next(recs) for _ in v_] for k_, v_ in ops.items()}
+
+    def provision_bidder_keys(self) -> Dict[str, dict]:
+        names = [b_.targeting_key for b_ in self.bidders]
+        size = config.app['mgr']['max_names_per_query']
+        keys = {k_:serialize_object(v_) for k_, v_ in \
+                TargetingKey().fetch_in('name', names, size).items()}
+        inactive = [n_ for n_ in dict.fromkeys(names) \
+                    if n_ in keys and keys[n_].get('status', 'ACTIVE') != 'ACTIVE']
+        if len(inactive) == 1 and not config.cli.get('activate_keys'):
+            raise ResourceNotActive(f"Bidder Targeting Key name \'{inactive[0]}\' is not active.  "
+                                    "You must activate before re-running or use --activate-keys.")
+        if inactive and not config.cli.get('activate_keys'):
+            raise ResourceNotActive(f"Bidder Targeting Key names {', '.join(repr(n_) for n_ in inactive)} "
+                                    "are not active.  You must activate before re-running or use " \
+                                    "--activate-keys.")
+        if inactive:
+            logger.info('Activating Bidder Targeting Keys: %s', inactive)
+            response = TargetingKey(name=inactive).activate()
+            changes = response['numChanges'] if 'numChanges' in response else None
+            if not changes == len(inactive):
+                raise ResourceNotActive(f'Bidder Targeting Key activation, {inactive}, of ' \
+                                        f'{len(inactive)} changes, reported {changes} changes')
+            for name in inactive:
+                keys[name]['status'] = 'ACTIVE'
+        missing = [n_ for n_ in dict.fromkeys(names) if n_ not in keys]
+        if missing:
+            reportableType = config.targeting_bidder_key_config().get('reportableType', 'OFF')
+            recs = [TargetingKey(name=n_, reportableType=reportableType).create_params \
+                    for n_ in missing]
+            created = TargetingKey().create(recs, validate=True)
+            if self.journal:
+                self.journal.record('targeting_key', created, key=lambda r_: r_['name'])
+            keys.update({r_['name']:serialize_object(r_) for r_ in created})
+        return keys
+
+    def provision_advertisers(self) -> Dict[str, dict]:
+        cfgs = {b_.code:render_cfg('advertiser', b_) for b_ in self.bidders}
+        size = config.app['mgr']['max_names_per_query']
+        ids = [c_['id'] for c_ in cfgs.values() if c_.get('id')]
+        by_id = Advertiser().fetch_in('id', ids, size) if ids else {}
+        missing_ids = [i_ for i_ in dict.fromkeys(ids) if i_ not in by_id]
+        if len(missing_ids) == 1:
+            raise ResourceNotFound(f"Advertiser id: {missing_ids[0]} was not found")
+        if missing_ids:
+            raise ResourceNotFound(
+                f"Advertiser ids: {', '.join(str(i_) for i_ in missing_ids)} were not found")
+        names = [c_['name'] for c_ in cfgs.values() if not c_.get('id')]
+        by_name = Advertiser().fetch_in('name', names, size) if names else {}
+        recs = {}
+        for cfg in cfgs.values():
+            if not cfg.get('id') and cfg['name'] not in by_name:
+                recs.setdefault(cfg['name'], Advertiser(
+                    name=cfg['name'],
+                    type=cfg.get('type', config.app['mgr']['advertiser']['type'])).create_params)
+        if recs:
+            created = Advertiser().create(list(recs.values()), validate=True)
+            if self.journal:
+                self.journal.record('advertiser', created, key=lambda r_: r_['name'])
+            by_name.update({r_['name']:r_ for r_ in created})
+        return {code:by_id[c_['id']] if c_.get('id') else by_name[c_['name']] \
+                for code, c_ in cfgs.items()}
+
     def cleanup(self) -> None:
+        status = 'done' if self.success else 'failed'
         if not self.success and not config.cli['skip_auto_archive']:
             self.archive()
+            status = 'archived'
+        if self.journal:
+            self.journal.status(status)
+            if not self.success and config.cli['skip_auto_archive']:
+                logger.info('Resume this run using: --resume %s', self.journal.run_id)
+            self.journal.close()
+        if config.cli.get('dry_run'):
+            log_dry_run_stats()
+        elif 'autotuner' in config.memo:
+            autotuner().save()
+        logger.log(VERBOSE1, 'GAM services: %s',
+                   Lazy(lambda: service_cache(config.client,
+                                              **config.app['googleads']['http']).stats()))
 
     def check_resources(self) -> None:
-        _ = self.ad_units
-        _ = self.placements
-        _ = self.bidders
+        with profiler.phase('check_resources'):
+            _ = self.ad_units
+            _ = self.placements
+            _ = self.targeting_custom
+            with profiler.phase('bidders'):
+                self.provision_bidders()
+            with profiler.phase('creatives'):
+                self.provision_creatives()
 
     def create_line_items(self) -> None:
         self.check_resources()
+        if config.jobs > 1:
+            self.create_line_items_concurrently(config.jobs)
+            return
+        if config.cli.get('pipeline'):
+            self.create_line_items_pipelined()
+            return
         for bidder in self.bidders:
             logger.info('#' * 80)
             logger.info('Bidder: name="%s", code="%s"', bidder.name, bidder.code)
             logger.info('Key: "%s", Values: %s', bidder.targeting_key,
-                        format_long_list(config.cpm_names()))
+                        Lazy(format_long_list, config.cpm_names()))
             for media_type in config.media_types():
                 logger.info('#' * 60)
                 logger.info('Media Type: "%s"', media_type)
                 for cpms in config.cpm_names_batched():
                     logger.info('Line Items: CPMs(min=%s, max=%s, count=%d)',
                                 cpms[0], cpms[-1], len(cpms))
-                    li_ = self.add_li_obj(media_type, bidder, cpms)
-                    logger.info('Line Item Creative Associations: Creative Count=%d',
-                                len(li_.creatives))
-                    self._lica_objs.append(li_.create())
+                    self._lica_objs.append(self.create_unit(media_type, bidder, cpms))
+
+    def create_line_items_concurrently(self, jobs: int) -> None:
+        units = self.units()
+        self.prefetch_resources()
+        logger.info('Creating %d orders using %d jobs', len(units), jobs)
+        pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='line_item_manager')
+        futures: List[Future] = []
+        try:
+            for i_, unit in enumerate(units):
+                futures.append(pool.submit(self.create_unit, *unit, index=i_))
+            with tqdm(total=len(futures)) as pbar:
+                for future in futures:
+                    self._lica_objs.append(future.result())
+                    pbar.update(1)
+        finally:
+            # on failure or interrupt, let running units finish so cleanup sees their orders
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def create_line_items_pipelined(self) -> None:
+        self.prefetch_resources()
+        units = self.units()
+        # creative associations by unit index, in unit order as in a serial run
+        licas = [self.resumed_unit(*u_) for u_ in units]
+        pending = [i_ for i_, l_ in enumerate(licas) if l_ is None]
+        pipeline = Pipeline([
+            lambda unit: self.create_unit_order(*unit),
+            self.create_unit_line_items,
+            self.create_unit_licas,
+        ], maxsize=config.app['mgr']['pipeline']['max_queued'])
+        for i_, unit_licas in zip(pending, pipeline.run([units[i_] for i_ in pending])):
+            licas[i_] = unit_licas
+        self._lica_objs += licas
+
+    def create_unit_order(self, media_type: str, bidder: PrebidBidder,
+                          cpms: PriceLadder) -> GAMLineItems:
+        li_ = self.add_li_obj(media_type, bidder, cpms)
+        logger.info('Order: bidder="%s", media_type="%s", CPMs(min=%s, max=%s, count=%d)',
+                    bidder.code, media_type, cpms[0], cpms[-1], len(cpms))
+        _ = li_.order, li_.targeting_key, li_.creatives
+        return li_
+
+    def create_unit_line_items(self, li_: GAMLineItems) -> GAMLineItems:
+        _ = li_.line_items
+        return li_
+
+    def create_unit_licas(self, li_: GAMLineItems) -> List[dict]:
+        logger.info('Line Item Creative Associations: Order="%s", Creative Count=%d',
+                    li_.order['name'], len(li_.creatives))
+        return self.complete_unit(li_, li_.create())
+
+    def complete_unit(self, li_: GAMLineItems, licas: List[dict]) -> List[dict]:
+        if self.journal:
+            self.journal.record('unit', [dict(id=li_.order['id'], key=li_.unit_key,
+                                              licas=[lica_key(r_) for r_ in licas])],
+                                key=lambda r_: r_['key'])
+        return licas
+
+    def resumed_unit(self, media_type: str, bidder: PrebidBidder,
+                     cpms: PriceLadder) -> Optional[List[dict]]:
+        """Get the creative associations of a unit completed by the resumed run, if any."""
+        key = unit_key(media_type, bidder, cpms)
+        unit = self.journal.get('unit', [key]).get(key) if self.journal else None
+        if unit is None:
+            return None
+        logger.info('Resume: Order %s of bidder="%s", media_type="%s", CPMs(min=%s, max=%s) '
+                    'was completed', unit['id'], bidder.code, media_type, cpms[0], cpms[-1])
+        licas = self.journal.get('lica', unit['licas']) # type: ignore[union-attr]
+        return [licas[k_] for k_ in unit['licas']]
+
+    def create_unit(self, media_type: str, bidder: PrebidBidder, cpms: PriceLadder,
+                    index: Optional[int]=None) -> List[dict]:
+        licas = self.resumed_unit(media_type, bidder, cpms)
+        if licas is not None:
+            return licas
+        li_ = self.add_li_obj(media_type, bidder, cpms, index=index)
+        if index is not None:
+            logger.info('Order %d: bidder="%s", media_type="%s", CPMs(min=%s, max=%s, count=%d)',
+                        index + 1, bidder.code, media_type, cpms[0], cpms[-1], len(cpms))
+        logger.info('Line Item Creative Associations: Creative Count=%d', len(li_.creatives))
+        return self.complete_unit(li_, li_.create())
+
+    def open_journal(self, configfile: Optional[str]=None, read_only: bool=False) -> None:
+        """Start the journal of a new run, or open the journal of the run to resume, restoring
+        its start time used in order and line item names."""
+        filename = os.path.join(cache_dir(), config.app['mgr']['journal']['filename'])
+        self.journal = Journal(filename, run_id=config.cli.get('resume'),
+                               start_time=config.start_time, configfile=configfile,
+                               read_only=read_only,
+                               max_age_days=config.app['mgr']['journal']['max_age_days'])
+        config.start_time = self.journal.start_time
+        logger.info('Run id: %s, journal: "%s"', self.journal.run_id, filename)
 
     @property
     def network(self) -> dict:
@@ -289,14 +676,14 @@ class GAMConfig:
     @property
     def placements(self) -> List[dict]:
         if self._placements is None:
-            self._placements = []
-            for name in config.user.get('targeting', {}).get('placement_names', []):
-                placement = Placement(name=name).fetchone()
-                if not placement:
-                    raise ResourceNotFound(f'Placement named \'{name}\' was not found')
-                self._placements.append(placement)
+            self._placements = fetch_names(Placement(), 'Placement',
+                                           config.user.get('targeting', {}).get('placement_names', []))
         return self._placements
 
+    def prefetch_resources(self) -> None:
+        # shared lazy resources are resolved before concurrent units need them
+        _ = self.network, self.user, self.targeting_custom
+
     @property
     def success(self) -> bool:
         return self._success
@@ -316,6 +703,11 @@ class GAMConfig:
                 for D_ in config.custom_targeting_key_values()]
         return self._targeting_custom
 
+    def units(self) -> List[Tuple[str, PrebidBidder, List[str]]]:
+        return [(media_type, bidder, cpms) for bidder in self.bidders \
+                for media_type in config.media_types() \
+                for cpms in config.cpm_names_batched()]
+
     @property
     def user(self) -> dict:
         if self._user is None:
@@ -1,12 +1,20 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pprint import pformat
-from typing import Any, List, Optional, Tuple
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import weakref
 
 from googleads import ad_manager
 from googleads.common import ZeepServiceProxy
+import requests
 import yaml
 
 from .config import config, VERBOSE2
-from line_item_manager.utils import load_package_file
+from .metrics import metrics
+from .rate_limit import rate_controller, RateController
+from line_item_manager.utils import ichunk, Lazy, load_package_file, KeyedLocks, pretty
 
 logger = config.getLogger('operations')
 
@@ -20,6 +28,124 @@ def client(network_code: int, key_file: str) -> ad_manager.AdManagerClient:
     _cfg['ad_manager']['path_to_private_key_file'] = key_file
     return ad_manager.AdManagerClient.LoadFromString(yaml.dump(_cfg))
 
+class ServiceCache:
+    """Service proxies of a client, created once per service and version.
+
+    Proxies are shared by all threads and use a single pooled HTTP session, so connections
+    are kept alive and reused across services.
+    """
+
+    def __init__(self, client: Any, pool_size: int, keep_alive: bool):
+        """Initialize ServiceCache.
+
+        Args:
+          client: GAM client
+          pool_size: maximum number of connections kept per host
+          keep_alive: False to close connections after each request
+        """
+        self.client = client
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.counts: Counter = Counter()
+        self._proxies: Dict[Tuple[str, str], Any] = {}
+        self._locks = KeyedLocks()
+        self._lock = Lock()
+        self._adapter: Optional[requests.adapters.HTTPAdapter] = None
+        self._session: Optional[requests.Session] = None
+
+    def get(self, service: str, version: str) -> ZeepServiceProxy:
+        """Get the proxy of a service, creating it if needed.
+
+        Args:
+          service: GAM service name
+          version: GAM API version
+
+        Returns:
+          Service proxy
+        """
+        key = (service, version)
+        with self._locks(key):
+            if key in self._proxies:
+                with self._lock:
+                    self.counts['proxies_reused'] += 1
+                return self._proxies[key]
+            svc = self.client.GetService(service, version=version)
+            self.pool(svc)
+            self._proxies[key] = svc
+            with self._lock:
+                self.counts['proxies_created'] += 1
+            return svc
+
+    def pool(self, svc: Any) -> None:
+        transport = getattr(getattr(svc, 'zeep_client', None), 'transport', None)
+        if not isinstance(getattr(transport, 'session', None), requests.Session):
+            return
+        with self._lock:
+            if self._session is None:
+                self._adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                self._session = requests.Session()
+                self._session.proxies = transport.session.proxies
+                self._session.mount('https://', self._adapter)
+                self._session.mount('http://', self._adapter)
+                if not self.keep_alive:
+                    self._session.headers['Connection'] = 'close'
+                self._session.hooks['response'].append(metrics.on_response)
+            transport.session = self._session
+
+    def stats(self) -> Dict[str, int]:
+        """Get counts of proxies and HTTP connections created and reused.
+
+        Returns:
+          Dict of counts
+        """
+        out = dict(proxies_created=0, proxies_reused=0, connections_created=0,
+                   connections_reused=0)
+        with self._lock:
+            out.update(self.counts)
+            if self._adapter is not None:
+                pools = self._adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        out['connections_created'] += pool.num_connections
+                        out['connections_reused'] += pool.num_requests - pool.num_connections
+        return out
+
+_service_caches: 'weakref.WeakKeyDictionary[Any, ServiceCache]' = weakref.WeakKeyDictionary()
+_service_caches_lock = Lock()
+
+def service_cache(client: Any, pool_size: int=10, keep_alive: bool=True) -> ServiceCache:
+    """Get the service proxy cache of a client, creating it if needed.
+
+    Args:
+      client: GAM client
+      pool_size: maximum number of connections kept per host, used on creation
+      keep_alive: False to close connections after each request, used on creation
+
+    Returns:
+      ServiceCache instance of the client
+    """
+    with _service_caches_lock:
+        if client not in _service_caches:
+            _service_caches[client] = ServiceCache(client, pool_size, keep_alive)
+        return _service_caches[client]
+
+def _page_results(response: Any) -> List[dict]:
+    return list(response['results']) if 'results' in response and response['results'] else []
+
+def _offset_statements(stm: ad_manager.StatementBuilder, response: Any) -> List[dict]:
+    """Statements of the pages from the current offset to the end of the result set, as
+    reported by a full page, leaving the offset at the last page."""
+    total = response['totalResultSetSize'] if 'totalResultSetSize' in response else None
+    out = []
+    offset = stm.offset
+    for offset in range(stm.offset, total or 0, stm.limit):
+        stm.offset = offset
+        out.append(stm.ToStatement())
+    stm.offset = offset
+    return out
+
 class GAMOperations:
     service: str = ''
     method: str = ''
@@ -27,6 +153,7 @@ class GAMOperations:
     query_fields: Optional[Tuple[str, ...]] = None
     create_fields: Optional[Tuple[str, ...]] = None
     log_fields: Optional[Tuple[str, ...]] = None
+    page_size: int = ad_manager.SUGGESTED_PAGE_LIMIT
     use_statement = True
 
     def __init__(self, **kwargs):
@@ -37,27 +164,25 @@ class GAMOperations:
           if self.create_fields else self.params
 
     def create(self, atts: List[dict], validate: bool=False, verbose: bool=True) -> List[dict]:
-        logger.log(VERBOSE2, _CREATE_LOG_LINE, type(self).__name__, pformat(self.log_recs(atts)))
+        logger.log(VERBOSE2, _CREATE_LOG_LINE, type(self).__name__,
+                   Lazy(lambda: pformat(self.log_recs(atts))))
         results = self.dry_run_recs(atts) if self.dry_run else \
-          getattr(self.svc(), self.create_method)(atts)
+          self.call(self.create_method, atts)
         if verbose:
-            logger.log(VERBOSE2, _RESULTS_LOG_LINE, self.service, self.method, pformat(results))
+            logger.log(VERBOSE2, _RESULTS_LOG_LINE, self.service, self.method, pretty(results))
         if validate:
             self.validate(atts, results)
         return results
 
     def fetch(self, one: bool=False, create: bool=False, recs: List[dict]=None,
               validate: bool=False) -> List[dict]:
-        logger.log(VERBOSE2, _QUERY_LOG_LINE, self.service, self.method, pformat(self.query_params))
+        logger.log(VERBOSE2, _QUERY_LOG_LINE, self.service, self.method, pretty(self.query_params))
         results = self._results(one=one)
-        if create and recs:
-            current = {self.check(r_) for r_ in results}
-            new_recs = [r_ for r_ in recs if self.check(r_) not in current]
+        if create:
+            new_recs = self.missing_recs(results, recs)
             if new_recs:
                 results += self.create(new_recs, verbose=False)
-        elif create and not results:
-            results = self.create([self.create_params], verbose=False)
-        logger.log(VERBOSE2, _RESULTS_LOG_LINE, self.service, self.method, pformat(results))
+        logger.log(VERBOSE2, _RESULTS_LOG_LINE, self.service, self.method, pretty(results))
         if validate:
             self.validate(recs, results)
         return results
@@ -66,33 +191,98 @@ class GAMOperations:
         recs = self.fetch(one=True, **kwargs)
         return recs[0] if recs else {}
 
+    def fetch_in(self, field: str, values: List[Any], size: int,
+                 key: Optional[Callable[[dict], Any]]=None) -> Dict[Any, dict]:
+        """Fetch records whose field is one of the values, with an IN query per chunk.
+
+        Args:
+          field: query field, e.g. name
+          values: field values
+          size: maximum number of values per query
+          key: record key function, defaults to the field value
+
+        Returns:
+          Dict of found records keyed by field value or key
+        """
+        out: Dict[Any, dict] = {}
+        for chunk in ichunk(list(dict.fromkeys(values)), size):
+            op_ = type(self)(**dict(self.params, **{field: chunk}))
+            logger.log(VERBOSE2, _QUERY_LOG_LINE, self.service, self.method,
+                       pretty(op_.query_params))
+            for rec in op_._results():
+                out.setdefault(key(rec) if key else rec[field], rec)
+        return out
+
+    def missing_recs(self, results: List[dict], recs: List[dict]=None) -> List[dict]:
+        if recs:
+            current = {self.check(r_) for r_ in results}
+            return [r_ for r_ in recs if self.check(r_) not in current]
+        return [] if results else [self.create_params]
+
     def _results(self, one: bool=False) -> List[dict]:
+        if one:
+            return list(islice(self.iter_results(limit=1), 1))
+        return list(self.iter_results())
+
+    def iter_results(self, limit: Optional[int]=None) -> Iterator[dict]:
+        """Stream query records page by page.
+
+        With more than one paging worker, the offset pages following the first are fetched
+        concurrently once the first page reports the total result set size.
+
+        Args:
+          limit: page size, defaults to the page size of the operation
+
+        Yields:
+          Query records
+        """
         if not self.use_statement:
-            return [getattr(self.svc(), self.method)()]
-        _stm = self.statement()
-        results = []
+            yield self.call(self.method)
+            return
+        _stm = self.statement(limit=limit or self.page_limit)
+        workers = self.paging.get('workers', 1)
         while True:
-            response = getattr(self.svc(), self.method)(_stm.ToStatement())
-            if not ("results" in response and response["results"]):
-                break
-            for result in response["results"]:
-                if one:
-                    return [result]
-                results.append(result)
+            response = self._page(_stm.ToStatement())
+            results = _page_results(response)
+            yield from results
             if len(results) < _stm.limit:
-                break
+                return
             _stm.offset += _stm.limit
-        return results
+            statements = _offset_statements(_stm, response) if workers > 1 else []
+            if statements:
+                with ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix='gam_paging') as pool:
+                    for results in map(_page_results, pool.map(self._page, statements)):
+                        yield from results
+                if len(results) < _stm.limit:
+                    return
+                _stm.offset += _stm.limit
+
+    def _page(self, statement: dict) -> Any:
+        return self.call(self.method, statement)
 
-    def statement(self) -> ad_manager.StatementBuilder:
+    def statement(self, limit: Optional[int]=None) -> ad_manager.StatementBuilder:
         _stm = ad_manager.StatementBuilder(version=self.version)
+        if limit:
+            _stm.limit = limit
         if self.query_params:
-            _stm.Where(' AND '.join([f"{k} = :{k}" for k in self.query_params]))
+            _stm.Where(' AND '.join([f"{k} IN :{k}" if isinstance(v, list) else f"{k} = :{k}" \
+                                     for k, v in self.query_params.items()]))
             _ = [_stm.WithBindVariable(k, v) for k, v in self.query_params.items()]
         return _stm
 
     def svc(self) -> ZeepServiceProxy:
-        return self.client.GetService(self.service, version=self.version) # type: ignore[union-attr]
+        return service_cache(self.client, **self.http_pool).get(self.service, self.version)
+
+    def call(self, method: str, *args) -> Any:
+        # a create may be partly committed before a fault, so it is reconciled by the caller
+        # instead of being resent
+        return self.controller().call(metrics.call, self.service, method,
+                                      getattr(self.svc(), method), *args,
+                                      retry=not method.startswith('create'))
+
+    def controller(self) -> RateController:
+        return rate_controller(self.client, **self.rate_limit)
 
     def log_recs(self, recs: List[dict]) -> List[dict]:
         if self.log_fields:
@@ -107,6 +297,24 @@ class GAMOperations:
     def version(self) -> str:
         raise NotImplementedError
 
+    @property
+    def http_pool(self) -> dict:
+        raise NotImplementedError
+
+    @property
+    def paging(self) -> dict:
+        raise NotImplementedError
+
+    @property
+    def rate_limit(self) -> dict:
+        raise NotImplementedError
+
+    @property
+    def page_limit(self) -> int:
+        sizes = self.paging.get('page_sizes', {})
+        return next((sizes[c_.__name__] for c_ in type(self).__mro__ if c_.__name__ in sizes),
+                    self.page_size)
+
     @property
     def dry_run(self) -> bool:
         raise NotImplementedError
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+import json
+import secrets
+import sqlite3
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from zeep.helpers import serialize_object
+
+from .exceptions import ResourceNotActive, ResourceNotFound
+from .utils import ichunk
+
+_MAX_VARIABLES = 500
+_FINAL_STATUSES = ('archived', 'done')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  run_id TEXT PRIMARY KEY,
+  start_time TEXT NOT NULL,
+  configfile TEXT,
+  status TEXT NOT NULL,
+  updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+  run_id TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  key TEXT NOT NULL,
+  id INTEGER,
+  rec TEXT NOT NULL,
+  PRIMARY KEY (run_id, kind, key)
+);
+"""
+
+class Journal:
+    """Local SQLite record of the entities created by a create run, keyed by run id.
+
+    Entities are written as each batch completes, so a run that fails or is interrupted can
+    be resumed, skipping the completed units and the line items and creative associations
+    already created. A run that is done, or whose orders were archived, cannot be resumed.
+    Writes are serialized, so a journal may be shared by concurrent units.
+    """
+
+    def __init__(self, filename: str, run_id: Optional[str]=None,
+                 start_time: Optional[datetime]=None, configfile: Optional[str]=None,
+                 read_only: bool=False, max_age_days: int=0):
+        """Initialize Journal, starting a new run or resuming an existing one.
+
+        Args:
+          filename: SQLite database file
+          run_id: id of the run to resume, a new run is started if None
+          start_time: start time of a new run
+          configfile: user config file of a new run
+          read_only: True to open the run to resume without marking it as running
+          max_age_days: runs last updated earlier are removed when a new run starts, 0 keeps
+            all runs
+
+        Raises:
+          ResourceNotFound: if the run to resume is not in the journal
+          ResourceNotActive: if the run to resume is done or archived
+        """
+        self.filename = filename
+        self._lock = Lock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        if run_id is None:
+            if max_age_days:
+                self.prune(datetime.now() - timedelta(days=max_age_days))
+            start_time = start_time or datetime.now()
+            self.run_id = f'{start_time:%Y%m%d-%H%M%S}-{secrets.token_hex(3)}'
+            self.start_time = start_time
+            with self._conn:
+                self._conn.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?)',
+                                   (self.run_id, start_time.isoformat(), configfile, 'running',
+                                    datetime.now().isoformat()))
+        else:
+            row = self._conn.execute('SELECT start_time, status FROM runs WHERE run_id = ?',
+                                     (run_id, )).fetchone()
+            if row is None:
+                self._conn.close()
+                raise ResourceNotFound(f"Run id '{run_id}' was not found in journal {filename}")
+            if row[1] in _FINAL_STATUSES:
+                self._conn.close()
+                raise ResourceNotActive(f"Run id '{run_id}' is {row[1]} and cannot be resumed")
+            self.run_id = run_id
+            self.start_time = datetime.fromisoformat(row[0])
+            if not read_only:
+                self.status('running')
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def status(self, status: str) -> None:
+        """Set the run status, e.g. running, failed, archived or done.
+
+        Args:
+          status: run status
+        """
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE runs SET status = ?, updated = ? WHERE run_id = ?',
+                               (status, datetime.now().isoformat(), self.run_id))
+
+    def prune(self, before: datetime) -> int:
+        """Remove the runs last updated before a time, with their entities.
+
+        Args:
+          before: oldest update time of the runs kept
+
+        Returns:
+          Number of runs removed
+        """
+        with self._lock, self._conn:
+            run_ids = [r_[0] for r_ in self._conn.execute(
+                'SELECT run_id FROM runs WHERE updated < ?', (before.isoformat(), ))]
+            for chunk in ichunk(run_ids, _MAX_VARIABLES):
+                marks = ", ".join("?" * len(chunk))
+                self._conn.execute(f'DELETE FROM entities WHERE run_id IN ({marks})', chunk)
+                self._conn.execute(f'DELETE FROM runs WHERE run_id IN ({marks})', chunk)
+        return len(run_ids)
+
+    def record(self, kind: str, recs: Iterable[Any], key: Callable[[dict], Any]) -> None:
+        """Record created entities in a single transaction.
+
+        Args:
+          kind: entity kind, e.g. line_item
+          recs: created records
+          key: record key function, unique within the kind
+        """
+        rows = []
+        for rec in recs:
+            rec = serialize_object(rec)
+            rows.append((self.run_id, kind, str(key(rec)), rec.get('id'),
+                         json.dumps(rec, default=str)))
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)', rows)
+
+    def get(self, kind: str, keys: Optional[List[Any]]=None) -> Dict[str, dict]:
+        """Get recorded entities of the run.
+
+        Args:
+          kind: entity kind, e.g. line_item
+          keys: record keys, all records of the kind if None
+
+        Returns:
+          Dict of records keyed by record key
+        """
+        query = 'SELECT key, rec FROM entities WHERE run_id = ? AND kind = ?'
+        rows = []
+        with self._lock:
+            if keys is None:
+                rows = self._conn.execute(query, (self.run_id, kind)).fetchall()
+            for chunk in ichunk([str(k_) for k_ in keys or []], _MAX_VARIABLES):
+                rows += self._conn.execute(f'{query} AND key IN ({", ".join("?" * len(chunk))})',
+                                           (self.run_id, kind, *chunk)).fetchall()
+        return {k_:json.loads(r_) for k_, r_ in rows}
@@ -0,0 +1,181 @@
+from collections import Counter
+from datetime import datetime
+import json
+import math
+import threading
+from timeit import default_timer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import config
+
+logger = config.getLogger(__name__)
+
+_PERCENTILES = (50, 95, 99)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Get a nearest rank percentile.
+
+    Args:
+      values: sorted values
+      pct: percentile, e.g. 95
+
+    Returns:
+      Percentile value, 0.0 if there are no values
+    """
+    if not values:
+        return 0.0
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+def record_count(response: Any) -> int:
+    """Get the number of records of a service response, a list or a page of results."""
+    if isinstance(response, list):
+        return len(response)
+    try:
+        return len(response['results']) if 'results' in response and response['results'] \
+          else 0
+    except TypeError:
+        return 0
+
+class Metrics:
+    """Counts, latencies and payload sizes of the GAM service calls of a run.
+
+    Calls are keyed by service and method and attributed to the run phase of the calling
+    thread, e.g. line_item_create. Request and response bytes are counted by a hook of the
+    pooled HTTP session. Nothing is recorded unless enabled with start().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._start = default_timer()
+        self._latencies: Dict[Tuple[str, str], List[float]] = {}
+        self._counts: Dict[Tuple[str, str], Counter] = {}
+        self._phases: Dict[str, Counter] = {}
+
+    def start(self) -> None:
+        """Start recording the metrics of a run."""
+        with self._lock:
+            self._reset()
+        self.enabled = True
+
+    def call(self, service: str, method: str, func: Callable, *args: Any) -> Any:
+        """Call a service method, recording its latency, records and errors.
+
+        Args:
+          service: GAM service name
+          method: service method name
+          func: service method
+          args: method arguments
+
+        Returns:
+          Service response
+        """
+        if not self.enabled:
+            return func(*args)
+        key = (service, method)
+        self._local.key = key
+        start = default_timer()
+        try:
+            response = func(*args)
+        except Exception:
+            self.add(key, default_timer() - start, errors=1)
+            raise
+        records = record_count(response)
+        self.add(key, default_timer() - start, records=records,
+                 created=records if method.startswith('create') else 0)
+        return response
+
+    def add(self, key: Tuple[str, str], seconds: Optional[float]=None, **counts: int) -> None:
+        """Add to the metrics of a service method and of the current phase.
+
+        Args:
+          key: service and method
+          seconds: call latency, None if not a call
+          counts: counts, e.g. records or bytes_sent
+        """
+        phase = self.phase_name()
+        with self._lock:
+            if seconds is not None:
+                self._latencies.setdefault(key, []).append(seconds)
+                counts['calls'] = 1
+            self._counts.setdefault(key, Counter()).update(counts)
+            self._phases.setdefault(phase, Counter()).update(
+                {k_:v_ for k_, v_ in counts.items() if k_ in ('calls', 'created', 'retries')})
+
+    def on_response(self, response: Any, *args: Any, **kwargs: Any) -> None:
+        """Count request and response bytes, a requests session response hook."""
+        key = getattr(self._local, 'key', None)
+        if self.enabled and key is not None:
+            self.add(key, bytes_sent=len(response.request.body or b''),
+                     bytes_received=len(response.content))
+
+    def retry(self) -> None:
+        """Count a retry of the last failed call of the thread."""
+        key = getattr(self._local, 'key', None)
+        if self.enabled and key is not None:
+            self.add(key, retries=1)
+
+    def enter_phase(self, name: str) -> None:
+        self._local.__dict__.setdefault('phases', []).append((name, default_timer(), 0.0))
+
+    def exit_phase(self) -> None:
+        phases = self._local.phases
+        name, start, child = phases.pop()
+        elapsed = default_timer() - start
+        if phases:
+            phases[-1] = (*phases[-1][:2], phases[-1][2] + elapsed)
+        with self._lock:
+            counts = self._phases.setdefault(name, Counter())
+            counts['seconds'] += elapsed - child
+            counts['entries'] += 1
+
+    def phase_name(self) -> str:
+        phases = self._local.__dict__.get('phases')
+        return phases[-1][0] if phases else 'other'
+
+    def report(self) -> Dict[str, Any]:
+        """Get the metrics of the run.
+
+        Returns:
+          Dict of wall time, and metrics by service method and by phase
+        """
+        with self._lock:
+            services = {}
+            for key, counts in sorted(self._counts.items()):
+                latencies = sorted(self._latencies.get(key, []))
+                services['.'.join(key)] = dict(
+                    {k_:counts[k_] for k_ in ('calls', 'errors', 'retries', 'records',
+                                              'bytes_sent', 'bytes_received')},
+                    seconds=round(sum(latencies), 6),
+                    **{f'p{p_}_ms':round(1e3 * percentile(latencies, p_), 3) \
+                       for p_ in _PERCENTILES})
+            phases = {}
+            for name, counts in self._phases.items():
+                phases[name] = dict(
+                    {k_:counts[k_] for k_ in ('calls', 'created', 'retries')},
+                    seconds=round(counts['seconds'], 6),
+                    records_per_second=round(counts['created'] / counts['seconds'], 1) \
+                      if counts['seconds'] else None)
+        return dict(wall_seconds=round(default_timer() - self._start, 6),
+                    calls=sum(s_['calls'] for s_ in services.values()),
+                    services=services, phases=phases)
+
+    def finish(self, filename: str) -> None:
+        """Stop recording, writing the metrics of the run to a JSON file.
+
+        Args:
+          filename: JSON output file
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        out = dict(created=datetime.now().isoformat(timespec='seconds'), **self.report())
+        with open(filename, 'w') as fp:
+            json.dump(out, fp, indent=2)
+        logger.info('Metrics of %d calls written to "%s"', out['calls'], filename)
+
+metrics = Metrics()
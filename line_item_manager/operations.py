@@ -1,11 +1,15 @@
-import copy
-from typing import List, Optional, Tuple, Union
+from collections import Counter
+import json
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from googleads import ad_manager
 
 from .config import config
 from .gam_operations import GAMOperations
-from .utils import num_hash
+
+_dry_run_lock = Lock()
+_PARENT_FIELDS = ('orderId', 'advertiserId', 'customTargetingKeyId')
 
 class AppOperations(GAMOperations):
     """Operations using GAM abstract class."""
@@ -28,6 +32,33 @@ class AppOperations(GAMOperations):
         """
         return config.app['googleads']['version']
 
+    @property
+    def http_pool(self) -> dict:
+        """Get HTTP connection pool settings of service proxies.
+
+        Returns:
+          Dict of pool_size and keep_alive values
+        """
+        return config.app['googleads']['http']
+
+    @property
+    def paging(self) -> dict:
+        """Get query paging settings.
+
+        Returns:
+          Dict of page_sizes per operation class and workers fetching pages
+        """
+        return config.app['googleads']['paging']
+
+    @property
+    def rate_limit(self) -> dict:
+        """Get rate controller settings of GAM calls.
+
+        Returns:
+          Dict of RateController arguments
+        """
+        return config.app['googleads']['rate_limit']
+
     @property
     def dry_run(self) -> bool:
         """Get dry run state.
@@ -40,26 +71,40 @@ class AppOperations(GAMOperations):
     def create_id(self, rec: dict) -> int:
         """Create ID from reference rec.
 
+        IDs are numbered per service in order of creation. A rec with the same check key and
+        parent gets the same ID within a run.
+
         Args:
           rec: reference
 
         Returns:
-          Integer hash as ID
+          Integer ID
         """
-        n_ = num_hash([type(self).__name__, str(rec)])
-        return int(''.join([str(config.app['mgr']['dry_run']['id_prefix']), str(n_)]))
+        key = (self.check(rec), *(rec.get(f_) for f_ in _PARENT_FIELDS))
+        with _dry_run_lock:
+            ids: Dict[Any, int] = config.memo.setdefault(('dry_run_ids', self.service), {})
+            if key not in ids:
+                ids[key] = int(f"{config.app['mgr']['dry_run']['id_prefix']}{len(ids) + 1:06d}")
+            return ids[key]
 
     def dry_run_recs(self, recs: List[dict]) -> List[dict]:
         """Recs that are returned on create when doing a dry run.
 
+        Recs are shallow copies and payload counts and sizes are added to the dry run stats.
+
         Args:
           recs: reference recs
 
         Returns:
           Reference recs with dummy IDs
         """
-        out = copy.deepcopy(recs)
-        _ = [r_.update(dict(id=self.create_id(r_))) for r_ in out]
+        out = [dict(r_, id=self.create_id(r_)) for r_ in recs]
+        size = sum(len(json.dumps(r_, separators=(',', ':'), default=str)) for r_ in recs)
+        with _dry_run_lock:
+            stats: Counter = config.memo.setdefault('dry_run_stats', Counter())
+            stats[(self.service, 'records')] += len(recs)
+            stats[(self.service, 'bytes')] += size
+            stats[(self.service, 'calls')] += 1
         return out
 
     def check(self, rec: dict) -> Union[str, Tuple[int, int]]:
@@ -111,6 +156,9 @@ class Creative(AppOperations):
             kwargs['width'] = kwargs['size']['width']
         super().__init__(*args, **kwargs)
 
+    def check(self, rec: dict) -> Tuple[int, str, int, int]:
+        return (rec['advertiserId'], rec['name'], rec['size']['width'], rec['size']['height'])
+
 class CreativeVideo(Creative):
     create_fields = ('xsi_type', 'name', 'advertiserId', 'size', 'vastXmlUrl',
                      'vastRedirectType', 'duration')
@@ -169,9 +217,8 @@ class Order(AppOperations):
     def archive(self) -> dict:
         if self.dry_run:
             return dict(numChanges=len(self.params['id']))
-        return self.svc().performOrderAction(
-            {'xsi_type': 'ArchiveOrders'},
-            self.statement().ToStatement()) # type: ignore[union-attr]
+        return self.call('performOrderAction', {'xsi_type': 'ArchiveOrders'},
+                         self.statement().ToStatement())
 
 class Placement(AppOperations):
     service = 'PlacementService'
@@ -190,6 +237,12 @@ class TargetingKey(AppOperations):
         kwargs['type'] = _type
         super().__init__(*args, **kwargs)
 
+    def activate(self) -> dict:
+        if self.dry_run:
+            return dict(numChanges=len(self.params['name']))
+        return self.call('performCustomTargetingKeyAction',
+                         {'xsi_type': 'ActivateCustomTargetingKeys'}, self.statement().ToStatement())
+
 class TargetingValues(AppOperations):
     service = 'CustomTargetingService'
     method = 'getCustomTargetingValuesByStatement'
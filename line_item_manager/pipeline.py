@@ -0,0 +1,105 @@
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Callable, Iterable, List, Optional
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+class Pipeline:
+    """Run items through a sequence of stages, each stage on its own thread.
+
+    Stages are connected by bounded queues, so a stage may work on item k+1 while the next
+    stage works on item k, without any stage running far ahead of the others. Results are
+    returned in input order. The first exception raised by a stage stops all stages after
+    their current item and is re-raised by run().
+    """
+
+    def __init__(self, stages: List[Callable[[Any], Any]], maxsize: int=1):
+        """Initialize Pipeline.
+
+        Args:
+          stages: callables applied in order, each receiving the previous stage's result
+          maxsize: maximum number of items queued between stages
+        """
+        self.stages = stages
+        self.maxsize = maxsize
+        self._stop = Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Run items through all stages.
+
+        Args:
+          items: pipeline input items
+
+        Returns:
+          Results of the last stage in input order
+        """
+        queues: List[Queue] = [Queue(self.maxsize) for _ in self.stages[1:]]
+        queues.append(Queue())
+        threads = [Thread(target=self._feed, args=(self.stages[0], items, queues[0]), daemon=True)]
+        threads += [Thread(target=self._work, args=(stage, queues[i_], queues[i_ + 1]), daemon=True)
+                    for i_, stage in enumerate(self.stages[1:])]
+        _ = [t_.start() for t_ in threads]
+        results = []
+        try:
+            while True:
+                try:
+                    result = queues[-1].get(timeout=_POLL_SECONDS)
+                except Empty:
+                    continue
+                if result is _DONE:
+                    break
+                results.append(result)
+        finally:
+            self._stop.set()
+            _ = [t_.join() for t_ in threads]
+        if self._error is not None:
+            raise self._error
+        return results
+
+    def _feed(self, stage: Callable[[Any], Any], items: Iterable[Any], outq: Queue) -> None:
+        try:
+            for item in items:
+                if self._stop.is_set() or not self._put(outq, stage(item)):
+                    break
+        except BaseException as e: # pylint: disable=broad-except
+            self._fail(e)
+        finally:
+            self._finish(outq)
+
+    def _work(self, stage: Callable[[Any], Any], inq: Queue, outq: Queue) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = inq.get(timeout=_POLL_SECONDS)
+                except Empty:
+                    continue
+                if item is _DONE or not self._put(outq, stage(item)):
+                    break
+        except BaseException as e: # pylint: disable=broad-except
+            self._fail(e)
+        finally:
+            self._finish(outq)
+
+    def _fail(self, exc: BaseException) -> None:
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL_SECONDS)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _finish(self, queue: Queue) -> None:
+        if self._put(queue, _DONE):
+            return
+        try:
+            queue.put_nowait(_DONE)
+        except Full:
+            pass
@@ -0,0 +1,183 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import config
+from .gam_config import GAMConfig, creative_ops, lica_key
+from .operations import Advertiser, Creative, LICA, LineItem, Order, TargetingKey, \
+     TargetingValues
+from .template import render_cfg
+
+logger = config.getLogger(__name__)
+
+_SYMBOLS = {'create': '+', 'activate': '~', 'exists': '='}
+
+class Plan:
+    """Resources a create run would create, activate or find existing, in creation order."""
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str, str, int]] = []
+
+    def add(self, action: str, kind: str, label: str, count: int=1) -> None:
+        """Add an entry to the plan.
+
+        Args:
+          action: create, activate or exists
+          kind: resource kind, e.g. Order
+          label: resource description
+          count: number of resources
+        """
+        if count:
+            self.entries.append((action, kind, label, count))
+
+    def counts(self) -> Dict[str, int]:
+        """Get number of resources per action.
+
+        Returns:
+          Dict of counts keyed by action
+        """
+        out: Counter = Counter({a_:0 for a_ in _SYMBOLS})
+        for action, _, _, count in self.entries:
+            out[action] += count
+        return dict(out)
+
+    def summary(self, show_existing: bool=False) -> str:
+        """Get a summary of the plan, one line per entry.
+
+        Args:
+          show_existing: include entries of existing resources
+
+        Returns:
+          Summary text
+        """
+        lines = []
+        for action, kind, label, count in self.entries:
+            if action == 'exists' and not show_existing:
+                continue
+            counted = f'{count} {kind}s' if count > 1 else kind
+            lines.append(f'  {_SYMBOLS[action]} {counted} {label}'.rstrip())
+        counts = self.counts()
+        lines.append(f"Plan: {counts['create']} to create, {counts['activate']} to activate, "
+                     f"{counts['exists']} existing.")
+        return '\n'.join(lines)
+
+class Planner:
+    """Compare the desired state of a create run with GAM using bulk reads only."""
+
+    def __init__(self, gam: GAMConfig):
+        """Initialize Planner.
+
+        Args:
+          gam: GAM config of the run
+        """
+        self.gam = gam
+        self.plan = Plan()
+        self.size = config.app['mgr']['max_names_per_query']
+
+    def run(self) -> Plan:
+        """Plan the creation of all resources of the run.
+
+        Returns:
+          The plan
+        """
+        _ = self.gam.ad_units, self.gam.placements
+        for cfg in config.custom_targeting_key_values():
+            self.targeting(cfg['name'], sorted(cfg['values']),
+                           TargetingKey(name=cfg['name']).fetchone())
+        keys = TargetingKey().fetch_in('name', [b_.targeting_key for b_ in self.gam.bidders],
+                                       self.size)
+        for name in dict.fromkeys(b_.targeting_key for b_ in self.gam.bidders):
+            self.targeting(name, config.cpm_names(), keys.get(name, {}))
+        advertisers = self.advertisers()
+        creatives = {}
+        for bidder in self.gam.bidders:
+            for media_type in config.media_types():
+                creatives[(bidder.code, media_type)] = \
+                  self.creatives(bidder, media_type, advertisers[bidder.code])
+        units = self.gam.units()
+        orders = self.orders(units, advertisers)
+        for unit, order in zip(units, orders):
+            self.unit(unit, order, creatives[(unit[1].code, unit[0])])
+        return self.plan
+
+    def targeting(self, name: str, values: List[str], key: dict) -> None:
+        label = f'"{name}"'
+        if not key:
+            self.plan.add('create', 'Targeting Key', label)
+            self.plan.add('create', 'Targeting Value', f'of {label}', len(values))
+            return
+        active = 'status' not in key or key['status'] == 'ACTIVE'
+        self.plan.add('exists' if active else 'activate', 'Targeting Key', label)
+        found = {v_['name'] for v_ in TargetingValues(key_id=key['id'], name=values).fetch()}
+        self.plan.add('exists', 'Targeting Value', f'of {label}', len(found))
+        self.plan.add('create', 'Targeting Value', f'of {label}',
+                      len([v_ for v_ in values if v_ not in found]))
+
+    def advertisers(self) -> Dict[str, Optional[dict]]:
+        cfgs = {b_.code:render_cfg('advertiser', b_) for b_ in self.gam.bidders}
+        ids = [c_['id'] for c_ in cfgs.values() if c_.get('id')]
+        names = [c_['name'] for c_ in cfgs.values() if not c_.get('id')]
+        found = Advertiser().fetch_in('id', ids, self.size) if ids else {}
+        found.update(Advertiser().fetch_in('name', names, self.size) if names else {})
+        out = {}
+        for code, cfg in cfgs.items():
+            out[code] = found.get(cfg['id'] if cfg.get('id') else cfg['name'])
+            label = f"id: {cfg['id']}" if cfg.get('id') else f"\"{cfg['name']}\""
+            self.plan.add('exists' if out[code] else 'create', 'Advertiser', label)
+        return out
+
+    def creatives(self, bidder: Any, media_type: str,
+                  advertiser: Optional[dict]) -> List[Optional[dict]]:
+        ops = creative_ops(bidder, media_type, advertiser['id'] if advertiser else None)
+        found: Dict[Any, dict] = {}
+        if advertiser:
+            op_ = Creative(advertiserId=advertiser['id'])
+            found = op_.fetch_in('name', [o_.params['name'] for o_ in ops], self.size,
+                                 key=op_.check)
+        out = []
+        for op_ in ops:
+            rec = op_.create_params
+            out.append(found.get(op_.check(rec)))
+            self.plan.add('exists' if out[-1] else 'create', 'Creative',
+                          f"\"{rec['name']}\" {rec['size']['width']}x{rec['size']['height']}")
+        return out
+
+    def orders(self, units: List[Tuple[str, Any, Any]],
+               advertisers: Dict[str, Optional[dict]]) -> List[Tuple[str, Optional[dict]]]:
+        names = [render_cfg('order', bidder, media_type=media_type, cpm_min=cpms[0],
+                            cpm_max=cpms[-1])['name'] for media_type, bidder, cpms in units]
+        by_advertiser: Dict[int, List[str]] = {}
+        for (_, bidder, _), name in zip(units, names):
+            if advertisers[bidder.code]:
+                by_advertiser.setdefault(advertisers[bidder.code]['id'], []).append(name)
+        found = {}
+        for advertiser_id, names_ in by_advertiser.items():
+            found.update({(advertiser_id, k_):v_ for k_, v_ in \
+                          Order(advertiserId=advertiser_id).fetch_in('name', names_,
+                                                                     self.size).items()})
+        return [(name, found.get((advertisers[bidder.code]['id'], name)) \
+                 if advertisers[bidder.code] else None) \
+                for (_, bidder, _), name in zip(units, names)]
+
+    def unit(self, unit: Tuple[str, Any, Any], order: Tuple[str, Optional[dict]],
+             creatives: List[Optional[dict]]) -> None:
+        media_type, bidder, cpms = unit
+        name, rec = order
+        names = [render_cfg('line_item', bidder, cpm=cpm, media_type=media_type)['name'] \
+                 for cpm in cpms]
+        self.plan.add('exists' if rec else 'create', 'Order', f'"{name}"')
+        if not rec:
+            self.plan.add('create', 'Line Item', f'of "{name}"', len(names))
+            self.plan.add('create', 'Line Item Creative Association', f'of "{name}"',
+                          len(names) * len(creatives))
+            return
+        line_items = {r_['name']:r_ for r_ in LineItem(orderId=rec['id']).fetch()}
+        found = [line_items[n_] for n_ in names if n_ in line_items]
+        self.plan.add('exists', 'Line Item', f'of "{name}"', len(found))
+        self.plan.add('create', 'Line Item', f'of "{name}"', len(names) - len(found))
+        licas = LICA().fetch_in('lineItemId', [r_['id'] for r_ in found], self.size,
+                                key=lica_key) if found else {}
+        existing = [k_ for k_ in (lica_key(dict(lineItemId=l_['id'], creativeId=c_['id'])) \
+                                  for l_ in found for c_ in creatives if c_) if k_ in licas]
+        self.plan.add('exists', 'Line Item Creative Association', f'of "{name}"', len(existing))
+        self.plan.add('create', 'Line Item Creative Association', f'of "{name}"',
+                      len(names) * len(creatives) - len(existing))
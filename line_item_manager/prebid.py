@@ -1,35 +1,149 @@
+from array import array
 import certifi
+from collections.abc import Sequence
 import csv
-from typing import  Any, Dict, Optional
-from urllib import request
+import heapq
+from itertools import repeat
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import  Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib import error, request
 import ssl
 
-from .utils import load_package_file
+from .exceptions import ResourceNotFound
+from .utils import cache_dir, load_package_file, package_filename
 
 SETTINGS: dict = load_package_file('settings.yml')['prebid']
 BIDDERS: dict = SETTINGS['bidders']
 
+logger = logging.getLogger(__name__)
+
 class Prebid:
     """Prebid specific."""
 
     def __init__(self):
         """Initialize Prebid."""
         self._bidders = None
+        self.offline = False
 
     @property
     def bidders(self) -> Dict[str, Any]:
-        """Read remote bidders CSV metadata file.
+        """Read bidders CSV metadata file, cached on disk and revalidated after the TTL.
 
         Returns:
           A dict keyed by bidder code
         """
         if self._bidders is None:
-            context = ssl.create_default_context(cafile=certifi.where())
-            reader = csv.DictReader([l.decode('utf-8') for l in request.urlopen(
-                BIDDERS['data'], context=context).readlines()], skipinitialspace=True)
-            # Filter out rows with empty bidder-code
-            self._bidders = {row['bidder-code']:row for row in reader if row['bidder-code']}
+            with open(self.bidders_filename(), newline='', encoding='utf-8') as fp:
+                reader = csv.DictReader(fp, skipinitialspace=True)
+                # Filter out rows with empty bidder-code
+                self._bidders = {row['bidder-code']:row for row in reader if row['bidder-code']}
         return self._bidders
+
+    def bidders_filename(self) -> str:
+        """Get the bidders CSV metadata file, downloading it if the cache is expired.
+
+        In offline mode, or if the download fails, the cached file is used regardless of
+        its age, or the package snapshot if there is none.
+
+        Returns:
+          Fullpath of the bidders CSV metadata file
+
+        Raises:
+          ResourceNotFound: if there is neither a cached file nor a package snapshot
+        """
+        cached = os.path.join(cache_dir('prebid'), BIDDERS['cache']['filename'])
+        meta = self.cache_meta(cached)
+        if self.offline:
+            if meta:
+                return cached
+            try:
+                return self.snapshot_filename()
+            except ResourceNotFound as e:
+                raise ResourceNotFound(f'{e}, run once without --offline to cache it') from e
+        if meta and time.time() - meta.get('fetched', 0) < BIDDERS['cache']['ttl']:
+            return cached
+        try:
+            self.download(cached, meta)
+        except (error.URLError, OSError) as e:
+            logger.warning('Not able to download %s, using %s bidders: %s', BIDDERS['data'],
+                           'cached' if meta else 'snapshot', e)
+            return cached if meta else self.snapshot_filename()
+        return cached
+
+    @staticmethod
+    def snapshot_filename() -> str:
+        """Get the package snapshot of the bidders CSV metadata file, made by the
+        bidders-snapshot make target of a release. Git checkouts and their editable installs
+        have no snapshot.
+
+        Returns:
+          Fullpath of the snapshot
+
+        Raises:
+          ResourceNotFound: if the package has no snapshot
+        """
+        filename = package_filename(BIDDERS['cache']['snapshot'])
+        if not os.path.isfile(filename):
+            raise ResourceNotFound(f'Prebid bidders metadata was never downloaded from '
+                                   f'{BIDDERS["data"]}, and this install has no snapshot, '
+                                   f'which is packaged only by release builds (make dist)')
+        return filename
+
+    @staticmethod
+    def cache_meta(filename: str) -> Optional[Dict[str, Any]]:
+        """Get the metadata of a cached download.
+
+        Args:
+          filename: fullpath of the cached file
+
+        Returns:
+          Dict of fetched time, etag and last modified values, or None if not cached
+        """
+        try:
+            with open(f'{filename}.json') as fp:
+                meta = json.load(fp)
+            return meta if os.path.isfile(filename) else None
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def download(filename: str, meta: Optional[Dict[str, Any]]) -> None:
+        """Download the bidders CSV metadata file unless not modified since cached.
+
+        Args:
+          filename: fullpath of the cached file
+          meta: metadata of the cached file, if any
+        """
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        context = ssl.create_default_context(cafile=certifi.where())
+        new_meta = dict(meta or {}, fetched=time.time())
+        try:
+            with request.urlopen(request.Request(BIDDERS['data'], headers=headers),
+                                 context=context, timeout=BIDDERS['cache']['timeout']) as resp:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+                try:
+                    with os.fdopen(fd, 'wb') as fp:
+                        shutil.copyfileobj(resp, fp)
+                    os.replace(tmp, filename)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                new_meta.update(etag=resp.headers.get('ETag'),
+                                last_modified=resp.headers.get('Last-Modified'))
+        except error.HTTPError as e:
+            if not (meta and e.code == 304):
+                raise
+        with open(f'{filename}.json', 'w') as fp:
+            json.dump(new_meta, fp)
 prebid = Prebid()
 
 class PrebidBidder:
@@ -113,3 +227,129 @@ class PrebidBidder:
         if not self.codestr:
             return prefix
         return f'{prefix}_{self.codestr}'[:BIDDERS['key_char_limit']]
+
+class PriceLadder(Sequence):
+    """Prebid price granularity as a sorted sequence of cpm names.
+
+    Prices are held as integer micro amounts in a compact array, computed without floating
+    point arithmetic beyond rounding the configured bucket values to the bucket precision.
+    Slices are ladders, so a slice of cpm names carries its micro amounts.
+    """
+
+    def __init__(self, names: List[str], micros: Iterable[int]):
+        """Initialize PriceLadder.
+
+        Args:
+          names: cpm names in ascending price order
+          micros: micro amounts of the cpm names
+        """
+        self.names = names
+        self.micros = micros if isinstance(micros, array) else array('q', micros)
+        self._index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_buckets(cls, buckets: List[Dict[str, Any]], precision: int=2,
+                     micro_factor: int=1000000) -> 'PriceLadder':
+        """Get the price ladder of granularity buckets.
+
+        Overlapping buckets are merged, a price listed by more than one bucket is named
+        with the precision of the first bucket listing it, as Prebid would.
+
+        Args:
+          buckets: dicts containing min, max, interval and optionally precision values
+          precision: default number of decimal places of cpm names
+          micro_factor: micro amount of a unit of currency
+
+        Returns:
+          A PriceLadder instance
+        """
+        seqs = [cls.bucket_micros(b_, b_.get('precision', precision), micro_factor) \
+                for b_ in buckets]
+        order = sorted(range(len(seqs)), key=lambda i_: (seqs[i_][0].start, i_))
+        bounds = [(seqs[i_][0][0], seqs[i_][0][-1]) for i_ in order if seqs[i_][0]]
+        if all(a_[1] < b_[0] for a_, b_ in zip(bounds, bounds[1:])):
+            merged: Iterable[Tuple[int, int]] = \
+              ((m_, i_) for i_ in order for m_ in seqs[i_][0])
+        else:
+            merged = heapq.merge(*[zip(seqs[i_][0], repeat(i_)) for i_ in order])
+        names: List[str] = []
+        micros = array('q')
+        for m_, i_ in merged:
+            if micros and micros[-1] == m_:
+                continue
+            micros.append(m_)
+            names.append(cls.format_micros(m_, seqs[i_][1], micro_factor))
+        return cls(names, micros)
+
+    @staticmethod
+    def bucket_micros(bucket: Dict[str, Any], precision: int,
+                      micro_factor: int) -> Tuple[range, int]:
+        """Get the micro amounts of a granularity bucket.
+
+        Args:
+          bucket: dict containing min, max and interval values
+          precision: number of decimal places of the bucket prices
+          micro_factor: micro amount of a unit of currency
+
+        Returns:
+          Tuple of the range of micro amounts from min to max by interval, and the precision
+        """
+        scale = 10**precision
+        if micro_factor % scale:
+            raise ValueError(f'Price granularity precision {precision} is finer than micro amounts')
+        low, high, step = [round(scale * bucket[k_]) * (micro_factor // scale) \
+                           for k_ in ('min', 'max', 'interval')]
+        if step <= 0:
+            raise ValueError(f'Price granularity interval {bucket["interval"]} is less than the ' \
+                             f'precision {precision}')
+        return range(low, high + 1, step), precision
+
+    @staticmethod
+    def format_micros(micros: int, precision: int, micro_factor: int) -> str:
+        """Get the cpm name of a micro amount.
+
+        Args:
+          micros: micro amount
+          precision: number of decimal places
+          micro_factor: micro amount of a unit of currency
+
+        Returns:
+          Price formatted with the number of decimal places
+        """
+        units, frac = divmod(micros, micro_factor)
+        if not precision:
+            return str(units)
+        frac //= micro_factor // 10**precision
+        return f'{units}.{frac:0{precision}d}'
+
+    def micro_amount(self, name: str) -> int:
+        """Get the micro amount of a cpm name in the ladder.
+
+        Args:
+          name: cpm name
+
+        Returns:
+          Micro amount of the cpm name
+        """
+        if self._index is None:
+            self._index = {n_:i_ for i_, n_ in enumerate(self.names)}
+        return self.micros[self._index[name]]
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return PriceLadder(self.names[index], self.micros[index])
+        return self.names[index]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, PriceLadder):
+            return self.names == other.names and self.micros == other.micros
+        return self.names == other
+
+    def __repr__(self) -> str:
+        return f'PriceLadder({self.names!r})'
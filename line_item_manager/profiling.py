@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+import cProfile
+import os
+import pstats
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import config
+from .metrics import metrics
+
+logger = config.getLogger(__name__)
+
+class Profiler:
+    """cProfile profilers of the phases of a create run.
+
+    Each phase, e.g. line item render, has a profiler per thread. A nested phase pauses the
+    profiler of the enclosing phase, so phase times are exclusive. On Python 3.12+ a profiler
+    is process wide, it records the calls of all threads and only one may be active at a time:
+    with concurrent units, a phase entered while another thread profiles is not profiled and
+    phase times include the calls of the other threads. Phases are not profiled, at the cost
+    of a flag check, unless a directory is set with start(). Phases are also entered in the
+    run metrics when enabled.
+    """
+
+    def __init__(self):
+        self.directory: Optional[str] = None
+        self._profiles: Dict[str, List[cProfile.Profile]] = {}
+        self._calls: Dict[str, int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self, directory: str) -> None:
+        """Profile the phases of the run, writing their stats to a directory.
+
+        Args:
+          directory: output directory, created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._profiles = {}
+        self._calls = {}
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Profile and measure a phase of the run.
+
+        Args:
+          name: phase name, e.g. line_item_render
+        """
+        if self.directory is None and not metrics.enabled:
+            yield
+            return
+        measured = metrics.enabled
+        if measured:
+            metrics.enter_phase(name)
+        try:
+            if self.directory is None:
+                yield
+            else:
+                with self._profile(name):
+                    yield
+        finally:
+            if measured:
+                metrics.exit_phase()
+
+    @contextmanager
+    def _profile(self, name: str) -> Iterator[None]:
+        profiles: Dict[str, cProfile.Profile] = self._local.__dict__.setdefault('profiles', {})
+        stack: List[Tuple[str, cProfile.Profile]] = self._local.__dict__.setdefault('stack', [])
+        if name not in profiles:
+            profiles[name] = cProfile.Profile()
+            with self._lock:
+                self._profiles.setdefault(name, []).append(profiles[name])
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+        profile = profiles[name]
+        if stack:
+            stack[-1][1].disable()
+        stack.append((name, profile))
+        self._enable(name, profile)
+        try:
+            yield
+        finally:
+            profile.disable()
+            stack.pop()
+            if stack:
+                self._enable(*stack[-1])
+
+    @staticmethod
+    def _enable(name: str, profile: cProfile.Profile) -> None:
+        try:
+            profile.enable()
+        except ValueError as e:
+            # another profiler is active, e.g. of a concurrent unit on Python 3.12+
+            logger.debug('Phase %s is not profiled, %s', name, e)
+
+    def finish(self) -> None:
+        """Stop profiling, writing the stats of each phase to <phase>.pstats and the top
+        functions of each phase to summary.txt."""
+        if self.directory is None:
+            return
+        top = config.app['mgr']['profile']['top']
+        sort = config.app['mgr']['profile']['sort']
+        filename = os.path.join(self.directory, 'summary.txt')
+        with open(filename, 'w') as fp:
+            for name, profiles in self._profiles.items():
+                for profile in profiles:
+                    profile.create_stats()
+                profiles = [p_ for p_ in profiles if p_.stats] # type: ignore[attr-defined]
+                if not profiles:
+                    continue
+                stats = pstats.Stats(*profiles, stream=fp)
+                stats.dump_stats(os.path.join(self.directory, f'{name}.pstats'))
+                fp.write(f'{"#" * 80}\nPhase: {name}, {stats.total_tt:.3f} s, '
+                         f'{self._calls[name]} calls\n')
+                stats.sort_stats(sort).print_stats(top)
+        logger.info('Profiles of %d phases written to "%s"', len(self._profiles), self.directory)
+        self.directory = None
+
+profiler = Profiler()
@@ -0,0 +1,271 @@
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from jinja2 import meta, nodes, TemplateError
+import yaml
+
+from .config import config
+from .template import JINJA_PATTERN, STR_TAG, Unprovable, compile_src, environment, \
+  patch_paths, render_src
+
+logger = config.getLogger(__name__)
+
+MARKER_PREFIX = '918273645'
+MARKER_PATTERN = re.compile(MARKER_PREFIX + r'\d{3}')
+
+_PLAIN_SAFE = re.compile(r'[\w.+/][\w.+/@()-]*(?: [\w.+/@()-]+)*')
+_QUOTED_UNSAFE = {'"': ('"', '\\', '\n'), "'": ("'", '\n')}
+
+def cpm_dependent_keys(cfg: dict) -> Set[str]:
+    """Get top level keys of a user config object whose templating references the cpm.
+
+    Args:
+      cfg: user config object, e.g. line_item
+
+    Returns:
+      Set of cpm dependent keys
+    """
+    return {k for k, v in cfg.items() if 'cpm' in meta.find_undeclared_variables(
+        environment().parse(JINJA_PATTERN.sub(r'{{ \1 }}', yaml.safe_dump(v))))}
+
+class Slot:
+    """A scalar of the prototype whose value is patched per CPM."""
+
+    def __init__(self, path: Tuple[Any, ...], style: Optional[str], text: str):
+        """Initialize Slot.
+
+        Args:
+          path: keys and indexes locating the scalar in the prototype
+          style: yaml scalar style
+          text: scalar value containing markers
+        """
+        self.path = path
+        self.style = style
+        self.text = text
+
+    def value(self, loader: yaml.SafeLoader, replacements: Dict[str, str]) -> Any:
+        """Get the scalar value with markers replaced as the full template would produce it.
+
+        Args:
+          loader: yaml loader used to resolve and construct plain scalars
+          replacements: marker to text mapping
+
+        Returns:
+          Constructed scalar value
+        """
+        used = [replacements[m_] for m_ in MARKER_PATTERN.findall(self.text)]
+        if self.style is None:
+            if not all(_PLAIN_SAFE.fullmatch(r_) for r_ in used):
+                raise Unprovable(f'Unsafe plain scalar value(s): {used}')
+        elif any(c_ in r_ for r_ in used for c_ in _QUOTED_UNSAFE[self.style]):
+            raise Unprovable(f'Unsafe quoted scalar value(s): {used}')
+        text = MARKER_PATTERN.sub(lambda m_: replacements[m_.group(0)], self.text)
+        if self.style is not None:
+            return text
+        node = yaml.ScalarNode(loader.resolve(yaml.ScalarNode, text, (True, False)), text)
+        return loader.yaml_constructors[node.tag](loader, node)
+
+class LineItemRenderer:
+    """Render line item templates, patching a per-unit prototype when provably equivalent.
+
+    The template is rendered and parsed once with markers in place of the cpm, micro amount,
+    cpm targeting value id and cpm dependent li_cfg values. Each line item is then derived by
+    replacing markers in only the scalars containing them, sharing all other subtrees. The
+    template is statically checked to use these values only as direct output expressions and
+    the first patched record is compared with the full rendering; otherwise, or for values that
+    are not safe in their yaml scalar style, the full template is rendered.
+    """
+
+    def __init__(self, src: str, cfg_keys: Set[str]):
+        """Initialize LineItemRenderer.
+
+        Args:
+          src: line item template source
+          cfg_keys: li_cfg keys that depend on the cpm
+        """
+        self.src = src
+        self.cfg_keys = cfg_keys
+        self.markers: Dict[str, str] = {}
+        self.proto: Optional[dict] = None
+        self.slots: List[Slot] = []
+        self.loader = yaml.SafeLoader('')
+        self._enabled = config.app['mgr']['template']['prototype']
+        self._verified = False
+
+    def render(self, **kwargs: Any) -> dict:
+        """Get the line item record for the template parameters.
+
+        Args:
+          kwargs: key-value pairs referenced in template
+
+        Returns:
+          A dict of the rendered line item
+        """
+        if self._enabled and self.proto is None:
+            try:
+                self.build(**kwargs)
+            except Unprovable as e:
+                logger.debug('Prototype rendering disabled, %s', e)
+                self._enabled = False
+        if self._enabled:
+            try:
+                rec = self.patch(self.replacements(**kwargs))
+            except Unprovable as e:
+                logger.debug('Prototype rendering skipped for cpm %s, %s', kwargs['cpm'], e)
+            else:
+                if self._verified:
+                    return rec
+                # the first patched record is checked against the fully rendered template
+                out = render_src(self.src, **kwargs)
+                self._verified = rec == out
+                if not self._verified:
+                    logger.debug('Prototype rendering disabled, prototype does not match')
+                    self._enabled = False
+                return out
+        return render_src(self.src, **kwargs)
+
+    def marker(self, name: str) -> str:
+        return self.markers.setdefault(name, f'{MARKER_PREFIX}{len(self.markers):03d}')
+
+    def replacements(self, cpm: str, micro_amount: int, li: Any, li_cfg: dict,
+                     **kwargs: Any) -> Dict[str, str]:
+        try:
+            value_id = li.targeting_key['names'][cpm]['id']
+        except KeyError as e:
+            raise Unprovable(f'No targeting value for cpm {cpm}') from e
+        out = {self.marker('cpm'): str(cpm), self.marker('micro_amount'): str(micro_amount),
+               self.marker('value_id'): str(value_id)}
+        for key in self.cfg_keys:
+            if not isinstance(li_cfg.get(key), (str, int, float)):
+                raise Unprovable(f'li_cfg.{key} is not a scalar')
+            out[self.marker(f'li_cfg.{key}')] = str(li_cfg[key])
+        return out
+
+    def build(self, cpm: str, micro_amount: int, li: Any, li_cfg: dict, **kwargs: Any) -> None:
+        clean_src = JINJA_PATTERN.sub(r'{{ \1 }}', self.src)
+        if MARKER_PREFIX in clean_src or any(MARKER_PREFIX in str(li_cfg[k]) for k in li_cfg):
+            raise Unprovable('Template contains marker text')
+        self.check(environment().parse(clean_src))
+        proto_cfg = dict(li_cfg)
+        proto_cfg.update({k:self.marker(f'li_cfg.{k}') for k in self.cfg_keys})
+        try:
+            text = compile_src(self.src).render(
+                cpm=self.marker('cpm'),
+                micro_amount=self.marker('micro_amount'),
+                li=_PrototypeLineItems(li, self.marker('cpm'), self.marker('value_id')),
+                li_cfg=proto_cfg,
+                **kwargs)
+            loader = yaml.SafeLoader(text)
+            try:
+                node = loader.get_single_node()
+                proto = loader.construct_document(node)
+                self.slots = []
+                self.collect(loader, node, proto, ())
+            finally:
+                loader.dispose()
+        except (TemplateError, yaml.YAMLError) as e:
+            raise Unprovable(f'Prototype rendering failed, {e}') from e
+        self.proto = proto
+
+    def check(self, tmpl: nodes.Template) -> None:
+        if any(tmpl.find_all((nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport,
+                              nodes.Macro, nodes.CallBlock, nodes.FilterBlock, nodes.AssignBlock))):
+            raise Unprovable('Template uses includes, macros or block filters')
+        for output in tmpl.find_all(nodes.Output):
+            for expr in output.nodes:
+                if not isinstance(expr, nodes.TemplateData):
+                    self._check_expr(expr, top=True)
+        for node in tmpl.find_all(nodes.Node):
+            if not isinstance(node, (nodes.Output, nodes.Expr, nodes.Template, nodes.Pair,
+                                     nodes.Keyword)):
+                for expr in node.iter_child_nodes(exclude=('body', 'else_', 'elif_', 'nodes')):
+                    if isinstance(expr, nodes.Expr):
+                        self._check_expr(expr, top=False)
+
+    def _check_expr(self, expr: nodes.Expr, top: bool) -> None:
+        if top and self._is_slot_expr(expr):
+            return
+        if isinstance(expr, nodes.Name) and expr.name in ('cpm', 'micro_amount', 'li_cfg'):
+            raise Unprovable(f"'{expr.name}' is used in an unsupported expression")
+        if self._cfg_key(expr) is not None:
+            if self._cfg_key(expr) in self.cfg_keys:
+                raise Unprovable(f'li_cfg.{self._cfg_key(expr)} is used in an unsupported expression')
+            return
+        for child in expr.iter_child_nodes():
+            self._check_expr(child, top=False)
+
+    def _is_slot_expr(self, expr: nodes.Expr) -> bool:
+        if isinstance(expr, nodes.Name):
+            return expr.name in ('cpm', 'micro_amount')
+        if self._cfg_key(expr) in self.cfg_keys:
+            return True
+        # li.targeting_key.names[cpm].id
+        return isinstance(expr, nodes.Getattr) and expr.attr == 'id' and \
+          isinstance(expr.node, nodes.Getitem) and isinstance(expr.node.arg, nodes.Name) and \
+          expr.node.arg.name == 'cpm' and _attr_path(expr.node.node) == ['li', 'targeting_key', 'names']
+
+    @staticmethod
+    def _cfg_key(expr: nodes.Expr) -> Optional[str]:
+        if isinstance(expr, nodes.Getattr) and isinstance(expr.node, nodes.Name) and \
+          expr.node.name == 'li_cfg':
+            return expr.attr
+        if isinstance(expr, nodes.Getitem) and isinstance(expr.node, nodes.Name) and \
+          expr.node.name == 'li_cfg' and isinstance(expr.arg, nodes.Const):
+            return str(expr.arg.value)
+        return None
+
+    def collect(self, loader: yaml.SafeLoader, node: yaml.Node, obj: Any,
+                path: Tuple[Any, ...]) -> None:
+        if isinstance(node, yaml.ScalarNode):
+            if not MARKER_PATTERN.search(node.value):
+                return
+            if node.style not in (None, '"', "'"):
+                raise Unprovable('Marker in a block scalar')
+            implicit = loader.resolve(yaml.ScalarNode, node.value, (True, False)) \
+              if node.style is None else STR_TAG
+            if node.tag != implicit:
+                raise Unprovable('Marker in an explicitly tagged scalar')
+            self.slots.append(Slot(path, node.style, node.value))
+        elif isinstance(node, yaml.SequenceNode):
+            for i_, child in enumerate(node.value):
+                self.collect(loader, child, obj[i_], path + (i_, ))
+        elif isinstance(node, yaml.MappingNode):
+            keys = []
+            for key_node, value_node in node.value:
+                if MARKER_PATTERN.search(str(getattr(key_node, 'value', ''))) or \
+                  key_node.tag == 'tag:yaml.org,2002:merge':
+                    raise Unprovable('Marker or merge in a mapping key')
+                keys.append(loader.construct_object(key_node, deep=True))
+                self.collect(loader, value_node, obj[keys[-1]], path + (keys[-1], ))
+            if len(set(keys)) != len(keys):
+                raise Unprovable('Duplicate mapping keys')
+
+    def patch(self, replacements: Dict[str, str]) -> dict:
+        return patch_paths(self.proto, # type: ignore[arg-type]
+                           [(slot.path, slot.value(self.loader, replacements)) \
+                            for slot in self.slots])
+
+class _PrototypeLineItems:
+    """GAMLineItems stand-in whose targeting key also maps the cpm marker."""
+
+    def __init__(self, li: Any, cpm_marker: str, id_marker: str):
+        self._li = li
+        self._cpm_marker = cpm_marker
+        self._id_marker = id_marker
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._li, name)
+
+    @property
+    def targeting_key(self) -> dict:
+        out = dict(self._li.targeting_key)
+        out['names'] = dict(out['names'])
+        out['names'][self._cpm_marker] = dict(id=self._id_marker)
+        return out
+
+def _attr_path(expr: nodes.Expr) -> List[str]:
+    if isinstance(expr, nodes.Name):
+        return [expr.name]
+    if isinstance(expr, nodes.Getattr):
+        return _attr_path(expr.node) + [expr.attr]
+    return []
@@ -0,0 +1,172 @@
+from threading import Condition, Lock
+from timeit import default_timer
+from typing import Any, Callable, Iterable, Optional, Tuple
+import weakref
+
+from googleads.errors import GoogleAdsServerFault
+
+from .config import config
+from .metrics import metrics
+
+logger = config.getLogger(__name__)
+
+_WINDOW_POLL = 0.05 # seconds a caller waits at most for a slot of a full window
+
+def is_throttling_error(exc: Exception, reasons: Iterable[str]) -> bool:
+    """Check whether an error is a quota or concurrency fault of the GAM API.
+
+    Args:
+      exc: raised exception
+      reasons: fault reasons, e.g. QuotaError.EXCEEDED_QUOTA
+
+    Returns:
+      True if a GoogleAdsServerFault with one of the reasons
+    """
+    if not isinstance(exc, GoogleAdsServerFault):
+        return False
+    text = ' '.join([str(exc)] + [str(getattr(e_, 'errorString', e_)) \
+                                  for e_ in getattr(exc, 'errors', None) or []])
+    return any(r_ in text for r_ in reasons)
+
+class RateController:
+    """Token bucket and AIMD concurrency window shared by the GAM calls of a client.
+
+    Calls take a token of a bucket refilled at the current rate and a slot of the current
+    window of concurrent calls. A successful call additively increases the rate and the
+    window, a quota or concurrency fault multiplicatively decreases both and the call is
+    retried, so calls settle just below the quota of the network. Calls that are not safe to
+    resend, such as creates that may be partly committed, are slowed down but not retried.
+    """
+
+    def __init__(self, rate: float=20.0, min_rate: float=0.5, max_rate: float=100.0,
+                 burst: float=20.0, window: float=8.0, max_window: float=32.0,
+                 increase: float=0.1, decrease: float=0.5, max_retries: int=5,
+                 errors: Tuple[str, ...]=('QuotaError.EXCEEDED_QUOTA',)):
+        """Initialize RateController.
+
+        Args:
+          rate: initial calls per second
+          min_rate: lowest calls per second
+          max_rate: highest calls per second
+          burst: tokens of the bucket, calls made at once after idling
+          window: initial concurrent calls
+          max_window: highest concurrent calls
+          increase: calls per second added by a successful call
+          decrease: factor of the rate and window on a throttling error
+          max_retries: retries of a call failing with a throttling error
+          errors: fault reasons of throttling errors
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.window = window
+        self.max_window = max_window
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.errors = tuple(errors)
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = burst
+        self._updated = default_timer()
+        self._cond = Condition()
+
+    def _reserve(self) -> float:
+        """Take a token and a window slot, or get the seconds to wait for them."""
+        now = default_timer()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.in_flight >= max(int(self.window), 1):
+            return _WINDOW_POLL
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        self.in_flight += 1
+        return 0.0
+
+    def acquire(self) -> None:
+        """Wait for a token and a window slot."""
+        with self._cond:
+            while True:
+                delay = self._reserve()
+                if not delay:
+                    return
+                self._cond.wait(delay)
+
+    def release(self, throttled: Optional[bool]=False) -> None:
+        """Release a window slot, adapting the rate and window to the outcome of the call.
+
+        Args:
+          throttled: True if the call failed with a throttling error, None if it failed
+            otherwise, leaving the rate and window as they are
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled is None:
+                pass
+            elif throttled:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.window = max(1.0, self.window * self.decrease)
+                self._tokens = min(self._tokens, 0.0)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                self.window = min(self.max_window, self.window + 1 / self.window)
+            self._cond.notify_all()
+
+    def _throttled(self, exc: Exception, attempt: int, retry: bool) -> bool:
+        if not is_throttling_error(exc, self.errors):
+            self.release(throttled=None)
+            return False
+        self.release(throttled=True)
+        if not retry or attempt >= self.max_retries:
+            logger.info('Throttled, slowing down to %.1f calls/s, %d concurrent: %s',
+                        self.rate, int(self.window), exc)
+            return False
+        logger.info('Throttled, retrying at %.1f calls/s, %d concurrent: %s',
+                    self.rate, int(self.window), exc)
+        metrics.retry()
+        return True
+
+    def call(self, func: Callable, *args: Any, retry: bool=True) -> Any:
+        """Call a function when the rate and window allow, retrying throttling errors.
+
+        Args:
+          func: function making a GAM call
+          args: function arguments
+          retry: False to raise throttling errors after slowing down, e.g. of a create
+
+        Returns:
+          Function return value
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = func(*args)
+            except Exception as e:
+                if not self._throttled(e, attempt, retry):
+                    raise
+                attempt += 1
+                continue
+            self.release()
+            return response
+
+_rate_controllers: 'weakref.WeakKeyDictionary[Any, RateController]' = weakref.WeakKeyDictionary()
+_rate_controllers_lock = Lock()
+
+def rate_controller(client: Any, **settings: Any) -> RateController:
+    """Get the rate controller of a client, creating it if needed.
+
+    Args:
+      client: GAM client
+      settings: RateController arguments, used on creation
+
+    Returns:
+      RateController instance of the client
+    """
+    with _rate_controllers_lock:
+        if client not in _rate_controllers:
+            _rate_controllers[client] = RateController(**settings)
+        return _rate_controllers[client]
@@ -1,16 +1,78 @@
 import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import yaml
 
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache
 from jinja2 import Template as J2Template
 
 from .config import config
 from .prebid import PrebidBidder
+from .utils import cache_dir
 
 logger = config.getLogger(__name__)
 
 JINJA_PATTERN = re.compile(r'{{\W*(\w*)\W*}}')
+STR_TAG = 'tag:yaml.org,2002:str'
 
-def render_src(src: str, **kwargs) -> dict:
+_PLAIN_INDICATORS = '-?:,[]{}#&*!|>\'"%@`'
+_QUOTED_UNSAFE = {'"': ('"', '\\', '\n'), "'": ("'", '\n')}
+_SCALAR_LOADER = yaml.SafeLoader('')
+
+class Unprovable(Exception):
+    """
+    Raised when a fast rendering path can not be proven to match the full rendering
+    """
+
+class SourceLoader(BaseLoader):
+    """Jinja loader of templates named by their source, so sources are held only by the
+    bounded LRU of compiled templates of the environment."""
+
+    def get_source(self, environment: Environment,
+                   template: str) -> Tuple[str, Optional[str], Callable[[], bool]]:
+        """Get source removing non-word chars from variable references.
+
+        Args:
+          environment: jinja environment
+          template: template name, the templated source string
+
+        Returns:
+          Tuple of source, filename and uptodate function
+        """
+        return JINJA_PATTERN.sub(r'{{ \1 }}', template), None, lambda: True
+
+_loader = SourceLoader()
+_environment: Optional[Environment] = None
+
+def environment() -> Environment:
+    """Get jinja environment holding a bounded LRU of compiled templates.
+
+    Returns:
+      The jinja environment, with an on-disk bytecode cache if enabled in settings
+    """
+    global _environment # pylint: disable=global-statement
+    if _environment is None:
+        cfg = config.app['mgr']['template']
+        _environment = Environment(
+            loader=_loader,
+            cache_size=cfg['cache_size'],
+            auto_reload=False,
+            bytecode_cache=FileSystemBytecodeCache(cache_dir('jinja')) \
+              if cfg['bytecode_cache'] else None,
+        )
+    return _environment
+
+def compile_src(src: str) -> J2Template:
+    """Get compiled template of a source, cached by source.
+
+    Args:
+      src: templated source string
+
+    Returns:
+      A compiled jinja template
+    """
+    return environment().get_template(src)
+
+def render_src(src: str, **kwargs: Any) -> dict:
     """Get object from jinja rendered yaml removing non-word chars from variable references.
 
     Args:
@@ -20,8 +82,136 @@ def render_src(src: str, **kwargs) -> dict:
     Returns:
       A dict of the jinja rendered src
     """
-    clean_src = JINJA_PATTERN.sub(r'{{ \1 }}', src)
-    return yaml.safe_load(J2Template(clean_src).render(**kwargs))
+    return yaml.safe_load(compile_src(src).render(**kwargs))
+
+def scalar_value(style: Optional[str], text: str) -> Any:
+    """Get the value yaml would construct for a scalar of the style containing the text.
+
+    Args:
+      style: yaml scalar style, None for plain
+      text: scalar text as it would appear unescaped in the document
+
+    Returns:
+      Constructed scalar value
+    """
+    if not text.isprintable():
+        raise Unprovable(f'Unprintable scalar: {text!r}')
+    if style is None:
+        if not text or text != text.strip() or text[0] in _PLAIN_INDICATORS or \
+          any(s_ in text for s_ in (': ', ' #', '\n', '\t')) or text.endswith(':'):
+            raise Unprovable(f'Unsafe plain scalar: {text!r}')
+        tag = _SCALAR_LOADER.resolve(yaml.ScalarNode, text, (True, False))
+        return _SCALAR_LOADER.yaml_constructors[tag](_SCALAR_LOADER, yaml.ScalarNode(tag, text))
+    if any(c_ in text for c_ in _QUOTED_UNSAFE[style]):
+        raise Unprovable(f'Unsafe quoted scalar: {text!r}')
+    return text
+
+def patch_paths(obj: dict, values: List[Tuple[Tuple[Any, ...], Any]]) -> dict:
+    """Get a copy of an object with values set at paths, sharing all other subtrees.
+
+    Args:
+      obj: object to patch
+      values: pairs of path, a tuple of keys and indexes, and value
+
+    Returns:
+      Patched copy of the object
+    """
+    out = dict(obj)
+    copied: Dict[Tuple[Any, ...], Any] = {(): out}
+    for path, value in values:
+        parent = out
+        for i_ in range(1, len(path)):
+            if path[:i_] not in copied:
+                child = parent[path[i_ - 1]]
+                copied[path[:i_]] = dict(child) if isinstance(child, dict) else list(child)
+                parent[path[i_ - 1]] = copied[path[:i_]]
+            parent = copied[path[:i_]]
+        parent[path[-1]] = value
+    return out
+
+class CfgTemplate:
+    """Compiled top level user config object.
+
+    The object is dumped and parsed once. Rendering evaluates only the string leaves that
+    contain jinja expressions, which must appear verbatim in the dumped yaml, and sets them
+    on a copy of the parsed object sharing all other subtrees. The first patched object is
+    compared with the full rendering; otherwise, or for values that are not safe in their
+    yaml scalar style, the dumped yaml is fully rendered and parsed.
+    """
+
+    def __init__(self, obj: Any):
+        """Initialize CfgTemplate.
+
+        Args:
+          obj: user config object
+        """
+        # unfolded, so templated strings appear verbatim in the source
+        self.src = yaml.safe_dump(obj, width=float('inf'))
+        self.slots: List[Tuple[Tuple[Any, ...], Optional[str], J2Template]] = []
+        self._verified = False
+        loader = yaml.SafeLoader(self.src)
+        try:
+            node = loader.get_single_node()
+            self.base = loader.construct_document(node)
+            self.collect(loader, node, ())
+        except Unprovable as e:
+            logger.debug('Full rendering of config object, %s', e)
+            self.slots = []
+            self.base = None
+        finally:
+            loader.dispose()
+
+    def render(self, **kwargs: Any) -> Any:
+        """Get the rendered object.
+
+        Args:
+          kwargs: key-value pairs referenced in the object
+
+        Returns:
+          The jinja rendered object
+        """
+        if isinstance(self.base, dict):
+            try:
+                obj = patch_paths(self.base, [(path, scalar_value(style, tmpl.render(**kwargs))) \
+                                              for path, style, tmpl in self.slots])
+            except Unprovable as e:
+                logger.debug('Full rendering of config object, %s', e)
+            else:
+                if self._verified:
+                    return obj
+                out = render_src(self.src, **kwargs)
+                self._verified = obj == out
+                if not self._verified:
+                    logger.debug('Full rendering of config object, patched object does not match')
+                    self.base = None
+                return out
+        return render_src(self.src, **kwargs)
+
+    def collect(self, loader: yaml.SafeLoader, node: yaml.Node, path: Tuple[Any, ...]) -> None:
+        if isinstance(node, yaml.ScalarNode):
+            if not '{' in node.value:
+                return
+            if '{%' in node.value or '{#' in node.value:
+                raise Unprovable('Statement or comment in a config value')
+            if node.style not in (None, '"', "'"):
+                raise Unprovable('Template in a block scalar')
+            raw = self.src[node.start_mark.index:node.end_mark.index]
+            if node.style is not None:
+                raw = raw[1:-1]
+            implicit = loader.resolve(yaml.ScalarNode, node.value, (True, False)) \
+              if node.style is None else STR_TAG
+            if raw != node.value or node.tag != implicit:
+                raise Unprovable('Template is not verbatim in the config yaml')
+            self.slots.append((path, node.style, compile_src(node.value)))
+        elif isinstance(node, yaml.SequenceNode):
+            for i_, child in enumerate(node.value):
+                self.collect(loader, child, path + (i_, ))
+        elif isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                if not isinstance(key_node, yaml.ScalarNode) or '{' in key_node.value:
+                    raise Unprovable('Template in a mapping key')
+                self.collect(loader, value_node,
+                             path + (loader.construct_object(key_node), ))
 
 def render_cfg(objname: str, bidder: PrebidBidder, media_type: str=None,
                cpm: str=None, cpm_min: str=None, cpm_max: str=None) -> dict:
@@ -54,4 +244,7 @@ def render_cfg(objname: str, bidder: PrebidBidder, media_type: str=None,
         params['cpm_min'] = cpm_min
     if cpm_max:
         params['cpm_max'] = cpm_max
-    return render_src(yaml.safe_dump(config.user[objname]), **params)
+    key = ('render_cfg', objname)
+    if key not in config.memo:
+        config.memo[key] = CfgTemplate(config.user[objname])
+    return config.memo[key].render(**params)
@@ -1,7 +1,9 @@
 from hashlib import sha1
-import pkg_resources
+from importlib import resources
+import os
 from pprint import pformat
-from typing import Any, Dict, Iterable, List
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
 
 import yaml
 
@@ -37,8 +39,9 @@ def package_filename(name: str) -> str:
     Returns:
       Fullpath of the package file
     """
-    return pkg_resources.resource_filename('line_item_manager',
-                                           f'conf.d/{name}') # type: ignore[misc]
+    if not hasattr(resources, 'files'): # python < 3.9
+        return os.path.join(os.path.dirname(__file__), 'conf.d', name)
+    return str(resources.files('line_item_manager') / 'conf.d' / name)
 
 def read_package_file(name: str) -> str:
     """Get contents of a package file specified by name.
@@ -52,30 +55,31 @@ def read_package_file(name: str) -> str:
     with open(package_filename(name)) as fp:
         return fp.read()
 
-def num_hash(obj: Any, digits: int=6) -> int:
-    """Get an integer hash with specified number of digits.
+def cache_dir(*names: str) -> str:
+    """Get a line_item_manager directory under the user cache directory, creating it if needed.
 
     Args:
-      obj: object to hash
-      digits: number of digits in returned hash
+      names: sub-directory names
 
     Returns:
-      A hashed integer with specified number of digits
+      Fullpath of the cache directory
     """
-    return int(sha1(str(obj).encode('utf-8')).hexdigest(), 16) % 10**digits
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'line_item_manager', *names)
+    os.makedirs(path, exist_ok=True)
+    return path
 
-def values_from_bucket(bucket: Dict[str, float]) -> set:
-    """Get set of price formatted values specified by min, max and interval.
+def num_hash(obj: Any, digits: int=6) -> int:
+    """Get an integer hash with specified number of digits.
 
     Args:
-      bucket: dict containing min, max and interval values
+      obj: object to hash
+      digits: number of digits in returned hash
 
     Returns:
-      Formatted set of values from min to max by interval
+      A hashed integer with specified number of digits
     """
-    rng = [round(100 * bucket[_k]) for _k in ('min', 'max', 'interval')]
-    rng[1] += rng[2] # make stop inclusive
-    return {_x / 100 for _x in range(*rng)}
+    return int(sha1(str(obj).encode('utf-8')).hexdigest(), 16) % 10**digits
 
 def format_long_list(vals: list, cnt: int=3) -> str:
     """Pretty format with head, tail, and ellipsis to indicate omissions.
@@ -93,6 +97,42 @@ def format_long_list(vals: list, cnt: int=3) -> str:
         return fmt
     return ''.join(out[:cnt]) + ' ...,' + ''.join(out[-cnt:])
 
+class Lazy:
+    """Log argument formatted only if the log record is emitted, at most once however many
+    handlers format the record.
+
+    >>> str(Lazy(format_long_list, list(range(100)), 1))
+    '[0, ..., 99]'
+    """
+    __slots__ = ('func', 'args', 'text')
+
+    def __init__(self, func: Callable[..., Any], *args: Any):
+        """Initialize Lazy.
+
+        Args:
+          func: formatting function
+          args: arguments of the formatting function
+        """
+        self.func = func
+        self.args = args
+        self.text: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.text is None:
+            self.text = str(self.func(*self.args))
+        return self.text
+
+def pretty(obj: Any) -> Lazy:
+    """Get a lazily pretty formatted log argument.
+
+    Args:
+      obj: object to be formatted
+
+    Returns:
+      Lazy pformat of the object
+    """
+    return Lazy(pformat, obj)
+
 def ichunk(iterable: Iterable[Any], n: int) -> Iterable[List[Any]]:
     """Yield n sized chunks, with tail chunk truncated.
 
@@ -123,3 +163,23 @@ def ichunk(iterable: Iterable[Any], n: int) -> Iterable[List[Any]]:
                     yield out
                 return
         yield out
+
+class KeyedLocks:
+    """Lazily created locks, one per key, for serializing work on a shared resource."""
+
+    def __init__(self):
+        """Initialize KeyedLocks."""
+        self._lock = Lock()
+        self._locks: Dict[Hashable, Lock] = {}
+
+    def __call__(self, key: Hashable) -> Lock:
+        """Get the lock for a key, creating it if needed.
+
+        Args:
+          key: resource key
+
+        Returns:
+          A lock unique to the key
+        """
+        with self._lock:
+            return self._locks.setdefault(key, Lock())
@@ -1,4 +1,8 @@
+from collections import Counter
 import copy
+import itertools
+import re
+import threading
 from yaml import safe_dump as dump, safe_load as loads
 
 SVC_IDS = dict(
@@ -235,6 +239,31 @@ BIDDER_VIDEO_BIDDER_KEY_MAP_SVC_IDS = dict(
     },
 )
 
+BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM = dict(
+    OrderService={
+        dump(dict(
+            name="Prebid-InteractiveOffers-video-01/02/2020-08:09:10 1.25-1.25",
+            advertiserId=1001,
+            traffickerId=5001,
+        )): 6001,
+        dump(dict(
+            name="Prebid-InteractiveOffers-video-01/02/2020-08:09:10 1.50-1.50",
+            advertiserId=1001,
+            traffickerId=5001,
+        )): 6002,
+    },
+    LineItemService={
+        dump(dict(
+            name="Prebid-InteractiveOffers-video-01/02/2020-08:09:10 @ 1.25",
+            orderId=6001,
+        )): 8001,
+        dump(dict(
+            name="Prebid-InteractiveOffers-video-01/02/2020-08:09:10 @ 1.50",
+            orderId=6002,
+        )): 8002,
+    },
+)
+
 def rec_from_statement(statement):
     rec = {}
     for i_ in statement['values']:
@@ -255,11 +284,16 @@ def svc_id(svc_recs, rec):
 
 def byStatement(self, *args):
     rec = rec_from_statement(args[0])
-    _id = svc_id(self.svc_ids[self.service], rec)
-    if not _id:
-        return {}
-    rec.update({'id': _id})
-    return dict(results=[rec])
+    results = []
+    # a list bound to "IN" matches any of its values
+    key = next((k_ for k_, v_ in rec.items() if isinstance(v_, list)), None)
+    for value in rec[key] if key else [None]:
+        r_ = dict(rec, **{key: value}) if key else dict(rec)
+        _id = svc_id(self.svc_ids[self.service], r_)
+        if _id:
+            r_.update({'id': _id})
+            results.append(r_)
+    return dict(results=results) if results else {}
 
 def create(self, *args):
     recs = copy.deepcopy(args[0])
@@ -279,8 +313,9 @@ class MockAdClient:
         self.svc_ids.update(service_ids)
 
     def GetService(self, service, version=None):
-        self.service = service
-        return self
+        svc = copy.copy(self)
+        svc.service = service
+        return svc
 
     def getCurrentUser(self, *args):
         return dict(id=svc_id(self.svc_ids[self.service], dict()))
@@ -306,8 +341,104 @@ class MockAdClient:
                 recs.append(r_)
         return dict(results=recs)
 
-for i_ in ('AdUnits', 'Placements', 'Companies', 'Orders', 'CustomTargetingKeys'):
+for i_ in ('AdUnits', 'Placements', 'Companies', 'Orders', 'CustomTargetingKeys', 'LineItems',
+           'LineItemCreativeAssociations'):
     setattr(MockAdClient, f'get{i_}ByStatement', byStatement)
 
-for i_ in ('Creatives', 'LineItems', 'LineItemCreativeAssociations', 'CustomTargetingValues'):
+for i_ in ('Companies', 'Creatives', 'LineItems', 'LineItemCreativeAssociations',
+           'CustomTargetingKeys', 'CustomTargetingValues'):
     setattr(MockAdClient, f'create{i_}', create)
+
+class CountingService:
+
+    def __init__(self, svc, calls, lock):
+        self.svc = svc
+        self.calls = calls
+        self.lock = lock
+
+    def __getattr__(self, name):
+        method = getattr(self.svc, name)
+        def call(*args):
+            with self.lock:
+                self.calls[(self.svc.service, name)] += 1
+            return method(*args)
+        return call
+
+class AutoIdMockAdClient(MockAdClient):
+    """MockAdClient creating any record, with ids numbered from start_id, and finding the
+    records it created by statement. Service ids are matched as in MockAdClient, calls are
+    counted by service and method and created records by service."""
+
+    def __init__(self, custom_targeting=None, service_ids=None, start_id=100001):
+        super().__init__(custom_targeting or {}, service_ids or {})
+        self.ids = itertools.count(start_id)
+        self.known = {k_:[(loads(r_), v_) for r_, v_ in recs.items()] \
+                      for k_, recs in self.svc_ids.items()}
+        self.created = {}
+        self.calls = Counter()
+        self.records = Counter()
+        self.lock = threading.RLock()
+
+    def GetService(self, service, version=None):
+        return CountingService(super().GetService(service, version=version), self.calls,
+                               self.lock)
+
+    @staticmethod
+    def match_rec(rec):
+        # creatives are queried by width and height
+        return dict(rec, **rec['size']) if isinstance(rec.get('size'), dict) else rec
+
+    def known_id(self, rec):
+        for known, id_ in self.known.get(self.service, []):
+            if known.items() <= rec.items():
+                return id_
+        return None
+
+    def find(self, rec):
+        field, value = next(iter(rec.items()))
+        candidates = self.created.get(self.service, {}).get((field, value), [])
+        return [r_ for r_ in candidates if all(self.match_rec(r_).get(k_) == v_ \
+                                               for k_, v_ in rec.items())]
+
+    def byStatement(self, *args):
+        rec = rec_from_statement(args[0])
+        key = next((k_ for k_, v_ in rec.items() if isinstance(v_, list)), None)
+        results = []
+        with self.lock:
+            for value in rec[key] if key else [None]:
+                r_ = dict(rec, **{key: value}) if key else dict(rec)
+                id_ = self.known_id(r_)
+                if id_:
+                    results.append(dict(r_, id=id_))
+                elif r_:
+                    results += self.find(r_)
+        match = re.search(r'LIMIT (\d+) OFFSET (\d+)', args[0]['query'])
+        if match:
+            limit, offset = map(int, match.groups())
+            total, results = len(results), results[offset:offset + limit]
+            return dict(totalResultSetSize=total, results=results) if results else {}
+        return dict(results=results) if results else {}
+
+    def getCustomTargetingValuesByStatement(self, *args):
+        return self.byStatement(*args)
+
+    def create(self, *args):
+        out = []
+        with self.lock:
+            index = self.created.setdefault(self.service, {})
+            self.records[self.service] += len(args[0])
+            for rec in args[0]:
+                rec = dict(rec, id=self.known_id(rec) or next(self.ids))
+                for field, value in self.match_rec(rec).items():
+                    if isinstance(value, (str, int)):
+                        index.setdefault((field, value), []).append(rec)
+                out.append(rec)
+        return out
+
+for i_ in ('AdUnits', 'Placements', 'Companies', 'Orders', 'CustomTargetingKeys', 'Creatives',
+           'LineItems', 'LineItemCreativeAssociations'):
+    setattr(AutoIdMockAdClient, f'get{i_}ByStatement', AutoIdMockAdClient.byStatement)
+
+for i_ in ('Companies', 'Creatives', 'Orders', 'LineItems', 'LineItemCreativeAssociations',
+           'CustomTargetingKeys', 'CustomTargetingValues'):
+    setattr(AutoIdMockAdClient, f'create{i_}', AutoIdMockAdClient.create)
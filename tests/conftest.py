@@ -10,6 +10,13 @@ from line_item_manager.gam_operations import client as gam_client
 def pytest_configure():
     pytest.start_time = datetime(2020, 1, 2, 8, 9, 10)
 
+@pytest.fixture(scope='session', autouse=True)
+def cache_home(tmp_path_factory):
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path_factory.mktemp('cache')))
+    yield
+    monkeypatch.undo()
+
 @pytest.fixture
 def cli_config(request):
     config._app = None
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from line_item_manager.autotune import Autotuner, BatchTuner, fault
+
+def tuner(**kwargs):
+    return BatchTuner('lica', **dict(dict(size=100, workers=1, min_size=10, max_size=400,
+                                          max_workers=3, target_seconds=10, growth=1.5),
+                                     **kwargs))
+
+def test_batch_tuner():
+    tuner_ = tuner()
+    tuner_.observe(100, 1.0)
+    assert (tuner_.size, tuner_.workers) == (150, 2)
+    tuner_.observe(150, 1.0)
+    tuner_.observe(150, 1.0)
+    assert (tuner_.size, tuner_.workers) == (225, 3)
+    tuner_.observe(225, 30.0)
+    assert (tuner_.size, tuner_.workers) == (75, 3)
+    tuner_.observe(75, 1.0, faulted=True)
+    assert (tuner_.size, tuner_.workers) == (37, 2)
+    for _ in range(4):
+        tuner_.observe(tuner_.size, 60.0, faulted=True)
+    assert (tuner_.size, tuner_.workers) == (10, 1)
+    for _ in range(20):
+        tuner_.observe(tuner_.size, 1.0)
+    assert (tuner_.size, tuner_.workers) == (400, 3)
+    assert (tuner_.batches, tuner_.faults) == (29, 5)
+
+def test_create_batched():
+    lock = threading.Lock()
+    sizes = []
+    def create(recs):
+        with lock:
+            sizes.append(len(recs))
+            faulted = len(sizes) == 2
+        if faulted:
+            fault() # a retried fault
+        return [dict(r_, id=r_['name']) for r_ in recs]
+    tuner_ = tuner(size=10, max_size=20)
+    progress = []
+    recs = [dict(name=i_) for i_ in range(100)]
+    assert tuner_.create_batched(recs, create, progress=progress.append) == \
+      [dict(name=i_, id=i_) for i_ in range(100)]
+    assert sum(sizes) == sum(progress) == 100
+    assert sizes[:2] == [10, 15]
+    assert tuner_.faults == 1
+    assert max(sizes) == 20
+
+@pytest.mark.command('create tests/resources/cfg_video.yml -k tests/resources/gam_creds.json '
+                     '-b interactiveOffers')
+def test_autotuner(tmp_path, cli_config):
+    filename = str(tmp_path / 'autotune.json')
+    autotuner = Autotuner(filename, 1234)
+    lica = autotuner.tuner('lica_sizes', 'lica')
+    assert autotuner.tuner('lica_sizes', 'lica') is lica
+    assert (lica.size, lica.workers) == (100, 1)
+    lica.observe(100, 1.0)
+    autotuner.tuner('line_item', 'line_item')
+    autotuner.save()
+
+    autotuner = Autotuner(filename, 1234)
+    assert (autotuner.tuner('lica_sizes', 'lica').size,
+            autotuner.tuner('lica_sizes', 'lica').workers) == (125, 2)
+    assert autotuner.tuner('lica', 'lica').size == 100
+    assert autotuner.tuner('line_item', 'line_item').size == 150
+    assert Autotuner(filename, 5678).tuner('lica_sizes', 'lica').size == 100
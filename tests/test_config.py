@@ -4,7 +4,7 @@ import pytest
 import yaml
 
 from line_item_manager.config import config, VERBOSE1, VERBOSE2
-from line_item_manager.prebid import PrebidBidder, prebid
+from line_item_manager.prebid import PrebidBidder, PriceLadder, prebid
 from line_item_manager.utils import package_filename, load_file
 
 CONFIG_FILE = 'tests/resources/cfg.yml'
@@ -59,8 +59,13 @@ def test_template(cli_config):
     assert config.template_src() == open(TMPL_FILE).read()
 
 @pytest.mark.command(f'create {CONFIG_FILE} -k {KEY_FILE} -b {CONFIG_BIDDER} -b ix --settings {SETTINGS_FILE}')
-def test_settings(cli_config):
-    assert config.settings_obj() == load_file(SETTINGS_FILE)
+def test_settings(cli_config, caplog):
+    settings = load_file(SETTINGS_FILE)
+    assert settings['mgr'].pop('max_lica_records') == 100
+    settings['mgr']['autotune'] = load_file(package_filename('settings.yml'))['mgr']['autotune']
+    settings['mgr']['autotune']['lica'].update(max_size=100)
+    assert config.settings_obj() == settings
+    assert 'mgr.max_lica_records is deprecated' in caplog.text
 
 @pytest.mark.command(f'create {CONFIG_FILE} -k {KEY_FILE} -b {CONFIG_BIDDER} -b ix --schema {SCHEMA_FILE}')
 def test_schema(cli_config):
@@ -105,3 +110,38 @@ def test_video_max_duration(cli_config):
 def test_video_duration(cli_config):
     assert config.user['creative']['video']['duration'] == 15000
     assert config.user['creative']['video']['max_duration'] == 30000
+
+def test_price_ladder():
+    ladder = PriceLadder.from_buckets([dict(min=0.10, max=0.30, interval=0.10),
+                                       dict(min=0.30, max=1.30, interval=0.50)])
+    assert ladder == ['0.10', '0.20', '0.30', '0.80', '1.30']
+    assert list(ladder.micros) == [100000, 200000, 300000, 800000, 1300000]
+    assert ladder[1:3] == PriceLadder(['0.20', '0.30'], [200000, 300000])
+    assert ladder.micro_amount('0.80') == 800000
+
+    # overlapping buckets are merged, named by the first bucket listing the price
+    ladder = PriceLadder.from_buckets([dict(min=0.5, max=2, interval=0.5, precision=1),
+                                       dict(min=0.25, max=1.5, interval=0.25)])
+    assert ladder == ['0.25', '0.5', '0.75', '1.0', '1.25', '1.5', '2.0']
+    assert list(ladder.micros) == [250000, 500000, 750000, 1000000, 1250000, 1500000, 2000000]
+
+    ladder = PriceLadder.from_buckets([dict(min=1, max=3, interval=1)], precision=0)
+    assert ladder == ['1', '2', '3']
+    ladder = PriceLadder.from_buckets([dict(min=0.005, max=0.02, interval=0.005)], precision=3)
+    assert ladder == ['0.005', '0.010', '0.015', '0.020']
+    assert list(ladder.micros) == [5000, 10000, 15000, 20000]
+
+    with pytest.raises(ValueError, match='less than the precision'):
+        PriceLadder.from_buckets([dict(min=0.01, max=1, interval=0.001)])
+
+    ladder = PriceLadder.from_buckets([dict(min=0.01, max=100, interval=0.01)])
+    assert ladder == ['%.2f' % (v_ / 100) for v_ in range(1, 10001)]
+    assert list(ladder.micros) == [v_ * 10000 for v_ in range(1, 10001)]
+
+@pytest.mark.command(f'create {CONFIG_FILE} -k {KEY_FILE} -b ix')
+def test_micro_amount(cli_config):
+    assert [config.micro_amount(c_) for c_ in config.cpm_names()] == \
+      [100000, 200000, 300000, 800000, 1300000]
+    assert [len(c_) for c_ in config.cpm_names_batched()] == [5]
+    assert config.micro_amount('2.01') == 2010000
+    assert config.micro_amount(1.13) == 1130000
@@ -3,8 +3,10 @@
 """Tests for `line_item_manager` package."""
 
 import copy
+import cProfile
 from logging import INFO, WARNING, ERROR
 import pytest
+import retrying
 import shlex
 import yaml
 from yaml import safe_dump as dump
@@ -18,13 +20,18 @@ from line_item_manager import gam_config
 from line_item_manager.config import config, VERBOSE1, VERBOSE2
 from line_item_manager.exceptions import ResourceNotActive, ResourceNotFound
 from line_item_manager.gam_config import GAMConfig
+from line_item_manager.metrics import metrics
+from line_item_manager.operations import TargetingValues
+from line_item_manager.profiling import profiler
+from line_item_manager.rate_limit import rate_controller
 from line_item_manager.prebid import prebid
-from line_item_manager.utils import load_file, num_hash
+from line_item_manager.utils import load_file
 
-from .client import MockAdClient, SINGLE_ORDER_SVC_IDS, SINGLE_ORDER_VIDEO_SVC_IDS, \
+from .client import AutoIdMockAdClient, MockAdClient, SVC_IDS, SINGLE_ORDER_SVC_IDS, SINGLE_ORDER_VIDEO_SVC_IDS, \
      BIDDER_BANNER_SVC_IDS, BIDDER_VIDEO_SVC_IDS, BIDDER_TEST_RUN_VIDEO_SVC_IDS, \
      MISSING_RESOURCE_SVC_IDS, BIDDER_BANNER_SVC_IDS_NO_SIZE_OVERRIDE, \
-     BIDDER_VIDEO_BIDDER_KEY_MAP_SVC_IDS, BIDDER_VIDEO_SVC_IDS_SIZE_OVERRIDE
+     BIDDER_VIDEO_BIDDER_KEY_MAP_SVC_IDS, BIDDER_VIDEO_SVC_IDS_SIZE_OVERRIDE, \
+     BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM
 
 CONFIG_FILE = 'tests/resources/cfg.yml'
 KEY_FILE = 'tests/resources/gam_creds.json'
@@ -49,20 +56,17 @@ VIDEO_CREATIVE = {
     'duration': 30000
     }
 
-LI_0 = 9999899367
-LI_1 = 9999960551
+LI_0 = 9999000001
+LI_1 = 9999000002
 
-def mock_id(name: str, rec: object):
-    return int('9999' + str(num_hash([name, str(rec)])))
-
-CREATIVE_0 = mock_id('CreativeVideo', VIDEO_CREATIVE)
+CREATIVE_0 = 9999000001
 VIDEO_CREATIVE.update({'size': {'height': 240, 'width': 320}})
-CREATIVE_1 = mock_id('CreativeVideo', VIDEO_CREATIVE)
+CREATIVE_1 = 9999000002
 
-LICA_0_0 = mock_id('LICA', {'lineItemId': LI_0, 'creativeId': CREATIVE_0})
-LICA_0_1 = mock_id('LICA', {'lineItemId': LI_0, 'creativeId': CREATIVE_1})
-LICA_1_0 = mock_id('LICA', {'lineItemId': LI_1, 'creativeId': CREATIVE_0})
-LICA_1_1 = mock_id('LICA', {'lineItemId': LI_1, 'creativeId': CREATIVE_1})
+LICA_0_0 = 9999000001
+LICA_0_1 = 9999000002
+LICA_1_0 = 9999000003
+LICA_1_1 = 9999000004
 
 DRY_RUN_EXPECTED_LICA = \
   [[{'lineItemId': LI_0, 'creativeId': CREATIVE_0, 'id': LICA_0_0},
@@ -105,6 +109,7 @@ class Client(MockAdClient):
 
     def __init__(self, custom_targeting, service_ids, **kwargs):
         self.kwargs = kwargs
+        self.committed = set()
         super().__init__(custom_targeting, service_ids)
 
     def getCustomTargetingKeysByStatement(self, *args):
@@ -113,6 +118,21 @@ class Client(MockAdClient):
             r_['results'][0].update(dict(status='INACTIVE'))
         return r_
 
+    def createLineItems(self, *args):
+        if self.kwargs.get('line_item_faults'):
+            self.kwargs['line_item_faults'] -= 1
+            raise GoogleAdsServerFault(None, message='Test Fault')
+        results = super().createLineItems(*args)
+        self.committed.update(r_['name'] for r_ in results)
+        return results
+
+    def getLineItemsByStatement(self, *args):
+        r_ = super().getLineItemsByStatement(*args)
+        if r_ and 'line_item_faults' in self.kwargs:
+            # only line items created before a fault exist
+            r_['results'] = [i_ for i_ in r_['results'] if i_['name'] in self.committed]
+        return r_
+
     def createCustomTargetingValues(self, *args):
         if args[0][0]['customTargetingKeyId'] == 7101:
             assert [rec['name'] for rec in args[0]] == ['CAN']
@@ -120,8 +140,8 @@ class Client(MockAdClient):
 
     def performOrderAction(self, *args):
         order_ids = [i_['value'] for i_ in args[1]['values'][0]['value']['values']]
-        assert order_ids == [6001]
-        return dict(numChanges=1)
+        assert order_ids == self.kwargs.get('archived_order_ids', [6001])
+        return dict(numChanges=len(order_ids))
 
 @pytest.mark.parametrize("command, err_str", [
   (f'tests/resources/cfg_bad_yaml.yml -k {KEY_FILE} -b {CONFIG_BIDDER}',
@@ -130,10 +150,16 @@ class Client(MockAdClient):
    'You must use --single-order or provide'),
   (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b ix --single-order',
    'Use of --single-order and --bidder-code'),
+  (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b ix --pipeline -j 2',
+   'Use of --pipeline and --jobs'),
   (f'tests/resources/cfg_no_pub.yml -k {KEY_FILE} -b ix',
    'Network code must be provided'),
   (f'tests/resources/cfg_no_pub.yml -k {KEY_FILE} -b ix --network-code 1234',
    'Network name must be provided'),
+  (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b ix -n --resume 20200102-080910-abcdef',
+   'Use of --resume and --dry-run'),
+  (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} --resume unknown',
+   'Run id \'unknown\' was not found'),
   (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b badcode',
    'Bidder code \'badcode\''),
   (f'tests/resources/cfg_video.yml -k {KEY_FILE} -b ix --network-name badname',
@@ -228,7 +254,7 @@ def test_cli_ads_error(caplog, monkeypatch, exc_type, err_str):
             raise KeyboardInterrupt()
     client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
     monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
-    monkeypatch.setattr(cli.GAMConfig, "create_line_items", raise_exception)
+    monkeypatch.setattr(gam_config.GAMConfig, "create_line_items", raise_exception)
     caplog.set_level(WARNING)
     runner = CliRunner()
     _ = runner.invoke(cli.create, shlex.split(command))
@@ -241,8 +267,8 @@ def test_cli_cleanup_exception(caplog, monkeypatch):
         raise GoogleAdsError('Test GAM Error')
     client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
     monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
-    monkeypatch.setattr(cli.GAMConfig, "create_line_items", raise_exception)
-    monkeypatch.setattr(cli.GAMConfig, "cleanup", raise_exception)
+    monkeypatch.setattr(gam_config.GAMConfig, "create_line_items", raise_exception)
+    monkeypatch.setattr(gam_config.GAMConfig, "cleanup", raise_exception)
     caplog.set_level(ERROR)
     runner = CliRunner()
     _ = runner.invoke(cli.create, shlex.split(command))
@@ -294,7 +320,7 @@ def test_archive_error(caplog, monkeypatch, cli_config):
     assert 'Order archive, [6001], of 1 changes, reported 0 changes' in caplog.text
 
 @pytest.mark.command(f'create tests/resources/cfg_video.yml -v -v -n -k {KEY_FILE} -b {CONFIG_BIDDER}')
-def test_dry_run(monkeypatch, cli_config):
+def test_dry_run(monkeypatch, cli_config, caplog):
     client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
     monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
     gam = GAMConfig()
@@ -305,6 +331,19 @@ def test_dry_run(monkeypatch, cli_config):
     assert load_file('tests/resources/video_expected_dry_run.yml') == \
       gam.li_objs[0].line_items
     assert DRY_RUN_EXPECTED_LICA == gam.lica_objs
+    stats = config.memo['dry_run_stats']
+    assert stats[('LineItemService', 'records')] == 2
+    assert stats[('LineItemCreativeAssociationService', 'records')] == 4
+    assert stats[('LineItemCreativeAssociationService', 'calls')] == 1
+    assert 'Dry run LineItemService: 2 records in 1 calls' in caplog.text
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -n -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_dry_run_ids(cli_config):
+    recs = [dict(name='US', customTargetingKeyId=7101), dict(name='US', customTargetingKeyId=7201)]
+    ids = [r_['id'] for r_ in TargetingValues().dry_run_recs(recs)]
+    assert ids == [9999000001, 9999000002]
+    assert [r_['id'] for r_ in TargetingValues().dry_run_recs(recs[1:])] == ids[1:]
+    assert 'id' not in recs[0]
 
 @pytest.mark.command(f'create tests/resources/cfg_video.yml -t -k {KEY_FILE} -b {CONFIG_BIDDER}')
 def test_test_run(monkeypatch, cli_config):
@@ -470,3 +509,417 @@ def test_sponsorship_priority(monkeypatch, cli_config):
     assert len(gam.li_objs) == 1
     assert load_file('tests/resources/sponsorship_expected.yml') == gam.li_objs[0].line_items
     assert BANNER_EXPECTED_LICA == gam.lica_objs
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -j 2 -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_jobs(monkeypatch, cli_config):
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM)
+    client = Client(CUSTOM_TARGETING, svc_ids)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['googleads']['line_items']['max_per_order'] = 1
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert [li_.order['id'] for li_ in gam.li_objs] == [6001, 6002]
+    assert [[i_['id'] for i_ in li_.line_items] for li_ in gam.li_objs] == [[8001], [8002]]
+    assert [[(i_['lineItemId'], i_['creativeId']) for i_ in licas] for licas in gam.lica_objs] == \
+      [[(8001, 4001), (8001, 4002)], [(8002, 4001), (8002, 4002)]]
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -j 2 -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_jobs_cleanup(monkeypatch, cli_config):
+    class ThisClient(Client):
+        def createLineItemCreativeAssociations(self, *args):
+            raise GoogleAdsError('Test GAM Error')
+
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM)
+    client = ThisClient(CUSTOM_TARGETING, svc_ids, archived_order_ids=[6001, 6002])
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['googleads']['line_items']['max_per_order'] = 1
+    gam = GAMConfig()
+    gam.open_journal(cli_config['configfile'])
+
+    with pytest.raises(GoogleAdsError):
+        gam.create_line_items()
+    gam.cleanup()
+
+    assert [li_.order['id'] for li_ in gam.li_objs] == [6001, 6002]
+    config.cli['resume'] = gam.journal.run_id
+    with pytest.raises(ResourceNotActive, match='is archived and cannot be resumed'):
+        GAMConfig().open_journal()
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml --pipeline -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_pipeline(monkeypatch, cli_config):
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM)
+    client = Client(CUSTOM_TARGETING, svc_ids)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['googleads']['line_items']['max_per_order'] = 1
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert [li_.order['id'] for li_ in gam.li_objs] == [6001, 6002]
+    assert [[i_['id'] for i_ in li_.line_items] for li_ in gam.li_objs] == [[8001], [8002]]
+    assert [[(i_['lineItemId'], i_['creativeId']) for i_ in licas] for licas in gam.lica_objs] == \
+      [[(8001, 4001), (8001, 4002)], [(8002, 4001), (8002, 4002)]]
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_line_items_chunked(monkeypatch, cli_config):
+    client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS, line_item_faults=2)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    monkeypatch.setattr(retrying.time, "sleep", lambda x: None)
+    config.app['mgr']['autotune']['line_item'].update(size=1, min_size=1)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert client.kwargs['line_item_faults'] == 0
+    assert load_file('tests/resources/video_expected.yml') == gam.li_objs[0].line_items
+    assert EXPECTED_LICA == gam.lica_objs
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_partial_commit_retry(monkeypatch, cli_config):
+    class ThisClient(AutoIdMockAdClient):
+        faults = dict(LineItemService=1, LineItemCreativeAssociationService=1)
+        def create(self, *args):
+            if self.faults.get(self.service):
+                self.faults[self.service] -= 1
+                super().create(args[0][:1]) # committed before the fault
+                raise GoogleAdsServerFault(None, message='Test Fault')
+            return super().create(*args)
+    for i_ in ('LineItems', 'LineItemCreativeAssociations'):
+        setattr(ThisClient, f'create{i_}', ThisClient.create)
+    client = ThisClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    sleeps = []
+    monkeypatch.setattr(retrying.time, "sleep", sleeps.append)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    line_items = gam.li_objs[0].line_items
+    assert [i_['name'][-4:] for i_ in line_items] == ['1.25', '1.50']
+    assert len({i_['id'] for i_ in line_items}) == 2
+    assert [(r_['lineItemId'], r_['creativeId']) for r_ in gam.lica_objs[0]] == \
+      [(l_['id'], c_['id']) for l_ in line_items for c_ in gam.li_objs[0].creatives]
+    assert client.records['LineItemService'] == 2
+    assert client.records['LineItemCreativeAssociationService'] == 4
+    assert client.calls[('LineItemService', 'createLineItems')] == 2
+    assert client.calls[('LineItemCreativeAssociationService',
+                         'getLineItemCreativeAssociationsByStatement')] == 1
+    assert len(sleeps) == 2 and all(2 <= s_ <= 3 for s_ in sleeps)
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_partial_commit_throttled(monkeypatch, cli_config):
+    class ThisClient(AutoIdMockAdClient):
+        faults = 1
+        def createLineItems(self, *args):
+            if ThisClient.faults:
+                ThisClient.faults -= 1
+                super().create(args[0][:1]) # committed before the fault
+                raise GoogleAdsServerFault(None, message='[ServerError.SERVER_BUSY @ ]')
+            return super().create(*args)
+    client = ThisClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    monkeypatch.setattr(retrying.time, "sleep", lambda x: None)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert len({i_['id'] for i_ in gam.li_objs[0].line_items}) == 2
+    assert client.records['LineItemService'] == 2
+    assert client.calls[('LineItemService', 'createLineItems')] == 2
+    assert rate_controller(client).throttled == 1
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_ad_units_name_in_query(monkeypatch, cli_config):
+    queries = []
+    class ThisClient(Client):
+        def getAdUnitsByStatement(self, *args):
+            queries.append(args[0]['query'])
+            return super().getAdUnitsByStatement(*args)
+    client = ThisClient(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['mgr']['max_names_per_query'] = 1
+    gam = GAMConfig()
+    assert [a_['id'] for a_ in gam.ad_units] == [2001, 2002]
+    assert queries == ['WHERE name IN :name LIMIT 500 OFFSET 0'] * 2
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_missing_placement_resources(monkeypatch, cli_config):
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(dict(PlacementService={}))
+    client = Client(CUSTOM_TARGETING, svc_ids)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+
+    with pytest.raises(ResourceNotFound) as e_:
+        gam.create_line_items()
+    assert "Placements named 'placement 1', 'placement 2' were not found" in str(e_)
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} --activate-keys')
+def test_video_one_bidder_activate_keys(monkeypatch, cli_config):
+    activated = []
+    class ThisClient(Client):
+        def performCustomTargetingKeyAction(self, *args):
+            assert args[0] == {'xsi_type': 'ActivateCustomTargetingKeys'}
+            activated.extend(i_['value'] for i_ in args[1]['values'][0]['value']['values'])
+            return dict(numChanges=len(activated))
+    client = ThisClient(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS, invalid_targeting_key=True)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert activated == ['hb_pb_interactiveOff']
+    assert gam.bidder_keys['hb_pb_interactiveOff']['status'] == 'ACTIVE'
+    assert load_file('tests/resources/video_expected.yml') == gam.li_objs[0].line_items
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} -b ix -b pubmatic')
+def test_provision_bidders(monkeypatch, cli_config):
+    calls = []
+    existing = {'hb_pb_interactiveOff', 'Prebid-InteractiveOffers'}
+    class ThisClient(Client):
+        def __getattribute__(self, name):
+            attr = super().__getattribute__(name)
+            if name.startswith(('get', 'create')) and ('Companies' in name or 'Keys' in name):
+                calls.append(name)
+            return attr
+        def getCustomTargetingKeysByStatement(self, *args):
+            r_ = super().getCustomTargetingKeysByStatement(*args)
+            return dict(results=[i_ for i_ in r_.get('results', []) if i_['name'] in existing])
+        def getCompaniesByStatement(self, *args):
+            r_ = super().getCompaniesByStatement(*args)
+            return dict(results=[i_ for i_ in r_.get('results', []) if i_['name'] in existing])
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids['CustomTargetingService'] = dict(SVC_IDS['CustomTargetingService'])
+    svc_ids['CustomTargetingService'].update({dump(dict(name='hb_pb_ix')): 7202,
+                                              dump(dict(name='hb_pb_pubmatic')): 7203})
+    svc_ids['CompanyService'] = dict(SVC_IDS['CompanyService'])
+    svc_ids['CompanyService'].update({dump(dict(name='Prebid-Index Exchange')): 1002,
+                                      dump(dict(name='Prebid-PubMatic')): 1003})
+    client = ThisClient(CUSTOM_TARGETING, svc_ids)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+    gam.provision_bidders()
+
+    assert calls == ['getCustomTargetingKeysByStatement', 'createCustomTargetingKeys',
+                     'getCompaniesByStatement', 'createCompanies']
+    assert {k_:v_['id'] for k_, v_ in gam.bidder_keys.items()} == \
+      {'hb_pb_interactiveOff': 7201, 'hb_pb_ix': 7202, 'hb_pb_pubmatic': 7203}
+    assert {k_:v_['id'] for k_, v_ in gam.advertisers.items()} == \
+      {'interactiveOffers': 1001, 'ix': 1002, 'pubmatic': 1003}
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_provision_creatives(monkeypatch, cli_config):
+    queries = []
+    created = []
+    class ThisClient(Client):
+        def getCreativesByStatement(self, *args):
+            queries.append(args[0]['query'])
+            return dict(results=[dict(VIDEO_CREATIVE, size={'height': 480, 'width': 640}, id=4001)])
+        def createCreatives(self, *args):
+            created.append([(i_['name'], i_['size']) for i_ in args[0]])
+            return super().createCreatives(*args)
+    client = ThisClient(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert queries == ['WHERE name IN :name AND advertiserId = :advertiserId LIMIT 500 OFFSET 0']
+    assert created == [[('Prebid InteractiveOffers-video', {'height': 240, 'width': 320})]]
+    assert [i_['id'] for i_ in gam.creatives[(CONFIG_BIDDER, 'video')]] == [4001, 4002]
+    assert EXPECTED_LICA == gam.lica_objs
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml --skip-auto-archive -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_resume(monkeypatch, cli_config):
+    calls = []
+    class ThisClient(Client):
+        def __getattribute__(self, name):
+            attr = super().__getattribute__(name)
+            if name.startswith('create') or name == 'getOrdersByStatement':
+                calls.append(name)
+            return attr
+        def createLineItemCreativeAssociations(self, *args):
+            if self.kwargs.get('lica_faults') and args[0][0]['lineItemId'] == 8002:
+                self.kwargs['lica_faults'] -= 1
+                raise GoogleAdsError('Test GAM Error')
+            return super().createLineItemCreativeAssociations(*args)
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM)
+    client = ThisClient(CUSTOM_TARGETING, svc_ids, lica_faults=1)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['googleads']['line_items']['max_per_order'] = 1
+    gam = GAMConfig()
+    gam.open_journal(cli_config['configfile'])
+    run_id = gam.journal.run_id
+    with pytest.raises(GoogleAdsError):
+        gam.create_line_items()
+    gam.cleanup()
+    assert gam.lica_objs == [[{'creativeId': 4001, 'id': 9001, 'lineItemId': 8001},
+                              {'creativeId': 4002, 'id': 9002, 'lineItemId': 8001}]]
+
+    calls.clear()
+    config.cli['resume'] = run_id
+    config.start_time = pytest.start_time.replace(year=2021)
+    gam = GAMConfig()
+    gam.open_journal()
+    gam.create_line_items()
+    gam.success = True
+    gam.cleanup()
+
+    assert config.start_time == pytest.start_time
+    assert 'createLineItems' not in calls and 'getOrdersByStatement' not in calls
+    assert calls.count('createLineItemCreativeAssociations') == 1
+    assert [li_.order['id'] for li_ in gam.li_objs] == [6002]
+    assert [[(i_['lineItemId'], i_['creativeId']) for i_ in licas] for licas in gam.lica_objs] == \
+      [[(8001, 4001), (8001, 4002)], [(8002, 4001), (8002, 4002)]]
+    with pytest.raises(ResourceNotActive, match='is done and cannot be resumed'):
+        GAMConfig().open_journal()
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml --skip-auto-archive -j 2 -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_resume_pipeline(monkeypatch, cli_config):
+    class ThisClient(Client):
+        def createLineItemCreativeAssociations(self, *args):
+            if self.kwargs.get('lica_faults') and args[0][0]['lineItemId'] == 8001:
+                self.kwargs['lica_faults'] -= 1
+                raise GoogleAdsError('Test GAM Error')
+            return super().createLineItemCreativeAssociations(*args)
+    svc_ids = copy.deepcopy(BIDDER_VIDEO_SVC_IDS)
+    svc_ids.update(BIDDER_VIDEO_SVC_IDS_ORDER_PER_CPM)
+    client = ThisClient(CUSTOM_TARGETING, svc_ids, lica_faults=1)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.app['googleads']['line_items']['max_per_order'] = 1
+    gam = GAMConfig()
+    gam.open_journal(cli_config['configfile'])
+    with pytest.raises(GoogleAdsError):
+        gam.create_line_items()
+    gam.cleanup()
+
+    # the second unit was completed, the first is created by the resumed pipeline
+    config.cli.update(resume=gam.journal.run_id, jobs=1, pipeline=True)
+    gam = GAMConfig()
+    gam.open_journal()
+    gam.create_line_items()
+    assert [li_.order['id'] for li_ in gam.li_objs] == [6001]
+    assert [[(i_['lineItemId'], i_['creativeId']) for i_ in licas] for licas in gam.lica_objs] == \
+      [[(8001, 4001), (8001, 4002)], [(8002, 4001), (8002, 4002)]]
+    gam.cleanup()
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_video_existing_order(monkeypatch, cli_config):
+    created = {}
+    class ThisClient(Client):
+        def getLineItemsByStatement(self, *args):
+            return dict(results=[dict(
+                id=8001, orderId=6001,
+                name='Prebid-InteractiveOffers-video-01/02/2020-08:09:10 @ 1.25')])
+        def getLineItemCreativeAssociationsByStatement(self, *args):
+            return dict(results=[dict(lineItemId=8001, creativeId=4001, id=9001)])
+        def createLineItems(self, *args):
+            created['line_items'] = [r_['name'] for r_ in args[0]]
+            return super().createLineItems(*args)
+        def createLineItemCreativeAssociations(self, *args):
+            created['licas'] = [(r_['lineItemId'], r_['creativeId']) for r_ in args[0]]
+            return super().createLineItemCreativeAssociations(*args)
+    client = ThisClient(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+    gam.create_line_items()
+
+    assert gam.li_objs[0].order_exists
+    assert created == {
+        'line_items': ['Prebid-InteractiveOffers-video-01/02/2020-08:09:10 @ 1.50'],
+        'licas': [(8001, 4002), (8002, 4001), (8002, 4002)],
+    }
+    assert [i_['id'] for i_ in gam.li_objs[0].line_items] == [8001, 8002]
+    assert EXPECTED_LICA == gam.lica_objs
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} -b ix')
+def test_auto_id_client(monkeypatch, cli_config):
+    client = AutoIdMockAdClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    gam = GAMConfig()
+    gam.create_line_items()
+    assert client.records == {'CompanyService': 1, 'CreativeService': 4,
+                              'CustomTargetingService': 3, 'OrderService': 2,
+                              'LineItemService': 4, 'LineItemCreativeAssociationService': 8}
+    assert client.calls[('LineItemService', 'createLineItems')] == 2
+
+    # a second run finds the created records
+    records = copy.copy(client.records)
+    gam = GAMConfig()
+    gam.create_line_items()
+    assert client.records == records
+    assert [len(l_) for l_ in gam.lica_objs] == [4, 4]
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} -b ix')
+def test_shared_creative_name(monkeypatch, cli_config):
+    client = AutoIdMockAdClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    config.user['creative']['name'] = 'Prebid {{ media_type }}'
+    gam = GAMConfig()
+    gam.create_line_items()
+    assert client.records['CreativeService'] == 4
+    for li_ in gam.li_objs:
+        assert {c_['advertiserId'] for c_ in li_.creatives} == {li_.advertiser['id']}
+    assert len({c_['id'] for li_ in gam.li_objs for c_ in li_.creatives}) == 4
+
+def test_cli_profile(monkeypatch, tmp_path):
+    client = AutoIdMockAdClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    command = f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} ' \
+      f'--profile {tmp_path}/profile'
+    result = CliRunner().invoke(cli.cli, shlex.split(command))
+    assert result.exit_code == 0
+    phases = ('config', 'check_resources', 'bidders', 'creatives', 'orders', 'line_item_render',
+              'line_item_create', 'lica_create')
+    assert sorted(p_.name for p_ in (tmp_path / 'profile').iterdir()) == \
+      sorted([f'{p_}.pstats' for p_ in phases] + ['summary.txt'])
+    summary = (tmp_path / 'profile' / 'summary.txt').read_text()
+    assert sorted(l_.split(',')[0] for l_ in summary.splitlines() if l_.startswith('Phase: ')) == \
+      sorted(f'Phase: {p_}' for p_ in phases)
+    assert profiler.directory is None
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}')
+def test_profile_busy(monkeypatch, tmp_path, cli_config):
+    class BusyProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            # only the first phase is profiled, as with a concurrent unit on Python 3.12+
+            if profiled:
+                raise ValueError('Another profiling tool is already active')
+            profiled.append(self)
+            super().enable(*args, **kwargs)
+    profiled = []
+    monkeypatch.setattr(cProfile, 'Profile', BusyProfile)
+    profiler.start(str(tmp_path))
+    with profiler.phase('orders'):
+        load_file('tests/resources/cfg_video.yml')
+        with profiler.phase('line_item_create'):
+            pass
+    profiler.finish()
+    assert (tmp_path / 'orders.pstats').exists()
+    assert not (tmp_path / 'line_item_create.pstats').exists()
+
+def test_cli_metrics(monkeypatch, tmp_path):
+    class ThisClient(AutoIdMockAdClient):
+        faults = 1
+        def createLineItems(self, *args):
+            if ThisClient.faults:
+                ThisClient.faults -= 1
+                raise GoogleAdsServerFault(None, message='Test Fault')
+            return super().createLineItems(*args)
+    client = ThisClient()
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    monkeypatch.setattr(retrying.time, "sleep", lambda x: None)
+    command = f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER} ' \
+      f'--metrics-out {tmp_path}/run.json'
+    result = CliRunner().invoke(cli.cli, shlex.split(command))
+    assert result.exit_code == 0
+    assert not metrics.enabled
+    run = load_file(f'{tmp_path}/run.json')
+    assert run['calls'] == sum(client.calls.values())
+    line_items = run['services']['LineItemService.createLineItems']
+    assert {k_:line_items[k_] for k_ in ('calls', 'errors', 'retries', 'records')} == \
+      dict(calls=2, errors=1, retries=1, records=2)
+    assert line_items['p50_ms'] <= line_items['p95_ms'] <= line_items['p99_ms']
+    assert run['phases']['line_item_create']['created'] == 2
+    assert run['phases']['lica_create']['created'] == 4
+    assert run['phases']['config']['calls'] == 1 # getCurrentNetwork
+    assert run['phases']['lica_create']['records_per_second'] > 0
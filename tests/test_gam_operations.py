@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+import re
+from types import SimpleNamespace
+import threading
+
+from googleads.errors import GoogleAdsServerFault
+import pytest
+import requests
+
+from line_item_manager.gam_operations import GAMOperations, service_cache, \
+     ServiceCache
+from line_item_manager.metrics import metrics, percentile
+from line_item_manager.rate_limit import RateController, rate_controller
+
+class Client:
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def GetService(self, service, version=None):
+        with self.lock:
+            self.calls.append((service, version))
+        transport = SimpleNamespace(session=requests.Session())
+        return SimpleNamespace(service=service, zeep_client=SimpleNamespace(transport=transport))
+
+def test_service_cache():
+    client = Client()
+    cache = ServiceCache(client, pool_size=4, keep_alive=False)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        svcs = list(pool.map(lambda i_: cache.get(['OrderService', 'LineItemService'][i_ % 2],
+                                                  'v202508'), range(20)))
+    assert sorted(client.calls) == [('LineItemService', 'v202508'), ('OrderService', 'v202508')]
+    assert len({id(s_) for s_ in svcs}) == 2
+    sessions = {id(s_.zeep_client.transport.session) for s_ in svcs}
+    assert len(sessions) == 1
+    session = svcs[0].zeep_client.transport.session
+    assert session.headers['Connection'] == 'close'
+    assert session.get_adapter('https://example.com')._pool_maxsize == 4
+    assert cache.stats() == dict(proxies_created=2, proxies_reused=18, connections_created=0,
+                                 connections_reused=0)
+    assert cache.get('OrderService', 'v202311') is not cache.get('OrderService', 'v202508')
+
+def test_service_cache_per_client():
+    client = Client()
+    assert service_cache(client) is service_cache(client)
+    assert service_cache(client) is not service_cache(Client())
+    svc = SimpleNamespace(service='NetworkService')
+    client.GetService = lambda service, version=None: svc
+    assert service_cache(client).get('NetworkService', 'v202508') is svc # no session to pool
+
+class PagedClient:
+
+    def __init__(self, total):
+        self.total = total
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def GetService(self, service, version=None):
+        return self
+
+    def getLineItemsByStatement(self, statement):
+        with self.lock:
+            self.queries.append(statement['query'])
+        limit, offset = map(int, re.search(r'LIMIT (\d+) OFFSET (\d+)', statement['query']).groups())
+        return dict(totalResultSetSize=self.total,
+                    results=[dict(id=i_) for i_ in range(offset, min(offset + limit, self.total))])
+
+class LineItems(GAMOperations):
+    service = 'LineItemService'
+    method = 'getLineItemsByStatement'
+    page_size = 10
+    version = 'v202508'
+    http_pool = dict(pool_size=2, keep_alive=True)
+    rate_limit = dict(rate=1000, max_rate=1000, burst=1000)
+    dry_run = False
+
+    def __init__(self, client, workers=1, **kwargs):
+        self._client = client
+        self._paging = dict(page_sizes=dict(LineItems=kwargs.pop('page_size', self.page_size)),
+                            workers=workers)
+        super().__init__(**kwargs)
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def paging(self):
+        return self._paging
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_paging(workers):
+    client = PagedClient(25)
+    assert [r_['id'] for r_ in LineItems(client, workers=workers).fetch()] == list(range(25))
+    assert sorted(client.queries) == \
+      [f'LIMIT 10 OFFSET {i_}' for i_ in (0, 10, 20)]
+
+    client.queries.clear()
+    records = LineItems(client, workers=workers, page_size=5).iter_results()
+    assert [next(records)['id'] for _ in range(3)] == [0, 1, 2]
+    assert client.queries == ['LIMIT 5 OFFSET 0']
+
+def test_paging_fetchone():
+    client = PagedClient(25)
+    assert LineItems(client, orderId=1).fetchone() == dict(id=0)
+    assert client.queries == ['WHERE orderId = :orderId LIMIT 1 OFFSET 0']
+
+def test_paging_total_exceeded():
+    class ThisClient(PagedClient):
+        def getLineItemsByStatement(self, statement):
+            response = super().getLineItemsByStatement(statement)
+            self.total = 25 # records are added after the first page
+            return response
+    client = ThisClient(20)
+    assert [r_['id'] for r_ in LineItems(client, workers=2).fetch()] == list(range(25))
+    assert client.queries[-1] == 'LIMIT 10 OFFSET 20'
+
+def test_metrics():
+    metrics.start()
+    try:
+        client = PagedClient(25)
+        assert len(LineItems(client, workers=3).fetch()) == 25
+        assert len(LineItems(client).fetch()) == 25
+        response = SimpleNamespace(request=SimpleNamespace(body=b'<query/>'), content=b'<results/>')
+        metrics.call('LineItemService', 'getLineItemsByStatement', metrics.on_response, response)
+        report = metrics.report()
+    finally:
+        metrics.enabled = False
+    calls = report['services']['LineItemService.getLineItemsByStatement']
+    assert {k_:calls[k_] for k_ in ('calls', 'errors', 'records', 'bytes_sent', 'bytes_received')} == \
+      dict(calls=7, errors=0, records=50, bytes_sent=8, bytes_received=10)
+    assert report['phases']['other']['calls'] == 7
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 99) == 4.0
+
+def test_rate_limit():
+    class ThisClient(PagedClient):
+        faults = 2
+        def getLineItemsByStatement(self, statement):
+            with self.lock:
+                if self.faults:
+                    self.faults -= 1
+                    raise GoogleAdsServerFault(
+                        None, errors=[SimpleNamespace(errorString='QuotaError.EXCEEDED_QUOTA')])
+            return super().getLineItemsByStatement(statement)
+    client = ThisClient(25)
+    assert [r_['id'] for r_ in LineItems(client).fetch()] == list(range(25))
+    controller = rate_controller(client)
+    assert controller.throttled == 2
+    assert controller.rate == pytest.approx(1000 * 0.5 ** 2 + 3 * 0.1)
+    assert controller.in_flight == 0
+
+    client.faults = 10
+    with pytest.raises(GoogleAdsServerFault):
+        LineItems(client).fetch()
+    assert controller.throttled == 8
+    assert controller.in_flight == 0
+
+    class FailingClient(PagedClient):
+        def getLineItemsByStatement(self, statement):
+            raise GoogleAdsServerFault(None, message='[PermissionError.PERMISSION_DENIED @ ]')
+    client = FailingClient(25)
+    with pytest.raises(GoogleAdsServerFault):
+        LineItems(client).fetch()
+    assert rate_controller(client).throttled == 0
+
+def test_rate_controller_window():
+    controller = RateController(rate=1000, max_rate=1000, burst=1000, window=2, max_window=3)
+    controller.acquire()
+    controller.acquire()
+    assert controller._reserve() > 0
+    controller.release()
+    assert controller.window == 2.5
+    controller.release(throttled=True)
+    assert controller.window == 1.25
+    assert controller.rate == 500
+    for _ in range(10):
+        controller.acquire()
+        controller.release()
+    assert controller.window == 3
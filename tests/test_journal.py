@@ -0,0 +1,61 @@
+from datetime import datetime
+import os
+
+import pytest
+
+from line_item_manager import journal as journal_module
+from line_item_manager.exceptions import ResourceNotActive, ResourceNotFound
+from line_item_manager.journal import Journal
+
+START_TIME = datetime(2020, 1, 2, 8, 9, 10)
+
+def test_journal(tmp_path, monkeypatch):
+    filename = os.path.join(tmp_path, 'journal.sqlite')
+    journal = Journal(filename, start_time=START_TIME, configfile='cfg.yml')
+    assert journal.run_id.startswith('20200102-080910-')
+    other = Journal(filename, start_time=START_TIME)
+    assert other.run_id != journal.run_id
+
+    monkeypatch.setattr(journal_module, '_MAX_VARIABLES', 2)
+    journal.record('line_item', [dict(id=i_, name=f'li {i_}') for i_ in range(5)],
+                   key=lambda r_: r_['name'])
+    other.record('line_item', [dict(id=9, name='li 1')], key=lambda r_: r_['name'])
+    assert journal.get('line_item', ['li 4', 'li 1', 'li 9']) == \
+      {'li 4': dict(id=4, name='li 4'), 'li 1': dict(id=1, name='li 1')}
+    assert len(journal.get('line_item')) == 5
+    assert journal.get('order') == {}
+    journal.status('failed')
+    journal.close()
+
+    resumed = Journal(filename, run_id=journal.run_id)
+    assert resumed.start_time == START_TIME
+    assert resumed.get('line_item', ['li 0']) == {'li 0': dict(id=0, name='li 0')}
+
+    with pytest.raises(ResourceNotFound, match="Run id 'unknown' was not found"):
+        Journal(filename, run_id='unknown')
+
+@pytest.mark.parametrize("status", ['archived', 'done'])
+def test_journal_final_status(tmp_path, status):
+    filename = os.path.join(tmp_path, 'journal.sqlite')
+    journal = Journal(filename, start_time=START_TIME)
+    journal.status(status)
+    journal.close()
+    for read_only in (False, True):
+        with pytest.raises(ResourceNotActive, match=f"is {status} and cannot be resumed"):
+            Journal(filename, run_id=journal.run_id, read_only=read_only)
+
+def test_journal_prune(tmp_path):
+    filename = os.path.join(tmp_path, 'journal.sqlite')
+    old = Journal(filename, start_time=START_TIME)
+    old.record('order', [dict(id=6001)], key=lambda r_: r_['id'])
+    old._conn.execute('UPDATE runs SET updated = ?', ('2020-01-02T08:09:10', ))
+    old._conn.commit()
+    old.close()
+    recent = Journal(filename, start_time=START_TIME)
+    recent.close()
+
+    journal = Journal(filename, max_age_days=30)
+    with pytest.raises(ResourceNotFound):
+        Journal(filename, run_id=old.run_id)
+    assert Journal(filename, run_id=recent.run_id).start_time == START_TIME
+    assert journal._conn.execute('SELECT COUNT(*) FROM entities').fetchone() == (0, )
@@ -1,4 +1,6 @@
 import shlex
+import subprocess
+import sys
 
 from click.testing import CliRunner
 import pytest
@@ -19,3 +21,11 @@ def test_version(command, echo_str):
     )
     assert result.exit_code == 0
     assert echo_str in result.output
+
+def test_lazy_imports():
+    code = 'import sys; from line_item_manager import cli; print(" ".join(sys.modules))'
+    modules = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             check=True).stdout.split()
+    for name in ('googleads', 'zeep', 'jinja2', 'jsonschema', 'tqdm', 'pytz', 'pkg_resources',
+                 'line_item_manager.prebid'):
+        assert name not in modules
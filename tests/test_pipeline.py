@@ -0,0 +1,44 @@
+from threading import Lock
+import time
+
+import pytest
+
+from line_item_manager.pipeline import Pipeline
+
+def test_pipeline_order():
+    assert Pipeline([lambda x: x + 1, lambda x: x * 2, str]).run(range(10)) == \
+      [str((x + 1) * 2) for x in range(10)]
+    assert Pipeline([lambda x: x]).run([]) == []
+
+def test_pipeline_overlap():
+    lock = Lock()
+    active = set()
+    overlapped = []
+
+    def stage(name):
+        def func(x):
+            with lock:
+                active.add(name)
+                overlapped.append(len(active) > 1)
+            time.sleep(0.01)
+            with lock:
+                active.discard(name)
+            return x
+        return func
+
+    assert Pipeline([stage('a'), stage('b')], maxsize=1).run(range(5)) == list(range(5))
+    assert any(overlapped)
+
+def test_pipeline_error():
+    seen = []
+
+    def fail(x):
+        if x == 3:
+            raise ValueError('Test')
+        return x
+
+    with pytest.raises(ValueError) as e_:
+        Pipeline([fail, seen.append]).run(range(100))
+    assert 'Test' in str(e_)
+    assert seen == list(range(len(seen)))
+    assert len(seen) <= 3
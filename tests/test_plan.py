@@ -0,0 +1,101 @@
+import shlex
+
+from click.testing import CliRunner
+from googleads import ad_manager
+import pytest
+
+from line_item_manager import cli
+from line_item_manager.config import config
+from line_item_manager.plan import Plan
+from line_item_manager.prebid import prebid
+
+from .client import MockAdClient, BIDDER_VIDEO_SVC_IDS
+
+KEY_FILE = 'tests/resources/gam_creds.json'
+CUSTOM_TARGETING = {7101: ['US']}
+CONFIG_BIDDER = 'interactiveOffers'
+if CONFIG_BIDDER not in prebid.bidders:
+    prebid.bidders[CONFIG_BIDDER] = {"bidder-code": CONFIG_BIDDER, "bidder-name": "InteractiveOffers"}
+COMMAND = f'tests/resources/cfg_video.yml -k {KEY_FILE} -b {CONFIG_BIDDER}'
+ORDER_NAME = 'Prebid-InteractiveOffers-video-01/02/2020-08:09:10 1.25-1.50'
+
+config._start_time = pytest.start_time
+
+@pytest.fixture(autouse=True)
+def default_settings():
+    config._app = None
+    config._cpm_names = None
+
+def test_plan_summary():
+    plan = Plan()
+    plan.add('exists', 'Advertiser', '"Prebid-X"')
+    plan.add('activate', 'Targeting Key', '"hb_pb_x"')
+    plan.add('create', 'Line Item', 'of "Order"', 3)
+    plan.add('create', 'Order', '"Order"', 0)
+    assert plan.counts() == {'create': 3, 'activate': 1, 'exists': 1}
+    assert plan.summary() == '  ~ Targeting Key "hb_pb_x"\n  + 3 Line Items of "Order"\n' \
+      'Plan: 3 to create, 1 to activate, 1 existing.'
+    assert plan.summary(show_existing=True).startswith('  = Advertiser "Prebid-X"\n')
+
+def test_cli_plan(monkeypatch):
+    writes = []
+    class Client(MockAdClient):
+        def __getattribute__(self, name):
+            if name.startswith(('create', 'perform')):
+                writes.append(name)
+            return super().__getattribute__(name)
+    client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    result = CliRunner().invoke(cli.plan, shlex.split(COMMAND))
+
+    assert result.exit_code == 0
+    assert writes == []
+    assert result.output.splitlines() == [
+        '  + Targeting Value of "country"',
+        '  + 2 Targeting Values of "hb_pb_interactiveOff"',
+        '  + Creative "Prebid InteractiveOffers-video" 640x480',
+        '  + Creative "Prebid InteractiveOffers-video" 320x240',
+        f'  + Order "{ORDER_NAME}"',
+        f'  + 2 Line Items of "{ORDER_NAME}"',
+        f'  + 4 Line Item Creative Associations of "{ORDER_NAME}"',
+        'Plan: 12 to create, 0 to activate, 4 existing.',
+    ]
+
+def test_cli_plan_existing_order(monkeypatch):
+    class Client(MockAdClient):
+        def getCreativesByStatement(self, *args):
+            return dict(results=[
+                dict(id=4001 + i_, name='Prebid InteractiveOffers-video', advertiserId=1001,
+                     size=size) for i_, size in enumerate([dict(width=640, height=480),
+                                                           dict(width=320, height=240)])])
+        def getOrdersByStatement(self, *args):
+            return dict(results=[dict(id=6001, name=ORDER_NAME, advertiserId=1001)])
+        def getLineItemsByStatement(self, *args):
+            return dict(results=[dict(
+                id=8001, orderId=6001,
+                name='Prebid-InteractiveOffers-video-01/02/2020-08:09:10 @ 1.25')])
+        def getLineItemCreativeAssociationsByStatement(self, *args):
+            return dict(results=[dict(lineItemId=8001, creativeId=4001),
+                                 dict(lineItemId=8001, creativeId=4999)])
+    client = Client(CUSTOM_TARGETING, BIDDER_VIDEO_SVC_IDS)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    result = CliRunner().invoke(cli.plan, shlex.split(COMMAND + ' --show-existing'))
+
+    assert result.exit_code == 0
+    assert result.output.splitlines()[-6:] == [
+        f'  = Order "{ORDER_NAME}"',
+        f'  = Line Item of "{ORDER_NAME}"',
+        f'  + Line Item of "{ORDER_NAME}"',
+        f'  = Line Item Creative Association of "{ORDER_NAME}"',
+        f'  + 3 Line Item Creative Associations of "{ORDER_NAME}"',
+        'Plan: 7 to create, 0 to activate, 9 existing.',
+    ]
+
+def test_cli_plan_missing_resource(monkeypatch, caplog):
+    svc_ids = dict(BIDDER_VIDEO_SVC_IDS, PlacementService={})
+    client = MockAdClient(CUSTOM_TARGETING, svc_ids)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString", lambda x: client)
+    result = CliRunner().invoke(cli.plan, shlex.split(COMMAND))
+
+    assert result.exit_code == 0
+    assert "Placements named 'placement 1', 'placement 2' were not found" in caplog.text
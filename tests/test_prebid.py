@@ -0,0 +1,124 @@
+import io
+import os
+import time
+from urllib import error
+
+from click.testing import CliRunner
+from googleads import ad_manager
+import pytest
+
+from line_item_manager import cli
+from line_item_manager import prebid as prebid_module
+from line_item_manager.exceptions import ResourceNotFound
+from line_item_manager.prebid import Prebid
+
+from .client import AutoIdMockAdClient
+
+CSV = b"""bidder-code,bidder-name,media-types
+ix,Index Exchange,"banner, video"
+pubmatic,PubMatic,"banner, video"
+"""
+
+SNAPSHOT_CSV = b"""bidder-code,bidder-name,media-types
+appnexus,AppNexus,"banner, video"
+"""
+
+class Response(io.BytesIO):
+    def __init__(self, data, headers):
+        super().__init__(data)
+        self.headers = headers
+
+@pytest.fixture
+def urlopen(monkeypatch, tmp_path):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    calls = []
+    def _urlopen(req, **kwargs):
+        calls.append(dict(req.headers))
+        if calls[-1].get('If-none-match') == '"v1"':
+            raise error.HTTPError(req.full_url, 304, 'Not Modified', {}, None)
+        return Response(CSV, {'ETag': '"v1"', 'Last-Modified': 'Thu, 01 Oct 2026 00:00:00 GMT'})
+    monkeypatch.setattr(prebid_module.request, 'urlopen', _urlopen)
+    return calls
+
+@pytest.fixture
+def snapshot(monkeypatch, tmp_path):
+    filename = tmp_path / 'snapshot.csv'
+    filename.write_bytes(SNAPSHOT_CSV)
+    monkeypatch.setattr(prebid_module, 'package_filename', lambda name: str(filename))
+
+def test_bidders_cache(urlopen, monkeypatch):
+    assert list(Prebid().bidders) == ['ix', 'pubmatic']
+    assert len(urlopen) == 1
+
+    # fresh cache is used without a request
+    assert list(Prebid().bidders) == ['ix', 'pubmatic']
+    assert len(urlopen) == 1
+
+    # expired cache is revalidated
+    expired = time.time() + 2 * 86400
+    monkeypatch.setattr(prebid_module.time, 'time', lambda: expired)
+    assert list(Prebid().bidders) == ['ix', 'pubmatic']
+    assert len(urlopen) == 2
+    assert urlopen[-1] == {'If-none-match': '"v1"',
+                           'If-modified-since': 'Thu, 01 Oct 2026 00:00:00 GMT'}
+
+def test_bidders_download_error(urlopen, snapshot, monkeypatch):
+    _ = Prebid().bidders
+    def _urlopen(req, **kwargs):
+        raise error.URLError('timed out')
+    monkeypatch.setattr(prebid_module.request, 'urlopen', _urlopen)
+    expired = time.time() + 2 * 86400
+    monkeypatch.setattr(prebid_module.time, 'time', lambda: expired)
+    assert list(Prebid().bidders) == ['ix', 'pubmatic'] # stale cache
+
+    os.remove(os.path.join(os.environ['XDG_CACHE_HOME'], 'line_item_manager', 'prebid',
+                           'bidder-data.csv'))
+    assert 'appnexus' in Prebid().bidders # snapshot
+
+def test_bidders_offline(urlopen, snapshot):
+    prebid = Prebid()
+    prebid.offline = True
+    assert 'appnexus' in prebid.bidders # snapshot
+    assert not urlopen
+
+    _ = Prebid().bidders
+    prebid = Prebid()
+    prebid.offline = True
+    assert list(prebid.bidders) == ['ix', 'pubmatic'] # cached
+    assert len(urlopen) == 1
+
+def test_bidders_no_snapshot(urlopen, monkeypatch, tmp_path):
+    monkeypatch.setattr(prebid_module, 'package_filename', lambda name: str(tmp_path / name))
+    prebid = Prebid()
+    prebid.offline = True
+    with pytest.raises(ResourceNotFound):
+        _ = prebid.bidders
+
+    monkeypatch.setattr(prebid_module.prebid, '_bidders', None)
+    monkeypatch.setattr(prebid_module.prebid, 'offline', False)
+    result = CliRunner().invoke(cli.cli, ['--offline', 'show', 'bidders'])
+    assert result.exit_code == 2
+    assert 'Prebid bidders metadata was never downloaded' in result.output
+    assert 'run once without --offline' in result.output
+    monkeypatch.setattr(prebid_module.prebid, 'offline', False)
+
+def test_cli_single_order_offline(urlopen, monkeypatch, tmp_path):
+    monkeypatch.setattr(prebid_module, 'package_filename', lambda name: str(tmp_path / name))
+    monkeypatch.setattr(prebid_module.prebid, '_bidders', None)
+    monkeypatch.setattr(ad_manager.AdManagerClient, "LoadFromString",
+                        lambda x: AutoIdMockAdClient())
+    result = CliRunner().invoke(cli.cli, [
+        '--offline', 'create', 'tests/resources/cfg_video.yml', '-k',
+        'tests/resources/gam_creds.json', '--single-order', '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert prebid_module.prebid._bidders is None
+    assert not urlopen
+    monkeypatch.setattr(prebid_module.prebid, 'offline', False)
+
+def test_cli_offline(urlopen, snapshot, monkeypatch):
+    monkeypatch.setattr(prebid_module.prebid, '_bidders', None)
+    result = CliRunner().invoke(cli.cli, ['--offline', 'show', 'bidders'])
+    assert result.exit_code == 0
+    assert 'appnexus' in result.output
+    assert not urlopen
+    monkeypatch.setattr(prebid_module.prebid, 'offline', False)
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+from line_item_manager.config import config
+from line_item_manager.prototype import cpm_dependent_keys, LineItemRenderer
+from line_item_manager.template import render_src
+
+KEY_FILE = 'tests/resources/gam_creds.json'
+CPMS = ['0.01', '0.10', '1.00', '1.25', '20.00']
+
+def params(li_cfg=None):
+    gam = SimpleNamespace(
+        ad_units=[dict(id=2001)],
+        placements=[dict(id=3001)],
+        network=dict(effectiveRootAdUnitId=1511),
+        targeting_custom=[dict(operator='IS', key=dict(id=7101), values=[dict(id=7301)])],
+    )
+    li_ = SimpleNamespace(
+        gam=gam,
+        media_type='video',
+        order=dict(id=6001),
+        targeting_key=dict(key=dict(id=7201), names={c_:dict(id=7401 + i_) \
+                                                   for i_, c_ in enumerate(CPMS)}),
+    )
+    return [dict(
+        micro_amount=config.micro_amount(cpm),
+        cpm=cpm,
+        li=li_,
+        li_cfg=dict(li_cfg or dict(name='Prebid @ {cpm}', item_type='price_priority'),
+                    name=(li_cfg or {}).get('name', 'Prebid @ {cpm}').format(cpm=cpm)),
+        user_cfg=config.user,
+    ) for cpm in CPMS]
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_cpm_dependent_keys(cli_config):
+    assert cpm_dependent_keys(config.user['line_item']) == {'name'}
+    assert cpm_dependent_keys(dict(a='{{cpm}}', b=['x {{ cpm_min }}'], c=dict(d='{{ cpm }}'))) == \
+      {'a', 'c'}
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_prototype(cli_config):
+    src = config.template_src()
+    renderer = LineItemRenderer(src, {'name'})
+    recs = [renderer.render(**p_) for p_ in params()]
+
+    assert renderer.proto is not None
+    assert {s_.path for s_ in renderer.slots} == {
+        ('name', ), ('costPerUnit', 'microAmount'),
+        ('targeting', 'customTargeting', 'children', 1, 'valueIds', 0)}
+    assert recs == [render_src(src, **p_) for p_ in params()]
+    assert recs[1]['targeting']['inventoryTargeting'] is recs[2]['targeting']['inventoryTargeting']
+    assert recs[1]['targeting']['customTargeting']['children'][0] is \
+      recs[2]['targeting']['customTargeting']['children'][0]
+
+@pytest.mark.parametrize("src, is_proto", [
+    ('name: "{{ li_cfg.name }}"\nrate: {{ cpm }}\nid: {{ li.targeting_key.names[cpm].id }}', True),
+    ('name: {{ li_cfg.name }}\nrate: "{{ cpm }}"', True),
+    ("name: '{{ li_cfg.name }}'\nmicro: {{ micro_amount }}", True),
+    ('{% if cpm|float > 1 %}high: {{ cpm }}{% else %}low: {{ cpm }}{% endif %}', False),
+    ('name: "{{ li_cfg.name|upper }}"', False),
+    ('{% set x = cpm %}name: "{{ x }}"', False),
+    ('name: |\n  {{ cpm }}', False),
+    ('{{ cpm }}: 1', False),
+    ('name: "{{ li_cfg }}"', False),
+])
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_prototype_fallback(cli_config, src, is_proto):
+    renderer = LineItemRenderer(src, {'name'})
+    recs = [renderer.render(**p_) for p_ in params()]
+
+    assert (renderer.proto is not None) == is_proto
+    assert recs == [render_src(src, **p_) for p_ in params()]
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_prototype_unsafe_values(cli_config):
+    src = 'name: {{ li_cfg.name }}\nrate: {{ cpm }}'
+    renderer = LineItemRenderer(src, {'name'})
+    li_params = params(li_cfg=dict(name='Prebid: {cpm}', item_type='price_priority'))
+    with pytest.raises(yaml.YAMLError):
+        renderer.render(**li_params[0])
+
+    li_params = params(li_cfg=dict(name='Prebid {cpm}', item_type='price_priority'))
+    li_params[1]['li_cfg']['name'] = 'Prebid # 0.10'
+    recs = [renderer.render(**p_) for p_ in li_params]
+    assert renderer.proto is not None
+    assert recs == [render_src(src, **p_) for p_ in li_params]
@@ -0,0 +1,76 @@
+import pytest
+import yaml
+
+from line_item_manager.config import config
+from line_item_manager.prebid import PrebidBidder
+from line_item_manager.template import CfgTemplate, compile_src, environment, render_cfg, render_src
+
+KEY_FILE = 'tests/resources/gam_creds.json'
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_compile_src(cli_config):
+    src = 'name: "{{ name }} @ {{cpm}}"'
+    assert compile_src(src) is compile_src(src)
+    assert compile_src(src) is not compile_src(src + '\n')
+    assert render_src(src, name='abc', cpm='1.00') == dict(name='abc @ 1.00')
+    assert render_src(src, name='def', cpm='2.00') == dict(name='def @ 2.00')
+
+    size = config.app['mgr']['template']['cache_size']
+    for i_ in range(size * 2):
+        compile_src(f'name: "{{{{ name }}}} {i_}"')
+    assert len(environment().cache) == size
+    assert render_src('name: "{{ name }} 0"', name='abc') == dict(name='abc 0')
+
+def full_render_cfg(objname, bidder, **kwargs):
+    params = dict(
+        time=config.start_time.strftime("%m/%d/%Y-%H:%M:%S"),
+        run_mode='Test: ' if config.cli['test_run'] else '',
+        bidder_code=bidder.codestr,
+        bidder_name=bidder.name,
+    )
+    params.update(bidder.params)
+    params.update({k:v for k, v in kwargs.items() if v})
+    return render_src(yaml.safe_dump(config.user[objname]), **params)
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix -b pubmatic')
+def test_render_cfg(cli_config):
+    for code in ('ix', 'pubmatic'):
+        bidder = PrebidBidder(code)
+        for objname, kwargs in (('advertiser', {}), ('creative', dict(media_type='video')),
+                                ('order', dict(media_type='video', cpm_min='0.01', cpm_max='20.00'))):
+            assert render_cfg(objname, bidder, **kwargs) == full_render_cfg(objname, bidder, **kwargs)
+        for cpm in ('0.01', '1.00', '20.00'):
+            assert render_cfg('line_item', bidder, cpm=cpm, media_type='video') == \
+              full_render_cfg('line_item', bidder, cpm=cpm, media_type='video')
+    assert ('render_cfg', 'line_item') in config.memo
+    assert config.memo[('render_cfg', 'line_item')].slots
+
+@pytest.mark.command(f'create tests/resources/cfg_video.yml -k {KEY_FILE} -b ix')
+def test_cfg_template(cli_config):
+    obj = dict(
+        name='{{ bidder_code }} @ {{ cpm }}',
+        num='{{ cpm }}',
+        plain='x {{ bidder_code }}',
+        nested=[dict(a='x', b='{{ bidder_name }}: {{ cpm }}'), 'y'],
+        const=dict(c=1),
+    )
+    tmpl = CfgTemplate(obj)
+    assert len(tmpl.slots) == 4
+    for cpm in ('0.10', '1.00', '1.50'):
+        out = tmpl.render(bidder_code='ix', bidder_name='Index', cpm=cpm)
+        assert out == render_src(yaml.safe_dump(obj), bidder_code='ix', bidder_name='Index', cpm=cpm)
+        assert (out['const'] is tmpl.base['const']) == (cpm != '0.10')
+    assert tmpl.render(cpm='1.00')['num'] == '1.00'
+    # unsafe plain values fall back to the full rendering
+    for value in ('a #b', '- a', ' a', 'null', '[1, 2]'):
+        assert tmpl.render(bidder_code=value, cpm='1.00') == \
+          render_src(yaml.safe_dump(obj), bidder_code=value, cpm='1.00')
+    for value in ('a: b', 'a\nb', '\x07'):
+        with pytest.raises(yaml.YAMLError):
+            tmpl.render(bidder_code=value, cpm='1.00')
+    # statements, block scalars and jinja in keys are fully rendered
+    for obj in (dict(a='{% if cpm %}x{% endif %}'), dict(a='line 1\n{{ cpm }}\n'),
+                {'{{ cpm }}': 'x'}):
+        tmpl = CfgTemplate(obj)
+        assert tmpl.base is None
+        assert tmpl.render(cpm='1.00') == render_src(yaml.safe_dump(obj), cpm='1.00')
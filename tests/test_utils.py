@@ -3,9 +3,11 @@
 """Tests for `line_item_manager` package."""
 
 from datetime import datetime, timezone
+import io
+import logging
 import pytest
 
-from line_item_manager.utils import ichunk, format_long_list
+from line_item_manager.utils import ichunk, format_long_list, Lazy, pretty
 from line_item_manager.yaml_date import date_from_string
 
 
@@ -18,6 +20,27 @@ def test_format_long_list():
     assert format_long_list([f'abc_{i_}' for i_ in range(4)]) == \
       "['abc_0', 'abc_1', 'abc_2', 'abc_3']"
 
+def test_lazy(caplog):
+    calls = []
+    def fmt(vals):
+        calls.append(vals)
+        return format_long_list(vals)
+    logger = logging.getLogger('line_item_manager.test_lazy')
+    logger.setLevel(logging.INFO)
+    logger.debug('Values: %s', Lazy(fmt, [1, 2]))
+    assert not calls
+    handlers = [logging.StreamHandler(io.StringIO()) for _ in range(2)]
+    for handler in handlers:
+        logger.addHandler(handler)
+    try:
+        logger.info('Values: %s, %s', Lazy(fmt, [1, 2]), pretty({'a': 1}))
+    finally:
+        for handler in handlers:
+            logger.removeHandler(handler)
+    assert calls == [[1, 2]] # once, however many handlers
+    assert "Values: [1, 2], {'a': 1}" in caplog.text
+    assert all("Values: [1, 2], {'a': 1}" in h_.stream.getvalue() for h_ in handlers)
+
 def test_date_from_string():
     assert date_from_string('11/21/20 12:11', '%m/%d/%y %H:%M', 'UTC') == \
       datetime(2020, 11, 21, 12, 11, tzinfo=timezone.utc)